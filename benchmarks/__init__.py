@@ -0,0 +1,10 @@
+"""
+Benchmarks das listagens, da busca e do detalhe.
+
+Gera uma base sintética em um banco de teste (``benchmarks.dados``), requisita
+cada cenário (``benchmarks.cenarios``) pelo cliente de testes do Django e grava
+percentis de latência, tempo no banco e quantidade de consultas em JSON:
+
+    python -m benchmarks executar --ementas 20000 --protocolos 50000 --saida antes.json
+    python -m benchmarks comparar antes.json depois.json
+"""
@@ -0,0 +1,280 @@
+import argparse
+import contextlib
+import datetime
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Modos de ``concorrencia`` (ver benchmarks.concorrencia)
+SERVIDORES = ("wsgi", "asgi", "asgi_sincrono")
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextlib.contextmanager
+def base_sintetica(args):
+    """Banco de teste com a base sintética gerada; retorna a ``Base``"""
+    from django.test.runner import DiscoverRunner
+    from django.test.utils import override_settings
+
+    from .dados import gerar_base
+
+    # O log de requisições lentas da instrumentação só atrapalharia a saída
+    logging.getLogger("core.instrumentacao").setLevel(logging.ERROR)
+
+    runner = DiscoverRunner(verbosity=0, keepdb=getattr(args, "keepdb", False), interactive=False)
+    runner.setup_test_environment()
+    bancos = runner.setup_databases()
+    pasta_media = tempfile.mkdtemp(prefix="benchmarks-media-")
+    try:
+        with override_settings(MEDIA_ROOT=pasta_media):
+            print("Gerando a base sintética...", file=sys.stderr)
+            yield gerar_base(
+                ementas=args.ementas, protocolos=args.protocolos, usuarios=args.usuarios,
+                pdfs=args.pdfs, tamanho_pdf=args.tamanho_pdf, semente=args.semente,
+            )
+    finally:
+        runner.teardown_databases(bancos)
+        runner.teardown_test_environment()
+        shutil.rmtree(pasta_media, ignore_errors=True)
+
+
+def _ambiente():
+    import django
+    from django.conf import settings
+
+    return {
+        "commit": _commit(),
+        "data": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "banco": settings.DATABASES["default"]["ENGINE"],
+        "cache": settings.CACHES["default"]["BACKEND"],
+    }
+
+
+def _gravar(saida, caminho):
+    conteudo = json.dumps(saida, ensure_ascii=False, indent=2, sort_keys=True)
+    if caminho:
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(conteudo + "\n")
+        print(f"Resultados gravados em {caminho}.", file=sys.stderr)
+    else:
+        print(conteudo)
+
+
+PARAMETROS_BASE = ("ementas", "protocolos", "usuarios", "pdfs", "tamanho_pdf", "semente")
+
+
+def executar(args):
+    from .cenarios import montar_cenarios
+    from .medicao import VERSAO_FORMATO, medir
+
+    with base_sintetica(args) as base:
+        cenarios = montar_cenarios(base)
+        if args.filtro:
+            cenarios = [cenario for cenario in cenarios if re.search(args.filtro, cenario.nome)]
+
+        resultados = []
+        for cenario in cenarios:
+            resultado = medir(
+                cenario, repeticoes=args.repeticoes, aquecimento=args.aquecimento,
+                cache_frio=args.cache_frio,
+            )
+            resultados.append(resultado)
+            latencia = resultado["latencia_ms"]
+            print(
+                f"{cenario.nome:<50} p50 {latencia['p50']:>8.2f} ms  p95 {latencia['p95']:>8.2f} ms  "
+                f"{resultado['consultas']['max']:>3} consulta(s)",
+                file=sys.stderr,
+            )
+
+    _gravar({
+        "formato": VERSAO_FORMATO,
+        "ambiente": _ambiente(),
+        "parametros": {
+            chave: getattr(args, chave)
+            for chave in (*PARAMETROS_BASE, "repeticoes", "aquecimento", "cache_frio")
+        },
+        "cenarios": resultados,
+    }, args.saida)
+    return 0
+
+
+def concorrencia(args):
+    """Mede um servidor (``--servidor``) ou os dois, cada um em um subprocesso"""
+    if args.servidor:
+        return _concorrencia_servidor(args)
+
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="benchmarks-") as pasta:
+        for servidor in SERVIDORES:
+            caminho = os.path.join(pasta, f"{servidor}.json")
+            comando = [sys.executable, "-m", "benchmarks"]
+            if args.settings:
+                comando += ["--settings", args.settings]
+            comando += ["concorrencia", "--servidor", servidor, "--saida", caminho]
+            for chave in (*PARAMETROS_BASE, "concorrencia", "threads", "requisicoes", "aquecimento"):
+                comando += [f"--{chave.replace('_', '-')}", str(getattr(args, chave))]
+            if args.filtro:
+                comando += ["--filtro", args.filtro]
+            print(f"Servidor {servidor.upper()}...", file=sys.stderr)
+            subprocess.run(comando, check=True)
+            with open(caminho, encoding="utf-8") as arquivo:
+                resultados[servidor] = json.load(arquivo)
+
+    por_servidor = {
+        servidor: {cenario["nome"]: cenario for cenario in resultado["cenarios"]}
+        for servidor, resultado in resultados.items()
+    }
+    print(f"{'Cenário':<34}" + "".join(f"{servidor + ' req/s':>20}{'p95 ms':>9}" for servidor in SERVIDORES))
+    for cenario in resultados["wsgi"]["cenarios"]:
+        colunas = []
+        for servidor in SERVIDORES:
+            medido = por_servidor[servidor].get(cenario["nome"])
+            if medido is None:
+                colunas.append(f"{'-':>20}{'-':>9}")
+            else:
+                colunas.append(f"{medido['vazao_rps']:>20.1f}{medido['latencia_ms']['p95']:>9.1f}")
+        print(f"{cenario['nome']:<34}" + "".join(colunas))
+    if args.saida:
+        _gravar({"formato": resultados["wsgi"]["formato"], "servidores": resultados}, args.saida)
+    return 0
+
+
+def _concorrencia_servidor(args):
+    from django.conf import settings
+
+    from .cenarios import montar_cenarios
+    from .concorrencia import CENARIOS, medir_concorrencia
+    from .medicao import VERSAO_FORMATO
+
+    with base_sintetica(args) as base:
+        cenarios = [cenario for cenario in montar_cenarios(base) if cenario.nome in CENARIOS]
+        if args.filtro:
+            cenarios = [cenario for cenario in cenarios if re.search(args.filtro, cenario.nome)]
+
+        resultados = []
+        for cenario in cenarios:
+            resultado = medir_concorrencia(
+                cenario, args.servidor, concorrencia=args.concorrencia, requisicoes=args.requisicoes,
+                aquecimento=args.aquecimento, threads=args.threads,
+            )
+            resultados.append(resultado)
+            print(
+                f"{args.servidor:<13} {cenario.nome:<40} {resultado['vazao_rps']:>8.1f} req/s  "
+                f"p95 {resultado['latencia_ms']['p95']:>8.2f} ms  status {resultado['status']}",
+                file=sys.stderr,
+            )
+
+    _gravar({
+        "formato": VERSAO_FORMATO,
+        "ambiente": dict(_ambiente(), servidor=args.servidor, views_async=settings.VIEWS_ASYNC,
+                         conn_max_age=settings.DATABASES["default"]["CONN_MAX_AGE"]),
+        "parametros": {
+            chave: getattr(args, chave)
+            for chave in (*PARAMETROS_BASE, "concorrencia", "threads", "requisicoes", "aquecimento")
+        },
+        "cenarios": resultados,
+    }, args.saida)
+    return 0
+
+
+def comparar(args):
+    from .medicao import comparar as comparar_resultados
+
+    with open(args.antes, encoding="utf-8") as arquivo:
+        antes = json.load(arquivo)
+    with open(args.depois, encoding="utf-8") as arquivo:
+        depois = json.load(arquivo)
+
+    linhas = comparar_resultados(antes, depois, limiar=args.limiar)
+    print(f"{'Cenário':<50} {'p50':>19} {'p95':>19} {'consultas':>10}")
+    for nome, p50_antes, p50_depois, p95_antes, p95_depois, c_antes, c_depois, regressao in linhas:
+        print(
+            f"{nome:<50} {p50_antes:>8.2f} → {p50_depois:>8.2f} {p95_antes:>8.2f} → {p95_depois:>8.2f} "
+            f"{c_antes:>4} → {c_depois:<4}{'  REGRESSÃO' if regressao else ''}"
+        )
+    regressoes = sum(1 for linha in linhas if linha[-1])
+    print(f"{len(linhas)} cenário(s) comparado(s), {regressoes} regressão(ões).")
+    return 1 if regressoes and args.falhar else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks das views")
+    parser.add_argument("--settings", help="Módulo de settings (padrão: DJANGO_SETTINGS_MODULE ou core.settings)")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    parser_executar = comandos.add_parser("executar", help="Gera a base e mede os cenários")
+    parser_executar.add_argument("--ementas", type=int, default=5000)
+    parser_executar.add_argument("--protocolos", type=int, default=5000)
+    parser_executar.add_argument("--usuarios", type=int, default=50)
+    parser_executar.add_argument("--pdfs", type=int, default=20, help="PDFs distintos compartilhados pelas ementas")
+    parser_executar.add_argument("--tamanho-pdf", type=int, default=20_000,
+                                 help="Caracteres de texto de cada PDF (padrão: 20000, ~25 KB)")
+    parser_executar.add_argument("--semente", type=int, default=42)
+    parser_executar.add_argument("--repeticoes", type=int, default=30)
+    parser_executar.add_argument("--aquecimento", type=int, default=3)
+    parser_executar.add_argument("--cache-frio", action="store_true", help="Limpa o cache antes de cada requisição")
+    parser_executar.add_argument("--filtro", help="Expressão regular: mede só os cenários cujo nome combina")
+    parser_executar.add_argument("--keepdb", action="store_true", help="Reaproveita o banco de teste")
+    parser_executar.add_argument("--saida", help="Arquivo JSON de resultados (padrão: saída padrão)")
+    parser_executar.set_defaults(funcao=executar)
+
+    parser_concorrencia = comandos.add_parser(
+        "concorrencia", help="Vazão com clientes simultâneos: WSGI × ASGI (views assíncronas e síncronas)",
+    )
+    parser_concorrencia.add_argument("--ementas", type=int, default=5000)
+    parser_concorrencia.add_argument("--protocolos", type=int, default=5000)
+    parser_concorrencia.add_argument("--usuarios", type=int, default=50)
+    parser_concorrencia.add_argument("--pdfs", type=int, default=20)
+    parser_concorrencia.add_argument("--tamanho-pdf", type=int, default=20_000)
+    parser_concorrencia.add_argument("--semente", type=int, default=42)
+    parser_concorrencia.add_argument("--concorrencia", type=int, default=64, help="Clientes simultâneos")
+    parser_concorrencia.add_argument("--threads", type=int, default=8, help="Threads do servidor WSGI")
+    parser_concorrencia.add_argument("--requisicoes", type=int, default=500, help="Requisições por cenário")
+    parser_concorrencia.add_argument("--aquecimento", type=int, default=20)
+    parser_concorrencia.add_argument("--filtro", help="Expressão regular: mede só os cenários cujo nome combina")
+    parser_concorrencia.add_argument("--servidor", choices=SERVIDORES,
+                                     help="Mede só um servidor neste processo (padrão: os dois)")
+    parser_concorrencia.add_argument("--saida", help="Arquivo JSON de resultados")
+    parser_concorrencia.set_defaults(funcao=concorrencia)
+
+    parser_comparar = comandos.add_parser("comparar", help="Compara dois arquivos de resultados")
+    parser_comparar.add_argument("antes")
+    parser_comparar.add_argument("depois")
+    parser_comparar.add_argument("--limiar", type=float, default=0.10,
+                                 help="Piora tolerada no p95 (padrão: 0.10 = 10%%)")
+    parser_comparar.add_argument("--falhar", action="store_true", help="Sai com código 1 se houver regressão")
+    parser_comparar.set_defaults(funcao=comparar)
+
+    args = parser.parse_args(argv)
+    if args.comando == "concorrencia" and args.servidor:
+        # Define as conexões e as views (VIEWS_ASYNC) antes de carregar os settings
+        os.environ["DJANGO_ASGI"] = "0" if args.servidor == "wsgi" else "1"
+        os.environ["VIEWS_ASYNC"] = "0" if args.servidor == "asgi_sincrono" else "1"
+    if args.comando == "executar" or args.comando == "concorrencia" and args.servidor:
+        if args.settings:
+            os.environ["DJANGO_SETTINGS_MODULE"] = args.settings
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+        import django
+
+        django.setup()
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Cenários dos benchmarks: as requisições medidas sobre a base sintética.
+
+Cada cenário é uma URL com parâmetros e o usuário que faz a requisição
+(``None`` para visitante anônimo). Os nomes são estáveis, então resultados de
+commits diferentes podem ser comparados cenário a cenário. O cache das
+páginas anônimas só vale nos cenários com ``cache_paginas``
+(``ementa_list/cache_hit``); nos demais a view é medida por inteiro.
+"""
+import itertools
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.urls import reverse
+
+from core.paginacao import PaginadorCursor, expressoes_ordenacao
+from ementas.models import Ementa
+from ementas.views import ORDENACAO_LISTA as ORDENACAO_EMENTAS
+from protocolos.models import Protocolo
+from protocolos.views import ORDENACAO_LISTA as ORDENACAO_PROTOCOLOS
+
+# Valores de cada filtro da listagem de ementas combinados entre si
+FILTROS_EMENTAS = {
+    "q": "fiscalização",
+    "tipo_ato": "portaria",
+    "situacao": "em_vigor",
+    "periodo": {"data_inicio": "2022-01-01", "data_fim": "2024-12-31"},
+}
+
+BUSCAS = {
+    "palavra": "anuidades",
+    "frase": "responsabilidade técnica",
+    "numero": "Portaria 15",
+    "erro_digitacao": "fiscalizasao",
+    "sem_resultado": "xyzxyz",
+}
+
+
+@dataclass
+class Cenario:
+    nome: str
+    url: str
+    params: dict = field(default_factory=dict)
+    usuario: object = None
+    # Mede a página anônima servida do cache (core.cache_paginas)
+    cache_paginas: bool = False
+
+
+def _combinacoes_filtros():
+    """Todas as combinações dos filtros da listagem (inclusive nenhum)"""
+    nomes = list(FILTROS_EMENTAS)
+    for tamanho in range(len(nomes) + 1):
+        for escolhidos in itertools.combinations(nomes, tamanho):
+            params = {}
+            for nome in escolhidos:
+                valor = FILTROS_EMENTAS[nome]
+                params.update(valor if isinstance(valor, dict) else {nome: valor})
+            yield "+".join(escolhidos) or "sem_filtros", params
+
+
+def _cursor_profundo(queryset, ordenacao, posicao, por_pagina=10):
+    """Cursor da página que começa em ``posicao`` (como se navegasse até lá)"""
+    qs = queryset.order_by(*expressoes_ordenacao(ordenacao))
+    anterior = qs[max(posicao - 1, 0):posicao].first()
+    if anterior is None:
+        return None
+    return PaginadorCursor(queryset, ordenacao, por_pagina).codificar(anterior, "p")
+
+
+def montar_cenarios(base):
+    """Lista de cenários para a base gerada por ``benchmarks.dados.gerar_base``"""
+    lista = reverse("ementas:lista")
+    cenarios = []
+
+    for nome, params in _combinacoes_filtros():
+        cenarios.append(Cenario(f"ementa_list/{nome}", lista, params))
+    for nome, q in BUSCAS.items():
+        cenarios.append(Cenario(f"ementa_list/busca/{nome}", lista, {"q": q}))
+
+    # Paginação: primeira página com 100 itens, última numerada e cursor profundo
+    limite = getattr(settings, "PAGINAS_NUMERADAS", 20)
+    cenarios.append(Cenario("ementa_list/pagina_100_itens", lista, {"itens_por_pagina": 100}))
+    cenarios.append(Cenario("ementa_list/pagina_numerada_limite", lista, {"page": limite}))
+    ementas = Ementa.objects.filter(publicado=True)
+    cursor = _cursor_profundo(ementas, ORDENACAO_EMENTAS, (ementas.count() * 9) // 10)
+    if cursor:
+        cenarios.append(Cenario("ementa_list/cursor_profundo", lista, {"cursor": cursor}))
+
+    # O mesmo caminho para usuário autenticado e a página anônima vinda do cache
+    cenarios.append(Cenario("ementa_list/autenticado", lista, usuario=base.usuario_publicador))
+    cenarios.append(Cenario("ementa_list/cache_hit", lista, cache_paginas=True))
+
+    ementa = ementas.filter(sigiloso=False).exclude(arquivo="").order_by("pk").first()
+    if ementa:
+        cenarios.append(Cenario("ementa_detail", reverse("ementas:detalhe", args=[ementa.pk])))
+        cenarios.append(Cenario(
+            "ementa_detail/autenticado", reverse("ementas:detalhe", args=[ementa.pk]),
+            usuario=base.usuario_publicador,
+        ))
+
+    cenarios.append(Cenario("api/lista", reverse("ementas:api_lista")))
+    cenarios.append(Cenario("api/facetas", reverse("ementas:api_facetas"), {"q": "obras"}))
+    for q in ("12", "fisc", "Portaria 1"):
+        cenarios.append(Cenario(f"api/sugestoes/{q}", reverse("ementas:api_sugestoes"), {"q": q}))
+
+    cenarios.append(Cenario("dashboard", reverse("usuarios:dashboard"), usuario=base.usuario_comum))
+
+    protocolos = reverse("protocolos:lista")
+    documento = Protocolo.objects.order_by("pk").values_list("cpf_cnpj_digitos", flat=True).first() or ""
+    cenarios += [
+        Cenario("protocolo_list", protocolos, usuario=base.usuario_comum),
+        Cenario("protocolo_list/tipo", protocolos, {"tipo": "empresa"}, usuario=base.usuario_comum),
+        Cenario("protocolo_list/documento_exato", protocolos, {"q": documento}, usuario=base.usuario_comum),
+        Cenario("protocolo_list/documento_prefixo", protocolos, {"q": documento[:5]}, usuario=base.usuario_comum),
+        Cenario("protocolo_list/caixa", protocolos, {"caixa": 1}, usuario=base.usuario_comum),
+    ]
+    cursor = _cursor_profundo(Protocolo.objects.all(), ORDENACAO_PROTOCOLOS, (base.protocolos * 9) // 10)
+    if cursor:
+        cenarios.append(Cenario(
+            "protocolo_list/cursor_profundo", protocolos, {"cursor": cursor}, usuario=base.usuario_comum,
+        ))
+    return cenarios
@@ -0,0 +1,231 @@
+"""
+Vazão com requisições simultâneas: WSGI com threads × ASGI.
+
+Os handlers do próprio Django são chamados no processo, sem socket, por
+``concorrencia`` clientes que mandam uma nova requisição assim que recebem a
+resposta:
+
+- ``wsgi``: ``WSGIHandler`` com ``threads`` threads, como um servidor WSGI com
+  threads (gunicorn ``gthread``); acima disso as requisições esperam na fila e
+  a espera entra na latência;
+- ``asgi``: ``ASGIHandler`` no laço de eventos, como o uvicorn, com as views
+  assíncronas;
+- ``asgi_sincrono``: o mesmo, com as views síncronas (``VIEWS_ASYNC=0``).
+
+Cada modo roda em um processo próprio, porque as conexões e as views usadas
+dependem dos settings carregados (``python -m benchmarks concorrencia`` cuida
+disso). A quantidade de consultas de cada resposta vem do cabeçalho
+``Server-Timing`` (``core.instrumentacao``).
+"""
+import asyncio
+import queue
+import re
+import threading
+import time
+from io import BytesIO
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.test import Client
+from django.utils.http import urlencode
+
+from .medicao import cache_das_paginas, resumo
+
+# Cenários de ``benchmarks.cenarios`` servidos pelas views assíncronas
+CENARIOS = (
+    "ementa_list/sem_filtros",
+    "ementa_list/busca/palavra",
+    "ementa_list/cursor_profundo",
+    "ementa_list/autenticado",
+    "ementa_list/cache_hit",
+    "ementa_detail",
+    "ementa_detail/autenticado",
+    "api/lista",
+    "api/facetas",
+    "api/sugestoes/fisc",
+    "protocolo_list",
+    "protocolo_list/cursor_profundo",
+)
+
+_CONSULTAS_RE = re.compile(r'desc="(\d+) consultas"')
+
+
+def cabecalho_cookie(usuario):
+    """Cookie de sessão do usuário (``None`` para visitante anônimo)"""
+    if usuario is None:
+        return None
+    cliente = Client()
+    cliente.force_login(usuario)
+    return "; ".join(f"{nome}={morsel.value}" for nome, morsel in cliente.cookies.items())
+
+
+def _consultas(server_timing):
+    encontrado = _CONSULTAS_RE.search(server_timing or "")
+    return int(encontrado.group(1)) if encontrado else None
+
+
+def _environ(cenario, cookie):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": cenario.url,
+        "QUERY_STRING": urlencode(cenario.params),
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "testserver",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "testserver",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": BytesIO(),
+        "wsgi.multiprocess": False,
+        "wsgi.multithread": True,
+        "wsgi.run_once": False,
+    }
+    if cookie:
+        environ["HTTP_COOKIE"] = cookie
+    return environ
+
+
+def _scope(cenario, cookie):
+    cabecalhos = [(b"host", b"testserver")]
+    if cookie:
+        cabecalhos.append((b"cookie", cookie.encode()))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": cenario.url,
+        "raw_path": cenario.url.encode(),
+        "root_path": "",
+        "query_string": urlencode(cenario.params).encode(),
+        "headers": cabecalhos,
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+
+
+def requisitar_wsgi(handler, environ):
+    """(status, consultas) de uma requisição ao ``WSGIHandler``"""
+    resultado = {}
+
+    def start_response(status, cabecalhos, exc_info=None):
+        resultado["status"] = int(status.split()[0])
+        resultado["server_timing"] = dict(cabecalhos).get("Server-Timing")
+
+    environ = dict(environ, **{"wsgi.input": BytesIO()})
+    resposta = handler(environ, start_response)
+    try:
+        for _ in resposta:
+            pass
+    finally:
+        if hasattr(resposta, "close"):
+            resposta.close()
+    return resultado["status"], _consultas(resultado["server_timing"])
+
+
+async def requisitar_asgi(handler, scope):
+    """(status, consultas) de uma requisição ao ``ASGIHandler``"""
+    resultado = {}
+    corpo_enviado = False
+
+    async def receive():
+        nonlocal corpo_enviado
+        if not corpo_enviado:
+            corpo_enviado = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # O cliente só "desconecta" depois da resposta (a espera é cancelada)
+        await asyncio.Future()
+
+    async def send(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resultado["status"] = mensagem["status"]
+            cabecalhos = {nome.lower(): valor for nome, valor in mensagem["headers"]}
+            resultado["server_timing"] = cabecalhos.get(b"server-timing", b"").decode()
+
+    await handler(dict(scope), receive, send)
+    return resultado["status"], _consultas(resultado["server_timing"])
+
+
+def _medir_wsgi(cenario, cookie, concorrencia, requisicoes, threads):
+    handler = WSGIHandler()
+    environ = _environ(cenario, cookie)
+    medidas = []
+    fila = queue.Queue()
+    clientes = threading.Semaphore(concorrencia)
+
+    def trabalhador():
+        try:
+            while (chegada := fila.get()) is not None:
+                status, consultas = requisitar_wsgi(handler, environ)
+                medidas.append(((time.perf_counter() - chegada) * 1000, status, consultas))
+                clientes.release()
+        finally:
+            connections.close_all()
+
+    trabalhadores = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    inicio = time.perf_counter()
+    for thread in trabalhadores:
+        thread.start()
+    for _ in range(requisicoes):
+        clientes.acquire()
+        fila.put(time.perf_counter())
+    for _ in trabalhadores:
+        fila.put(None)
+    for thread in trabalhadores:
+        thread.join()
+    return medidas, time.perf_counter() - inicio
+
+
+def _medir_asgi(cenario, cookie, concorrencia, requisicoes, threads=None):
+    handler = ASGIHandler()
+    scope = _scope(cenario, cookie)
+
+    async def executar():
+        medidas = []
+        restantes = [requisicoes]
+
+        async def trabalhador():
+            while restantes[0]:
+                restantes[0] -= 1
+                inicio = time.perf_counter()
+                status, consultas = await requisitar_asgi(handler, scope)
+                medidas.append(((time.perf_counter() - inicio) * 1000, status, consultas))
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+        return medidas, time.perf_counter() - inicio
+
+    return asyncio.run(executar())
+
+
+def medir_concorrencia(cenario, servidor, concorrencia=64, requisicoes=500, aquecimento=20, threads=8):
+    """
+    Faz ``requisicoes`` requisições ao cenário com ``concorrencia`` clientes
+    simultâneos e resume latência e vazão (requisições por segundo).
+    """
+    medir = _medir_wsgi if servidor == "wsgi" else _medir_asgi
+    cookie = cabecalho_cookie(cenario.usuario)
+    with cache_das_paginas(cenario):
+        if aquecimento:
+            medir(cenario, cookie, min(concorrencia, aquecimento), aquecimento, threads)
+        medidas, duracao = medir(cenario, cookie, concorrencia, requisicoes, threads)
+
+    consultas = [quantidade for _, _, quantidade in medidas if quantidade is not None]
+    return {
+        "nome": cenario.nome,
+        "url": cenario.url,
+        "params": {chave: str(valor) for chave, valor in cenario.params.items()},
+        "usuario": cenario.usuario.get_username() if cenario.usuario is not None else None,
+        "servidor": servidor,
+        "concorrencia": concorrencia,
+        "threads": threads if servidor == "wsgi" else None,
+        "repeticoes": requisicoes,
+        "status": sorted({status for _, status, _ in medidas}),
+        "vazao_rps": round(len(medidas) / duracao, 1),
+        "latencia_ms": resumo([latencia for latencia, _, _ in medidas]),
+        "consultas": {"min": min(consultas, default=0), "max": max(consultas, default=0)},
+    }
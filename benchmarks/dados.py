@@ -0,0 +1,271 @@
+"""
+Gerador de dados sintéticos para os benchmarks.
+
+Cria usuários (com perfil), ementas (com PDF e texto extraído) e protocolos
+com textos no vocabulário dos atos do CREA, datas espalhadas pelos últimos
+anos e locais de armazenamento no formato "CAIXA X, FILEIRA Y, FACE Z". Tudo
+sai de um ``random.Random(semente)``: a mesma semente gera a mesma base.
+
+As linhas são gravadas com ``bulk_create`` e os campos que o ``save()``
+manteria (vetor de busca, CPF/CNPJ normalizado, caixa/fileira/face) são
+preenchidos aqui; ao final as contagens em cache são invalidadas.
+"""
+import datetime
+import random
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+
+from core.contagem import invalidar
+from ementas.busca import atualizar_vetor_busca
+from ementas.models import Ementa, TextoArquivo
+from protocolos.models import Protocolo, interpretar_local, somente_digitos
+from usuarios.models import PerfilUsuario
+
+SENHA = "benchmark-senha"
+TAMANHO_LOTE = 1000
+
+# Datas relativas a um instante fixo, para a base não mudar de um dia para outro
+REFERENCIA = datetime.datetime(2026, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+ASSUNTOS = [
+    "fiscalização de obras", "anuidades e taxas", "registro profissional",
+    "anotação de responsabilidade técnica", "acervo técnico", "câmaras especializadas",
+    "exercício ilegal da profissão", "certidões de registro", "empresas de engenharia",
+    "segurança do trabalho", "obras públicas", "agronomia e meio ambiente",
+    "geologia e minas", "engenharia elétrica", "engenharia civil", "processos éticos",
+]
+VERBOS = [
+    "Dispõe sobre", "Regulamenta", "Altera a redação de", "Estabelece normas para",
+    "Aprova procedimentos de", "Fixa critérios para", "Revoga disposições sobre",
+]
+PALAVRAS = (
+    "conselho regional engenharia agronomia tocantins plenário resolução artigo "
+    "parágrafo inciso profissional empresa registro fiscalização responsabilidade "
+    "técnica anotação obra serviço prazo multa infração processo julgamento câmara "
+    "especializada presidente conselheiro sessão ordinária extraordinária publicação "
+    "diário oficial vigência disposições gerais transitórias competência atribuição "
+    "habilitação título diploma instituição ensino cadastro certidão acervo"
+).split()
+PREFIXOS_NUMERO = {
+    "portaria": "",
+    "decisao_plenaria": "DP ",
+    "ato_administrativo": "AA ",
+}
+
+
+@dataclass
+class Base:
+    """Resumo da base gerada, usado pelos cenários"""
+    usuario_comum: object
+    usuario_publicador: object
+    usuario_staff: object
+    ementas: int
+    protocolos: int
+    usuarios: int
+
+
+def _frase(rng, minimo, maximo):
+    palavras = rng.choices(PALAVRAS, k=rng.randint(minimo, maximo))
+    return " ".join(palavras).capitalize() + "."
+
+
+def _paragrafo(rng, caracteres):
+    frases = []
+    total = 0
+    while total < caracteres:
+        frase = _frase(rng, 8, 25)
+        frases.append(frase)
+        total += len(frase) + 1
+    return " ".join(frases)
+
+
+def _data(rng, anos=8):
+    return REFERENCIA.date() - datetime.timedelta(days=rng.randint(0, 365 * anos))
+
+
+def _escapar_pdf(texto):
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def gerar_pdf(texto, linhas_por_pagina=45, caracteres_por_linha=90):
+    """PDF com o texto quebrado em linhas e páginas (fonte Helvetica)"""
+    texto = texto.encode("latin-1", "replace").decode("latin-1")
+    linhas = [texto[i:i + caracteres_por_linha] for i in range(0, len(texto), caracteres_por_linha)] or [""]
+    paginas = [linhas[i:i + linhas_por_pagina] for i in range(0, len(linhas), linhas_por_pagina)]
+
+    objetos = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for pagina in paginas:
+        conteudo = "BT /F1 10 Tf 12 TL 50 760 Td " + " ".join(
+            f"({_escapar_pdf(linha)}) '" for linha in pagina
+        ) + " ET"
+        objetos.append(f"<< /Length {len(conteudo.encode('latin-1'))} >>\nstream\n{conteudo}\nendstream")
+        objetos.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objetos)} 0 R >>"
+        )
+        kids.append(f"{len(objetos)} 0 R")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for numero, objeto in enumerate(objetos, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{numero} 0 obj\n{objeto}\nendobj\n".encode("latin-1")
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf, len(paginas)
+
+
+def gerar_usuarios(rng, quantidade):
+    """Usuários aprovados; os três primeiros são o comum, o publicador e o staff"""
+    User = get_user_model()
+    # Uma única derivação da senha: o hash é o mesmo para todos
+    senha = make_password(SENHA)
+    usuarios = User.objects.bulk_create([
+        User(
+            username=f"bench{indice}",
+            password=senha,
+            first_name=rng.choice(["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio"]),
+            last_name=rng.choice(["Silva", "Souza", "Oliveira", "Pereira", "Costa"]),
+            is_staff=indice == 2,
+        )
+        for indice in range(max(quantidade, 3))
+    ])
+    permissoes = {0: "visualizador", 1: "publicador", 2: "admin"}
+    PerfilUsuario.objects.bulk_create([
+        PerfilUsuario(
+            user=usuario,
+            cpf=f"{indice:011d}",
+            permissao=permissoes.get(indice) or rng.choice(["visualizador", "editor"]),
+            pode_publicar=indice == 1,
+            conta_aprovada=True,
+        )
+        for indice, usuario in enumerate(usuarios)
+    ])
+    return usuarios
+
+
+def gerar_pdfs(rng, quantidade, tamanho_texto):
+    """PDFs distintos (o armazenamento guarda um arquivo por conteúdo)"""
+    pdfs = []
+    for indice in range(quantidade):
+        texto = _paragrafo(rng, tamanho_texto)
+        conteudo, paginas = gerar_pdf(texto)
+        nome = Ementa._meta.get_field("arquivo").storage.save(
+            f"ementas/bench{indice}.pdf", ContentFile(conteudo),
+        )
+        pdfs.append((nome, texto, paginas))
+    return pdfs
+
+
+def gerar_ementas(rng, quantidade, usuarios, pdfs, fracao_sigilosas=0.05):
+    tipos = [valor for valor, _ in Ementa.TIPO_ATO_CHOICES]
+    situacoes = [valor for valor, _ in Ementa.SITUACAO_CHOICES]
+    textos = {nome: (texto, paginas) for nome, texto, paginas in pdfs}
+
+    for inicio in range(0, quantidade, TAMANHO_LOTE):
+        lote = []
+        for indice in range(inicio, min(inicio + TAMANHO_LOTE, quantidade)):
+            tipo = rng.choices(tipos, weights=[6, 3, 1][:len(tipos)])[0]
+            data = _data(rng)
+            sigiloso = rng.random() < fracao_sigilosas
+            pdf = rng.choice(pdfs) if pdfs and not sigiloso and rng.random() < 0.7 else None
+            titulo = f"{rng.choice(VERBOS)} {rng.choice(ASSUNTOS)}"
+            lote.append(Ementa(
+                numero=f"{PREFIXOS_NUMERO.get(tipo, '')}{indice + 1}/{data.year}",
+                titulo=titulo,
+                tipo_ato_normativo=tipo,
+                situacao=rng.choices(situacoes, weights=[7, 2, 1][:len(situacoes)])[0],
+                sigiloso=sigiloso,
+                ementa="" if sigiloso else _paragrafo(rng, rng.randint(200, 1500)),
+                resumo="" if sigiloso else _frase(rng, 10, 30),
+                arquivo=pdf[0] if pdf else None,
+                data_publicacao=data,
+                publicado=rng.random() < 0.95,
+                criado_por=rng.choice(usuarios),
+            ))
+        criadas = Ementa.objects.bulk_create(lote)
+        TextoArquivo.objects.bulk_create([
+            TextoArquivo(
+                ementa=ementa,
+                arquivo=ementa.arquivo.name,
+                hash_arquivo=ementa.versao_arquivo or "",
+                texto=textos[ementa.arquivo.name][0],
+                paginas=textos[ementa.arquivo.name][1],
+            )
+            for ementa in criadas
+            if ementa.arquivo
+        ])
+        # criado_em distinto por ementa, como em uma base real
+        for ementa in criadas:
+            ementa.criado_em = REFERENCIA - datetime.timedelta(seconds=rng.randint(0, 10**8))
+        Ementa.objects.bulk_update(criadas, ["criado_em"])
+
+    atualizar_vetor_busca(Ementa.objects.all())
+    invalidar(Ementa)
+
+
+def gerar_protocolos(rng, quantidade, usuarios):
+    for inicio in range(0, quantidade, TAMANHO_LOTE):
+        lote = []
+        for indice in range(inicio, min(inicio + TAMANHO_LOTE, quantidade)):
+            empresa = rng.random() < 0.3
+            digitos = "".join(rng.choices("0123456789", k=14 if empresa else 11))
+            if empresa:
+                documento = f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}"
+            else:
+                documento = f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+            local = (
+                f"CAIXA {rng.randint(1, max(quantidade // 200, 1))}, "
+                f"FILEIRA {rng.randint(1, 6)}, FACE {rng.choice('ABCD')}"
+            )
+            caixa, fileira, face = interpretar_local(local)
+            lote.append(Protocolo(
+                numero=f"{indice + 1:06d}/{rng.randint(2015, 2026)}",
+                cpf_cnpj=documento,
+                cpf_cnpj_digitos=somente_digitos(documento),
+                tipo="empresa" if empresa else "profissional",
+                local_armazenamento=local,
+                caixa=caixa,
+                fileira=fileira,
+                face=face,
+                observacoes=_frase(rng, 5, 20) if rng.random() < 0.4 else "",
+                criado_por=rng.choice(usuarios),
+            ))
+        criados = Protocolo.objects.bulk_create(lote)
+        # data_emissao é auto_now_add: espalha as datas depois de criar
+        for protocolo in criados:
+            protocolo.data_emissao = _data(rng)
+            protocolo.criado_em = REFERENCIA - datetime.timedelta(seconds=rng.randint(0, 10**8))
+        Protocolo.objects.bulk_update(criados, ["data_emissao", "criado_em"])
+    invalidar(Protocolo)
+
+
+def gerar_base(ementas=1000, protocolos=1000, usuarios=20, pdfs=20, tamanho_pdf=20_000, semente=42):
+    """
+    Gera a base sintética completa.
+
+    ``tamanho_pdf`` é a quantidade aproximada de caracteres de texto de cada
+    PDF (20000 caracteres dão um PDF de ~25 KB e 5 páginas).
+    """
+    rng = random.Random(semente)
+    lista_usuarios = gerar_usuarios(rng, usuarios)
+    lista_pdfs = gerar_pdfs(rng, pdfs, tamanho_pdf)
+    gerar_ementas(rng, ementas, lista_usuarios, lista_pdfs)
+    gerar_protocolos(rng, protocolos, lista_usuarios)
+    return Base(
+        usuario_comum=lista_usuarios[0],
+        usuario_publicador=lista_usuarios[1],
+        usuario_staff=lista_usuarios[2],
+        ementas=ementas,
+        protocolos=protocolos,
+        usuarios=len(lista_usuarios),
+    )
@@ -0,0 +1,124 @@
+"""
+Execução dos cenários e comparação de resultados.
+
+Cada cenário é requisitado pelo ``django.test.Client`` (sem servidor HTTP):
+a latência medida é a do Django (middlewares, view, banco e templates). As
+consultas são contadas com ``connection.execute_wrapper``
+(``core.instrumentacao.Medicao``), sem o custo do cursor de depuração.
+
+O cache das páginas anônimas (``core.cache_paginas``) fica desligado durante
+a medição, salvo nos cenários com ``cache_paginas``: com ele as repetições
+de um visitante anônimo seriam todas HIT e não mediriam a view.
+"""
+import contextlib
+import math
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+
+from core.instrumentacao import Medicao
+
+VERSAO_FORMATO = 1
+
+
+def percentil(ordenados, fracao):
+    """Percentil pelo método do posto mais próximo (lista já ordenada)"""
+    posto = max(math.ceil(fracao * len(ordenados)), 1)
+    return ordenados[posto - 1]
+
+
+def resumo(valores):
+    ordenados = sorted(valores)
+    return {
+        "min": round(ordenados[0], 3),
+        "media": round(sum(ordenados) / len(ordenados), 3),
+        "p50": round(percentil(ordenados, 0.50), 3),
+        "p90": round(percentil(ordenados, 0.90), 3),
+        "p95": round(percentil(ordenados, 0.95), 3),
+        "p99": round(percentil(ordenados, 0.99), 3),
+        "max": round(ordenados[-1], 3),
+    }
+
+
+def cache_das_paginas(cenario):
+    """Contexto da medição: sem o cache das páginas, salvo se o cenário o mede"""
+    if cenario.cache_paginas:
+        return contextlib.nullcontext()
+    return override_settings(CACHE_PAGINAS_TIMEOUT=0)
+
+
+def medir(cenario, repeticoes=30, aquecimento=3, cache_frio=False):
+    """
+    Requisita o cenário ``aquecimento + repeticoes`` vezes e resume as medições.
+
+    Com ``cache_frio`` o cache é limpo antes de cada requisição medida.
+    """
+    cliente = Client()
+    if cenario.usuario is not None:
+        cliente.force_login(cenario.usuario)
+
+    latencias, tempos_bd, consultas, status, x_cache = [], [], [], set(), set()
+    tamanho = 0
+    with cache_das_paginas(cenario):
+        for _ in range(aquecimento):
+            cliente.get(cenario.url, cenario.params)
+
+        for _ in range(repeticoes):
+            if cache_frio:
+                cache.clear()
+            medicao = Medicao()
+            with connection.execute_wrapper(medicao):
+                inicio = time.perf_counter()
+                response = cliente.get(cenario.url, cenario.params)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+            tempos_bd.append(medicao.tempo_bd * 1000)
+            consultas.append(len(medicao.consultas))
+            status.add(response.status_code)
+            if "X-Cache" in response:
+                x_cache.add(response["X-Cache"])
+            tamanho = len(response.content)
+
+    return {
+        "nome": cenario.nome,
+        "url": cenario.url,
+        "params": {chave: str(valor) for chave, valor in cenario.params.items()},
+        "usuario": cenario.usuario.get_username() if cenario.usuario is not None else None,
+        "repeticoes": repeticoes,
+        "status": sorted(status),
+        "x_cache": sorted(x_cache),
+        "bytes": tamanho,
+        "latencia_ms": resumo(latencias),
+        "bd_ms": resumo(tempos_bd),
+        "consultas": {"min": min(consultas), "max": max(consultas)},
+    }
+
+
+def comparar(antes, depois, limiar=0.10):
+    """
+    Compara dois resultados cenário a cenário.
+
+    Retorna linhas ``(nome, p50 antes, p50 depois, p95 antes, p95 depois,
+    consultas antes, consultas depois, regressao)``; há regressão quando o p95
+    piora mais que ``limiar`` (fração) ou o número máximo de consultas aumenta.
+    """
+    anteriores = {cenario["nome"]: cenario for cenario in antes["cenarios"]}
+    linhas = []
+    for cenario in depois["cenarios"]:
+        anterior = anteriores.get(cenario["nome"])
+        if anterior is None:
+            continue
+        p95_antes = anterior["latencia_ms"]["p95"]
+        p95_depois = cenario["latencia_ms"]["p95"]
+        consultas_antes = anterior["consultas"]["max"]
+        consultas_depois = cenario["consultas"]["max"]
+        regressao = p95_depois > p95_antes * (1 + limiar) or consultas_depois > consultas_antes
+        linhas.append((
+            cenario["nome"],
+            anterior["latencia_ms"]["p50"], cenario["latencia_ms"]["p50"],
+            p95_antes, p95_depois,
+            consultas_antes, consultas_depois,
+            regressao,
+        ))
+    return linhas
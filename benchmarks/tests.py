@@ -0,0 +1,61 @@
+import json
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from ementas.models import Ementa, TextoArquivo
+from protocolos.models import Protocolo
+
+from .cenarios import montar_cenarios
+from .dados import gerar_base
+from .medicao import comparar, medir, percentil
+
+
+class BenchmarksTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_base_sintetica(self):
+        """Testa que a base gerada é reprodutível e tem os campos mantidos pelo save()"""
+        base = gerar_base(ementas=40, protocolos=30, usuarios=3, pdfs=2, tamanho_pdf=300, semente=7)
+        self.assertEqual(Ementa.objects.count(), 40)
+        self.assertEqual(Protocolo.objects.count(), 30)
+        self.assertTrue(base.usuario_staff.is_staff)
+        self.assertTrue(TextoArquivo.objects.exists())
+        protocolo = Protocolo.objects.order_by('pk').first()
+        self.assertEqual(len(protocolo.cpf_cnpj_digitos), 14 if protocolo.tipo == 'empresa' else 11)
+        self.assertIsNotNone(protocolo.caixa)
+
+    def test_cenarios_respondem(self):
+        """Testa que todos os cenários respondem 200 e geram resultados em JSON"""
+        base = gerar_base(ementas=40, protocolos=30, usuarios=3, pdfs=2, tamanho_pdf=300)
+        resultados = [medir(cenario, repeticoes=2, aquecimento=0) for cenario in montar_cenarios(base)]
+        self.assertTrue(any(r['nome'] == 'ementa_list/q+tipo_ato+situacao+periodo' for r in resultados))
+        self.assertEqual({tuple(r['status']) for r in resultados}, {(200,)})
+        json.dumps(resultados)
+
+        por_nome = {r['nome']: r for r in resultados}
+        # Sem aquecimento só a primeira requisição do cenário com cache é MISS
+        self.assertEqual(por_nome['ementa_list/cache_hit']['x_cache'], ['HIT', 'MISS'])
+        self.assertEqual(por_nome['ementa_list/busca/palavra']['x_cache'], ['MISS'])
+        self.assertEqual(por_nome['ementa_list/sem_filtros']['x_cache'], ['MISS'])
+
+    def test_percentis_e_comparacao(self):
+        """Testa os percentis e a detecção de regressões"""
+        self.assertEqual(percentil(list(range(1, 101)), 0.95), 95)
+        self.assertEqual(percentil([5], 0.99), 5)
+
+        def resultado(p95, consultas):
+            return {'cenarios': [{
+                'nome': 'ementa_list', 'latencia_ms': {'p50': 1, 'p95': p95},
+                'consultas': {'max': consultas},
+            }]}
+
+        self.assertFalse(comparar(resultado(10, 3), resultado(10.5, 3))[0][-1])
+        self.assertTrue(comparar(resultado(10, 3), resultado(12, 3))[0][-1])
+        self.assertTrue(comparar(resultado(10, 3), resultado(10, 4))[0][-1])
@@ -0,0 +1,186 @@
+"""
+Entrega de arquivos do storage pelas views.
+
+``servir_arquivo`` responde com ``FileResponse`` (streaming, sem carregar o
+arquivo em memória), atende requisições ``Range`` de um único intervalo (os
+visualizadores de PDF dos navegadores buscam as páginas sob demanda) e GET
+condicional com ``ETag``/``Last-Modified``. Arquivos cujo conteúdo nunca muda
+para a URL solicitada podem ser marcados como imutáveis (cache público de um
+ano), o que só é seguro quando o acesso a eles também não muda; para arquivos
+com controle de acesso use ``max_age`` (cache só do navegador).
+
+Com ``ARQUIVOS_ENVIO`` configurado a transferência fica com o servidor web:
+
+- ``'x-accel-redirect'`` (nginx): envia ``X-Accel-Redirect`` com
+  ``ARQUIVOS_X_ACCEL_PREFIXO`` + nome do arquivo, que deve apontar para uma
+  ``location internal`` servindo ``MEDIA_ROOT``;
+- ``'x-sendfile'`` (Apache mod_xsendfile, lighttpd): envia ``X-Sendfile`` com
+  o caminho absoluto do arquivo.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import (
+    content_disposition_header, http_date, parse_http_date_safe, quote_etag,
+)
+
+TAMANHO_BLOCO = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RespostaArquivo(FileResponse):
+    block_size = TAMANHO_BLOCO
+
+
+class TrechoArquivo:
+    """Leitura limitada a ``tamanho`` bytes a partir da posição atual"""
+
+    def __init__(self, arquivo, tamanho):
+        self.arquivo = arquivo
+        self.restante = tamanho
+
+    def read(self, tamanho=-1):
+        if self.restante <= 0:
+            return b''
+        if tamanho < 0 or tamanho > self.restante:
+            tamanho = self.restante
+        dados = self.arquivo.read(tamanho)
+        self.restante -= len(dados)
+        return dados
+
+    def close(self):
+        self.arquivo.close()
+
+
+def _metadados(storage, nome):
+    """Retorna (tamanho, modificado_em) do arquivo; None se o storage não informar"""
+    try:
+        tamanho = storage.size(nome)
+    except NotImplementedError:
+        tamanho = None
+    try:
+        modificado_em = storage.get_modified_time(nome)
+    except NotImplementedError:
+        modificado_em = None
+    return tamanho, modificado_em
+
+
+def calcular_etag(tamanho, modificado_em):
+    if tamanho is None or modificado_em is None:
+        return None
+    return quote_etag(f'{tamanho:x}-{int(modificado_em.timestamp() * 1_000_000):x}')
+
+
+def intervalo_solicitado(request, tamanho, etag, ultima_modificacao):
+    """
+    Interpreta o cabeçalho Range e retorna (inicio, fim) inclusivo.
+
+    Retorna None para servir o arquivo inteiro (sem Range, vários intervalos
+    ou If-Range desatualizado) e False se o intervalo não pode ser atendido.
+    """
+    cabecalho = request.headers.get('Range', '').strip()
+    if not cabecalho or tamanho is None:
+        return None
+
+    if_range = request.headers.get('If-Range', '').strip()
+    if if_range:
+        data = parse_http_date_safe(if_range)
+        if data is None:
+            if if_range != etag:
+                return None
+        elif ultima_modificacao is None or int(ultima_modificacao) > data:
+            return None
+
+    encontrado = RANGE_RE.match(cabecalho.replace(' ', ''))
+    if not encontrado:
+        return None
+    inicio, fim = encontrado.groups()
+    if not inicio and not fim:
+        return None
+    if not inicio:
+        # Sufixo: os últimos N bytes
+        sufixo = int(fim)
+        if sufixo == 0:
+            return False
+        return max(tamanho - sufixo, 0), tamanho - 1
+    inicio = int(inicio)
+    fim = min(int(fim), tamanho - 1) if fim else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def _envio():
+    return getattr(settings, 'ARQUIVOS_ENVIO', '').lower()
+
+
+CACHE_IMUTAVEL = 365 * 24 * 60 * 60
+
+
+def servir_arquivo(request, storage, nome, nome_download=None,
+                   content_type='application/octet-stream', privado=False,
+                   etag=None, imutavel=False, max_age=None):
+    """
+    Resposta com o arquivo ``nome`` do storage, exibido inline no navegador.
+
+    ``etag`` substitui o ETag calculado por tamanho e data (ex.: o hash do
+    conteúdo); ``imutavel`` (público, um ano) e ``max_age`` (``private``) só
+    valem para arquivos que não são privados.
+    """
+    tamanho, modificado_em = _metadados(storage, nome)
+    etag = quote_etag(etag) if etag else calcular_etag(tamanho, modificado_em)
+    ultima_modificacao = modificado_em.timestamp() if modificado_em else None
+
+    condicional = get_conditional_response(
+        request, etag=etag, last_modified=int(ultima_modificacao) if ultima_modificacao else None,
+    )
+    if condicional is not None:
+        return condicional
+
+    nome_download = nome_download or os.path.basename(nome)
+    envio = _envio()
+    if envio in ('x-accel-redirect', 'x-sendfile'):
+        # O servidor web transfere o arquivo (e trata o Range)
+        response = HttpResponse(content_type=content_type)
+        if envio == 'x-accel-redirect':
+            prefixo = getattr(settings, 'ARQUIVOS_X_ACCEL_PREFIXO', '/protegido/')
+            response['X-Accel-Redirect'] = prefixo.rstrip('/') + '/' + nome.lstrip('/')
+        else:
+            response['X-Sendfile'] = storage.path(nome)
+        response['Content-Disposition'] = content_disposition_header(False, nome_download)
+    else:
+        intervalo = intervalo_solicitado(request, tamanho, etag, ultima_modificacao)
+        if intervalo is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{tamanho}'
+            return response
+
+        arquivo = storage.open(nome, 'rb')
+        if intervalo is None:
+            response = RespostaArquivo(arquivo, filename=nome_download, content_type=content_type)
+        else:
+            inicio, fim = intervalo
+            arquivo.seek(inicio)
+            response = RespostaArquivo(
+                TrechoArquivo(arquivo, fim - inicio + 1), filename=nome_download,
+                content_type=content_type, status=206,
+            )
+            response['Content-Length'] = str(fim - inicio + 1)
+            response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+        response['Accept-Ranges'] = 'bytes'
+
+    if etag:
+        response['ETag'] = etag
+    if ultima_modificacao:
+        response['Last-Modified'] = http_date(ultima_modificacao)
+    if privado:
+        patch_cache_control(response, private=True, no_cache=True)
+    elif imutavel:
+        patch_cache_control(response, public=True, max_age=CACHE_IMUTAVEL, immutable=True)
+    elif max_age:
+        patch_cache_control(response, private=True, max_age=max_age)
+    return response
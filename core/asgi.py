@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Sem conexões persistentes: pool ou uma conexão por requisição (core.banco)
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
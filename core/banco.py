@@ -0,0 +1,87 @@
+"""
+Conexões com o PostgreSQL.
+
+``configurar_conexoes`` completa ``DATABASES['default']`` conforme o modo
+escolhido em ``DB_CONEXOES``:
+
+- ``pool``: pool do psycopg 3 (``psycopg[pool]``), um por processo, com
+  ``DB_POOL_MIN``/``DB_POOL_MAX`` conexões; a conexão é verificada antes de
+  ser entregue (``CONN_HEALTH_CHECKS``) e volta ao pool no fim da requisição;
+- ``persistente``: uma conexão por thread reaproveitada por até
+  ``DB_CONN_MAX_AGE`` segundos, verificada no início de cada requisição;
+- ``por_requisicao``: abre e fecha uma conexão a cada requisição.
+
+Sob ASGI (``core.asgi``) as conexões persistentes não são seguras: cada
+requisição pode rodar em outra thread e as conexões se acumulam. Nesse caso o
+padrão é o pool (ou ``por_requisicao`` se o ``psycopg_pool`` não estiver
+instalado) e ``persistente`` é recusado.
+
+Cada processo tem o próprio pool: ``workers × DB_POOL_MAX`` deve caber em
+``max_connections`` do PostgreSQL, descontadas as conexões de manutenção.
+"""
+import importlib.util
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+MODOS = ("pool", "persistente", "por_requisicao")
+
+
+def pool_disponivel():
+    return importlib.util.find_spec("psycopg_pool") is not None
+
+
+def modo_padrao(asgi):
+    if not asgi:
+        return "persistente"
+    return "pool" if pool_disponivel() else "por_requisicao"
+
+
+def configurar_conexoes(
+    banco, modo=None, *, asgi=False, max_age=60, pool_min=2, pool_max=4,
+    pool_timeout=10.0, pool_max_idle=600.0, pool_max_lifetime=3600.0,
+):
+    """Retorna uma cópia de ``banco`` (entrada de DATABASES) configurada para o modo"""
+    modo = modo or modo_padrao(asgi)
+    if modo not in MODOS:
+        raise ImproperlyConfigured(f"DB_CONEXOES inválido: {modo!r} (use {', '.join(MODOS)}).")
+    if modo == "persistente" and asgi:
+        raise ImproperlyConfigured(
+            "Conexões persistentes não são seguras sob ASGI; use DB_CONEXOES=pool ou por_requisicao."
+        )
+    if modo == "pool" and pool_min > pool_max:
+        raise ImproperlyConfigured("DB_POOL_MIN não pode ser maior que DB_POOL_MAX.")
+
+    banco = dict(banco, OPTIONS=dict(banco.get("OPTIONS", {})))
+    if modo == "pool":
+        # O pool guarda as conexões: o Django exige CONN_MAX_AGE = 0
+        banco["CONN_MAX_AGE"] = 0
+        banco["CONN_HEALTH_CHECKS"] = True
+        banco["OPTIONS"]["pool"] = {
+            "min_size": pool_min,
+            "max_size": pool_max,
+            "timeout": pool_timeout,
+            "max_idle": pool_max_idle,
+            "max_lifetime": pool_max_lifetime,
+            "name": banco.get("NAME") or "default",
+        }
+    elif modo == "persistente":
+        banco["CONN_MAX_AGE"] = max_age
+        banco["CONN_HEALTH_CHECKS"] = True
+    else:
+        banco["CONN_MAX_AGE"] = 0
+    return banco
+
+
+def estatisticas_pool(alias="default"):
+    """
+    Estatísticas do pool deste processo (``psycopg_pool.ConnectionPool.get_stats``),
+    com a espera média por uma conexão; ``None`` fora do modo pool.
+    """
+    conexao = connections[alias]
+    if conexao.vendor != "postgresql" or not conexao.settings_dict["OPTIONS"].get("pool"):
+        return None
+    estatisticas = conexao.pool.get_stats()
+    pedidos = estatisticas.get("requests_num", 0)
+    estatisticas["espera_media_ms"] = estatisticas.get("requests_wait_ms", 0) / pedidos if pedidos else 0.0
+    return estatisticas
@@ -0,0 +1,217 @@
+"""
+Cache das páginas públicas para visitantes anônimos.
+
+``cache_anonimo`` guarda a resposta de uma view (GET/HEAD, status 200) para
+usuários não autenticados, com chave formada pelo caminho, pelos parâmetros
+da querystring normalizados (ordenados, sem valores vazios nem parâmetros de
+rastreamento) e pelas versões das tags da página. Invalidar uma tag
+(``invalidar_tags``) incrementa sua versão, então todas as páginas marcadas
+com ela deixam de ser encontradas de uma vez.
+
+As respostas anônimas saem com ``Cache-Control: public``, ``Vary: Cookie`` e
+``Surrogate-Key`` (as tags), para um proxy reverso ou CDN; as de usuários
+autenticados (que mostram botões de edição) nunca são guardadas e saem como
+``private``. O sinal ``paginas_invalidadas`` permite purgar as mesmas tags
+no proxy. Views assíncronas usam os métodos assíncronos do cache e da sessão.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+# Enviado com ``tags`` sempre que páginas são invalidadas
+paginas_invalidadas = Signal()
+
+PARAMETROS_IGNORADOS = {"fbclid", "gclid"}
+PREFIXOS_IGNORADOS = ("utm_",)
+
+
+def _timeout():
+    return getattr(settings, "CACHE_PAGINAS_TIMEOUT", 300)
+
+
+def _max_age():
+    return getattr(settings, "CACHE_PAGINAS_MAX_AGE", 60)
+
+
+def _chave_tag(tag):
+    return f"paginas:tag:{tag}"
+
+
+def versoes(tags):
+    """Versões atuais das tags, em uma ida ao cache"""
+    chaves = [_chave_tag(tag) for tag in tags]
+    atuais = cache.get_many(chaves)
+    faltando = {chave: 1 for chave in chaves if chave not in atuais}
+    if faltando:
+        cache.set_many(faltando, None)
+    return [atuais.get(chave, 1) for chave in chaves]
+
+
+async def aversoes(tags):
+    chaves = [_chave_tag(tag) for tag in tags]
+    atuais = await cache.aget_many(chaves)
+    faltando = {chave: 1 for chave in chaves if chave not in atuais}
+    if faltando:
+        await cache.aset_many(faltando, None)
+    return [atuais.get(chave, 1) for chave in chaves]
+
+
+def invalidar_tags(*tags):
+    """Invalida as páginas marcadas com qualquer uma das tags"""
+    for tag in tags:
+        try:
+            cache.incr(_chave_tag(tag))
+        except ValueError:
+            cache.set(_chave_tag(tag), 1, None)
+    paginas_invalidadas.send(sender=None, tags=tags)
+
+
+def invalidar_ao_alterar(modelo, tags):
+    """Invalida ``tags(instancia)`` quando o modelo é salvo ou excluído"""
+    def receptor(sender, instance, **kwargs):
+        invalidar_tags(*tags(instance))
+
+    uid = f"paginas:{modelo._meta.label_lower}"
+    post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=uid)
+    post_delete.connect(receptor, sender=modelo, weak=False, dispatch_uid=uid)
+
+
+def parametros_normalizados(params):
+    return sorted(
+        (chave, valor)
+        for chave in params
+        if chave not in PARAMETROS_IGNORADOS and not chave.startswith(PREFIXOS_IGNORADOS)
+        for valor in params.getlist(chave)
+        if valor.strip()
+    )
+
+
+def _chave_pagina(request, tags, versoes_tags):
+    conteudo = json.dumps([request.path, parametros_normalizados(request.GET), tags, versoes_tags])
+    return "paginas:resposta:" + hashlib.md5(conteudo.encode(), usedforsecurity=False).hexdigest()
+
+
+def chave_pagina(request, tags):
+    return _chave_pagina(request, tags, versoes(tags))
+
+
+def _tem_mensagens(request):
+    """Mensagens pendentes (django.contrib.messages) tornam a página pessoal"""
+    if "messages" in request.COOKIES:
+        return True
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    return bool(request.session.get("_messages"))
+
+
+async def _atem_mensagens(request):
+    if "messages" in request.COOKIES:
+        return True
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return False
+    return bool(await request.session.aget("_messages"))
+
+
+def _cabecalhos_publicos(response, tags):
+    patch_cache_control(response, public=True, max_age=_max_age())
+    patch_vary_headers(response, ["Cookie"])
+    response["Surrogate-Key"] = " ".join(tags)
+    return response
+
+
+def _resposta_pessoal(response, autenticado):
+    if autenticado:
+        patch_cache_control(response, private=True)
+    patch_vary_headers(response, ["Cookie"])
+    return response
+
+
+def _resposta_guardada(request, guardada, tags):
+    conteudo, content_type, etag = guardada
+    nao_modificada = get_conditional_response(request, etag=etag)
+    if nao_modificada is not None:
+        return _cabecalhos_publicos(nao_modificada, tags)
+    response = HttpResponse(conteudo, content_type=content_type)
+    response["ETag"] = etag
+    response["X-Cache"] = "HIT"
+    return _cabecalhos_publicos(response, tags)
+
+
+def _guardavel(response):
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def _para_guardar(response, tags):
+    """Marca a resposta nova como pública e retorna o que vai para o cache"""
+    etag = '"%s"' % hashlib.md5(response.content, usedforsecurity=False).hexdigest()
+    response["ETag"] = etag
+    response["X-Cache"] = "MISS"
+    _cabecalhos_publicos(response, tags)
+    return (response.content, response["Content-Type"], etag)
+
+
+def cache_anonimo(tags):
+    """
+    Decorator de view: guarda a resposta para visitantes anônimos.
+
+    ``tags(request, *args, **kwargs)`` retorna as tags da página.
+    """
+    def decorador(view):
+        if iscoroutinefunction(view):
+            return _cache_anonimo_async(view, tags)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated
+                or _tem_mensagens(request)
+            ):
+                return _resposta_pessoal(view(request, *args, **kwargs), request.user.is_authenticated)
+
+            lista_tags = list(tags(request, *args, **kwargs))
+            chave = chave_pagina(request, lista_tags)
+            guardada = cache.get(chave)
+            if guardada is not None:
+                return _resposta_guardada(request, guardada, lista_tags)
+
+            response = view(request, *args, **kwargs)
+            if not _guardavel(response):
+                patch_vary_headers(response, ["Cookie"])
+                return response
+            cache.set(chave, _para_guardar(response, lista_tags), _timeout())
+            return response
+
+        return wrapper
+    return decorador
+
+
+def _cache_anonimo_async(view, tags):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        autenticado = (await request.auser()).is_authenticated
+        if request.method not in ("GET", "HEAD") or autenticado or await _atem_mensagens(request):
+            return _resposta_pessoal(await view(request, *args, **kwargs), autenticado)
+
+        lista_tags = list(tags(request, *args, **kwargs))
+        chave = _chave_pagina(request, lista_tags, await aversoes(lista_tags))
+        guardada = await cache.aget(chave)
+        if guardada is not None:
+            return _resposta_guardada(request, guardada, lista_tags)
+
+        response = await view(request, *args, **kwargs)
+        if not _guardavel(response):
+            patch_vary_headers(response, ["Cookie"])
+            return response
+        await cache.aset(chave, _para_guardar(response, lista_tags), _timeout())
+        return response
+
+    return wrapper
@@ -0,0 +1,173 @@
+"""
+Contagem de resultados das listagens.
+
+Evita um ``COUNT(*)`` a cada requisição:
+
+- contagens exatas ficam em cache por assinatura da consulta (o SQL gerado
+  com os parâmetros, o que já normaliza os filtros aplicados) e são
+  invalidadas quando o modelo é salvo ou excluído;
+- no PostgreSQL, consultas sem filtro usam ``pg_class.reltuples`` e as demais
+  a estimativa do planejador (``EXPLAIN``); se a estimativa passar de
+  ``CONTAGEM_LIMIAR_ESTIMATIVA`` a contagem exata não é feita.
+
+``aversao``, ``ainvalidar`` e ``acontar`` são as versões para o código
+assíncrono.
+"""
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import cached_property
+
+
+def _limiar():
+    return getattr(settings, 'CONTAGEM_LIMIAR_ESTIMATIVA', 100_000)
+
+
+def _timeout():
+    return getattr(settings, 'CONTAGEM_CACHE_TIMEOUT', 300)
+
+
+def _chave_versao(modelo):
+    return f'contagem:versao:{modelo._meta.label_lower}'
+
+
+def versao(modelo):
+    """Versão atual das contagens do modelo (muda a cada alteração)"""
+    return cache.get_or_set(_chave_versao(modelo), 1, None)
+
+
+async def aversao(modelo):
+    return await cache.aget_or_set(_chave_versao(modelo), 1, None)
+
+
+def invalidar(modelo):
+    """Invalida todas as contagens em cache do modelo"""
+    try:
+        cache.incr(_chave_versao(modelo))
+    except ValueError:
+        cache.set(_chave_versao(modelo), 1, None)
+
+
+async def ainvalidar(modelo):
+    try:
+        await cache.aincr(_chave_versao(modelo))
+    except ValueError:
+        await cache.aset(_chave_versao(modelo), 1, None)
+
+
+def invalidar_ao_alterar(modelo):
+    """Conecta a invalidação das contagens aos sinais de save/delete do modelo"""
+    def receptor(sender, **kwargs):
+        invalidar(sender)
+
+    uid = f'contagem:{modelo._meta.label_lower}'
+    post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=uid)
+    post_delete.connect(receptor, sender=modelo, weak=False, dispatch_uid=uid)
+
+
+def assinatura(queryset):
+    """Assinatura normalizada da consulta: hash do SQL e dos parâmetros"""
+    # Apenas filtros entram na assinatura: anotações de exibição são ignoradas
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    conteudo = json.dumps([sql, [str(p) for p in params]])
+    return hashlib.md5(conteudo.encode(), usedforsecurity=False).hexdigest()
+
+
+def _estimativa_tabela(queryset):
+    """Quantidade aproximada de linhas da tabela (pg_class.reltuples)"""
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        linha = cursor.fetchone()
+    # reltuples = -1 enquanto a tabela não foi analisada
+    return linha[0] if linha and linha[0] >= 0 else None
+
+
+def _estimativa_planejador(queryset):
+    """Quantidade de linhas estimada pelo planejador do PostgreSQL"""
+    plano = json.loads(queryset.order_by().values('pk').explain(format='json'))
+    return plano[0]['Plan']['Plan Rows']
+
+
+def estimar(queryset):
+    """Estimativa barata da contagem ou None se indisponível"""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    if not queryset.query.where:
+        return _estimativa_tabela(queryset)
+    return _estimativa_planejador(queryset)
+
+
+def _chave_contagem(queryset, versao_modelo):
+    return f'contagem:{queryset.model._meta.label_lower}:{versao_modelo}:{assinatura(queryset)}'
+
+
+def contar(queryset):
+    """
+    Retorna (total, aproximado) para o queryset.
+
+    Usa o cache quando possível; resultados muito grandes ficam com a
+    estimativa do banco em vez do COUNT(*) exato.
+    """
+    try:
+        chave = _chave_contagem(queryset, versao(queryset.model))
+    except EmptyResultSet:
+        return 0, False
+    em_cache = cache.get(chave)
+    if em_cache is not None:
+        return em_cache
+
+    estimativa = estimar(queryset)
+    if estimativa is not None and estimativa >= _limiar():
+        resultado = (estimativa, True)
+    else:
+        resultado = (queryset.count(), False)
+    cache.set(chave, resultado, _timeout())
+    return resultado
+
+
+async def acontar(queryset):
+    """Versão assíncrona de ``contar``"""
+    try:
+        chave = _chave_contagem(queryset, await aversao(queryset.model))
+    except EmptyResultSet:
+        return 0, False
+    em_cache = await cache.aget(chave)
+    if em_cache is not None:
+        return em_cache
+
+    # A estimativa usa o cursor diretamente: roda na thread da requisição
+    estimativa = None
+    if connections[queryset.db].vendor == 'postgresql':
+        estimativa = await sync_to_async(estimar)(queryset)
+    if estimativa is not None and estimativa >= _limiar():
+        resultado = (estimativa, True)
+    else:
+        resultado = (await queryset.acount(), False)
+    await cache.aset(chave, resultado, _timeout())
+    return resultado
+
+
+class PaginatorContagem(Paginator):
+    """Paginator que obtém o total pela camada de contagem"""
+
+    @cached_property
+    def _contagem(self):
+        return contar(self.object_list)
+
+    @cached_property
+    def count(self):
+        return self._contagem[0]
+
+    @property
+    def contagem_aproximada(self):
+        return self._contagem[1]
@@ -0,0 +1,227 @@
+"""
+Exportação das listagens em streaming (CSV, JSON Lines e XLSX).
+
+Os registros vêm de ``QuerySet.values().iterator(chunk_size=...)`` (cursor no
+servidor no PostgreSQL) e cada formato é gerado linha a linha, então a
+memória usada não depende da quantidade de registros. O XLSX é montado
+diretamente no ZIP (planilha única, textos inline, sem estilos), sem
+bibliotecas externas.
+
+As colunas são uma lista de ``(chave, título)``; os registros, dicionários.
+
+Sob ASGI o Django só transmite iteradores assíncronos: um gerador síncrono
+seria lido inteiro com ``sync_to_async(list)`` antes do envio. Nesse caso a
+resposta usa ``partes_assincronas``, que pede cada parte ao gerador na
+thread da requisição (a mesma do cursor do banco).
+"""
+import csv
+import datetime
+import io
+import json
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+TAMANHO_LOTE = 2000
+
+# Tamanho aproximado de cada parte enviada ao cliente
+TAMANHO_PARTE = 64 * 1024
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+# Caracteres de controle não permitidos em XML 1.0
+CONTROLE_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+class _Buffer:
+    """Destino binário que acumula o que foi escrito até ser esvaziado"""
+
+    def __init__(self):
+        self.partes = []
+        self.tamanho = 0
+
+    def write(self, dados):
+        self.partes.append(dados)
+        self.tamanho += len(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        self.tamanho = 0
+        return dados
+
+
+def gerar_csv(colunas, registros):
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+
+    def esvaziar():
+        dados = texto.getvalue().encode()
+        texto.seek(0)
+        texto.truncate()
+        return dados
+
+    # BOM para o Excel reconhecer o UTF-8
+    texto.write('\ufeff')
+    escritor.writerow([titulo for _, titulo in colunas])
+    for registro in registros:
+        escritor.writerow([_texto(registro.get(chave)) for chave, _ in colunas])
+        if texto.tell() >= TAMANHO_PARTE:
+            yield esvaziar()
+    yield esvaziar()
+
+
+def gerar_ndjson(colunas, registros):
+    partes = []
+    tamanho = 0
+    for registro in registros:
+        linha = {chave: registro.get(chave) for chave, _ in colunas}
+        parte = (json.dumps(linha, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode()
+        partes.append(parte)
+        tamanho += len(parte)
+        if tamanho >= TAMANHO_PARTE:
+            yield b''.join(partes)
+            partes, tamanho = [], 0
+    yield b''.join(partes)
+
+
+XLSX_ESTATICOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Dados" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _celula_xlsx(valor):
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(CONTROLE_RE.sub('', _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xlsx(valores):
+    return '<row>' + ''.join(_celula_xlsx(valor) for valor in valores) + '</row>'
+
+
+def gerar_xlsx(colunas, registros):
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in XLSX_ESTATICOS.items():
+            arquivo_zip.writestr(nome, conteudo)
+        yield buffer.esvaziar()
+
+        with arquivo_zip.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _linha_xlsx(titulo for _, titulo in colunas)
+            ).encode())
+            for registro in registros:
+                planilha.write(_linha_xlsx(registro.get(chave) for chave, _ in colunas).encode())
+                if buffer.tamanho >= TAMANHO_PARTE:
+                    yield buffer.esvaziar()
+            planilha.write(b'</sheetData></worksheet>')
+    yield buffer.esvaziar()
+
+
+GERADORES = {
+    'csv': gerar_csv,
+    'ndjson': gerar_ndjson,
+    'xlsx': gerar_xlsx,
+}
+
+
+def exportar(formato, colunas, registros):
+    """Gera o arquivo exportado em partes (bytes)"""
+    for parte in GERADORES[formato](colunas, registros):
+        if parte:
+            yield parte
+
+
+async def partes_assincronas(partes):
+    """Iterador assíncrono sobre um gerador síncrono, uma parte por vez"""
+    proxima = sync_to_async(next)
+    fim = object()
+    try:
+        while (parte := await proxima(partes, fim)) is not fim:
+            yield parte
+    finally:
+        # Fecha o gerador (e o cursor do banco) na thread em que foi usado
+        await sync_to_async(partes.close)()
+
+
+def resposta_exportacao(nome, formato, colunas, registros):
+    """StreamingHttpResponse com o download do arquivo exportado"""
+    content_type, extensao = FORMATOS[formato]
+    partes = exportar(formato, colunas, registros)
+    if getattr(settings, 'SERVIDOR_ASGI', False):
+        partes = partes_assincronas(partes)
+    response = StreamingHttpResponse(partes, content_type=content_type)
+    response['Content-Disposition'] = content_disposition_header(True, f'{nome}.{extensao}')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def gravar_exportacao(saida, formato, colunas, registros):
+    """Grava o arquivo exportado em um arquivo binário aberto; retorna os bytes escritos"""
+    total = 0
+    for parte in exportar(formato, colunas, registros):
+        saida.write(parte)
+        total += len(parte)
+    return total
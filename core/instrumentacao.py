@@ -0,0 +1,355 @@
+"""
+Medição das requisições: consultas SQL, tempo no banco, templates e total.
+
+``InstrumentacaoMiddleware`` registra cada consulta com
+``connection.execute_wrapper`` e, com o backend de templates
+``DjangoTemplatesMedidos``, o tempo de renderização. Ao fim da requisição:
+
+- o cabeçalho ``Server-Timing`` informa os tempos ao navegador (aba de rede);
+- requisições acima de ``INSTRUMENTACAO_ORCAMENTO_MS`` vão para o log com as
+  consultas mais lentas e as repetidas (mesma impressão digital, típico de
+  N+1), sempre sem os parâmetros, que podem conter CPF/CNPJ;
+- os totais entram em histogramas por view, acumulados no processo e somados
+  no cache a cada ``INSTRUMENTACAO_INTERVALO`` segundos, exibidos na página
+  ``/desempenho/`` (somente staff).
+
+Sob ASGI as consultas das views assíncronas rodam na thread da requisição
+(``sync_to_async``), onde o middleware instala o mesmo ``execute_wrapper``.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (ms) das faixas dos histogramas; a última faixa é "acima"
+FAIXAS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+CHAVE_VIEWS = "instrumentacao:views"
+CONTADORES = ("requisicoes", "total_ms", "bd_ms", "templates_ms", "consultas")
+
+_medicao_atual = contextvars.ContextVar("medicao_atual", default=None)
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_LISTA_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+_NUMERO_RE = re.compile(r"\b\d+\b")
+
+
+def _ativa():
+    return getattr(settings, "INSTRUMENTACAO_ATIVA", True)
+
+
+def _orcamento_ms():
+    return getattr(settings, "INSTRUMENTACAO_ORCAMENTO_MS", 500)
+
+
+def _intervalo():
+    return getattr(settings, "INSTRUMENTACAO_INTERVALO", 10)
+
+
+def impressao_digital(sql):
+    """SQL normalizado: literais viram ``?`` e listas de ``IN`` viram ``(...)``"""
+    sql = _LITERAL_RE.sub("?", sql)
+    sql = _LISTA_RE.sub("(...)", sql)
+    sql = _NUMERO_RE.sub("?", sql)
+    return " ".join(sql.split())
+
+
+class Medicao:
+    """Tempos e consultas de uma requisição"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.total = 0.0
+        self.tempo_templates = 0.0
+        self.consultas = []
+        self._profundidade = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Wrapper de ``connection.execute_wrapper``"""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas.append((sql, time.perf_counter() - inicio))
+
+    @contextmanager
+    def medir_templates(self):
+        # Templates renderizados dentro de outro não são somados duas vezes
+        self._profundidade += 1
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._profundidade -= 1
+            if not self._profundidade:
+                self.tempo_templates += time.perf_counter() - inicio
+
+    def encerrar(self):
+        self.total = time.perf_counter() - self.inicio
+
+    @property
+    def tempo_bd(self):
+        return sum(duracao for _, duracao in self.consultas)
+
+    def mais_lentas(self, quantidade=5):
+        return sorted(self.consultas, key=lambda consulta: consulta[1], reverse=True)[:quantidade]
+
+    def repetidas(self, minimo=2):
+        """(impressão digital, vezes, tempo somado) das consultas repetidas"""
+        vezes, tempos = Counter(), Counter()
+        for sql, duracao in self.consultas:
+            digital = impressao_digital(sql)
+            vezes[digital] += 1
+            tempos[digital] += duracao
+        return [
+            (digital, quantidade, tempos[digital])
+            for digital, quantidade in vezes.most_common()
+            if quantidade >= minimo
+        ]
+
+    def server_timing(self):
+        return ", ".join([
+            f'bd;dur={self.tempo_bd * 1000:.1f};desc="{len(self.consultas)} consultas"',
+            f"templates;dur={self.tempo_templates * 1000:.1f}",
+            f"total;dur={self.total * 1000:.1f}",
+        ])
+
+
+class TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None:
+            return super().render(context, request)
+        with medicao.medir_templates():
+            return super().render(context, request)
+
+
+class DjangoTemplatesMedidos(DjangoTemplates):
+    """Backend de templates do Django que soma o tempo de renderização"""
+
+    def from_string(self, template_code):
+        return TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TemplateMedido(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def faixa(milissegundos):
+    """Índice da faixa do histograma para o tempo informado"""
+    for indice, limite in enumerate(FAIXAS_MS):
+        if milissegundos <= limite:
+            return indice
+    return len(FAIXAS_MS)
+
+
+def _chave(view, nome):
+    return f"instrumentacao:{view}:{nome}"
+
+
+def _nomes_contadores():
+    return [*CONTADORES, *(f"faixa{indice}" for indice in range(len(FAIXAS_MS) + 1))]
+
+
+class Agregador:
+    """Histogramas por view acumulados no processo e descarregados no cache"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._pendentes = defaultdict(Counter)
+        self._ultimo = time.monotonic()
+
+    def registrar(self, view, medicao):
+        if self.acumular(view, medicao):
+            self.descarregar()
+
+    def acumular(self, view, medicao):
+        """Soma a medição no processo; indica se já é hora de descarregar"""
+        total_ms = medicao.total * 1000
+        with self._trava:
+            contadores = self._pendentes[view]
+            contadores["requisicoes"] += 1
+            contadores["total_ms"] += round(total_ms)
+            contadores["bd_ms"] += round(medicao.tempo_bd * 1000)
+            contadores["templates_ms"] += round(medicao.tempo_templates * 1000)
+            contadores["consultas"] += len(medicao.consultas)
+            contadores[f"faixa{faixa(total_ms)}"] += 1
+            return time.monotonic() - self._ultimo >= _intervalo()
+
+    def descarregar(self):
+        """Soma os contadores pendentes do processo aos do cache"""
+        with self._trava:
+            pendentes, self._pendentes = self._pendentes, defaultdict(Counter)
+            self._ultimo = time.monotonic()
+        if not pendentes:
+            return
+
+        views = cache.get(CHAVE_VIEWS) or set()
+        if not views.issuperset(pendentes):
+            cache.set(CHAVE_VIEWS, views | set(pendentes), None)
+        for view, contadores in pendentes.items():
+            for nome, valor in contadores.items():
+                chave = _chave(view, nome)
+                try:
+                    cache.incr(chave, valor)
+                except ValueError:
+                    if not cache.add(chave, valor, None):
+                        cache.incr(chave, valor)
+
+    def descartar(self):
+        with self._trava:
+            self._pendentes.clear()
+
+
+agregador = Agregador()
+
+
+def percentil(faixas, requisicoes, fracao):
+    """Limite superior (ms) da faixa onde está o percentil; ``None`` se acima da última"""
+    alvo = fracao * requisicoes
+    acumulado = 0
+    for indice, quantidade in enumerate(faixas):
+        acumulado += quantidade
+        if acumulado >= alvo:
+            return FAIXAS_MS[indice] if indice < len(FAIXAS_MS) else None
+    return None
+
+
+def histogramas():
+    """Totais e faixas de tempo por view, das mais custosas para as menos"""
+    agregador.descarregar()
+    views = sorted(cache.get(CHAVE_VIEWS) or ())
+    nomes = _nomes_contadores()
+    valores = cache.get_many([_chave(view, nome) for view in views for nome in nomes])
+
+    resultado = []
+    for view in views:
+        dados = {nome: valores.get(_chave(view, nome), 0) for nome in nomes}
+        requisicoes = dados["requisicoes"]
+        if not requisicoes:
+            continue
+        faixas = [dados[f"faixa{indice}"] for indice in range(len(FAIXAS_MS) + 1)]
+        resultado.append({
+            "view": view,
+            "requisicoes": requisicoes,
+            "total_ms": dados["total_ms"],
+            "media_ms": dados["total_ms"] / requisicoes,
+            "media_bd_ms": dados["bd_ms"] / requisicoes,
+            "media_templates_ms": dados["templates_ms"] / requisicoes,
+            "media_consultas": dados["consultas"] / requisicoes,
+            "p50_ms": percentil(faixas, requisicoes, 0.5),
+            "p95_ms": percentil(faixas, requisicoes, 0.95),
+            "faixas": faixas,
+        })
+    return sorted(resultado, key=lambda linha: linha["total_ms"], reverse=True)
+
+
+def zerar_histogramas():
+    agregador.descartar()
+    views = cache.get(CHAVE_VIEWS) or ()
+    cache.delete_many([_chave(view, nome) for view in views for nome in _nomes_contadores()])
+    cache.delete(CHAVE_VIEWS)
+
+
+def _resumo_sql(sql, tamanho=300):
+    sql = " ".join(sql.split())
+    return sql if len(sql) <= tamanho else sql[:tamanho] + "..."
+
+
+def registrar_lenta(request, view, medicao):
+    linhas = [
+        "Requisição lenta: %s %s (%s) %.0f ms, %d consulta(s) em %.0f ms, templates %.0f ms" % (
+            request.method, request.path, view, medicao.total * 1000,
+            len(medicao.consultas), medicao.tempo_bd * 1000, medicao.tempo_templates * 1000,
+        )
+    ]
+    for sql, duracao in medicao.mais_lentas():
+        linhas.append("  lenta %.1f ms: %s" % (duracao * 1000, _resumo_sql(sql)))
+    for digital, vezes, duracao in medicao.repetidas()[:5]:
+        linhas.append("  repetida %dx (%.1f ms): %s" % (vezes, duracao * 1000, _resumo_sql(digital)))
+    logger.warning("\n".join(linhas))
+
+
+def nome_view(request):
+    correspondencia = getattr(request, "resolver_match", None)
+    return correspondencia.view_name if correspondencia else "(sem rota)"
+
+
+@contextmanager
+def medindo_consultas(medicao):
+    """Instala o wrapper da medição nas conexões da thread atual"""
+    with ExitStack() as pilha:
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(medicao))
+        yield
+
+
+class InstrumentacaoMiddleware:
+    """Mede consultas e tempos de cada requisição (deve ser o primeiro middleware)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _ativa():
+            return self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        try:
+            with medindo_consultas(medicao):
+                response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        if self._concluir(request, response, medicao):
+            agregador.descarregar()
+        return response
+
+    async def __acall__(self, request):
+        if not _ativa():
+            return await self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        # As consultas do ORM assíncrono rodam na thread da requisição
+        # (sync_to_async com thread_sensitive): o wrapper é instalado lá
+        medindo = medindo_consultas(medicao)
+        await sync_to_async(medindo.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(medindo.__exit__)(None, None, None)
+            _medicao_atual.reset(token)
+        if self._concluir(request, response, medicao):
+            await sync_to_async(agregador.descarregar)()
+        return response
+
+    def _concluir(self, request, response, medicao):
+        """Cabeçalho, log e histograma; indica se o agregador deve descarregar"""
+        medicao.encerrar()
+        if getattr(settings, "INSTRUMENTACAO_SERVER_TIMING", True):
+            response["Server-Timing"] = medicao.server_timing()
+        view = nome_view(request)
+        if medicao.total * 1000 > _orcamento_ms():
+            registrar_lenta(request, view, medicao)
+        return agregador.acumular(view, medicao)
@@ -0,0 +1,241 @@
+"""
+Paginação das listagens.
+
+As primeiras páginas usam o ``Paginator`` numerado do Django, com o total
+obtido pela camada de contagem (``core.contagem``). A partir da página
+``settings.PAGINAS_NUMERADAS`` (padrão: 20) a navegação segue por cursor (keyset): a próxima página
+é buscada com ``WHERE (ordenação) > (último item)`` em vez de ``OFFSET``,
+então o custo não cresce com a profundidade da página.
+
+A ordenação é uma lista de ``(campo, descendente)``. Campos descendentes
+ordenam nulos primeiro e ascendentes nulos por último (padrão do PostgreSQL),
+o que coincide com os índices compostos das listagens.
+
+``apaginar`` é a versão para as views assíncronas: a página já sai com os
+itens carregados.
+"""
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, Q
+
+from .contagem import PaginatorContagem, acontar
+
+SALT_CURSOR = 'core.paginacao.cursor'
+
+
+def expressoes_ordenacao(ordenacao):
+    """Converte a ordenação em expressões para order_by()"""
+    return [
+        F(campo).desc(nulls_first=True) if descendente else F(campo).asc(nulls_last=True)
+        for campo, descendente in ordenacao
+    ]
+
+
+def _depois_de(campo, descendente, valor):
+    """Condição para itens posteriores a ``valor`` em um único campo"""
+    if descendente:
+        # DESC NULLS FIRST: depois de nulo vêm os não nulos
+        if valor is None:
+            return Q(**{f'{campo}__isnull': False})
+        return Q(**{f'{campo}__lt': valor})
+    # ASC NULLS LAST: depois de um valor vêm os maiores e os nulos
+    if valor is None:
+        return None
+    return Q(**{f'{campo}__gt': valor}) | Q(**{f'{campo}__isnull': True})
+
+
+def _igual_a(campo, valor):
+    if valor is None:
+        return Q(**{f'{campo}__isnull': True})
+    return Q(**{campo: valor})
+
+
+def filtro_keyset(ordenacao, valores):
+    """Monta o filtro (a, b, c) > (va, vb, vc) respeitando a direção de cada campo"""
+    filtro = Q(pk__in=[])
+    iguais = Q()
+    for (campo, descendente), valor in zip(ordenacao, valores):
+        depois = _depois_de(campo, descendente, valor)
+        if depois is not None:
+            filtro |= iguais & depois
+        iguais &= _igual_a(campo, valor)
+    return filtro
+
+
+def inverter(ordenacao):
+    return [(campo, not descendente) for campo, descendente in ordenacao]
+
+
+class PaginaCursor:
+    """Página obtida por cursor, com a mesma interface usada nos templates"""
+    paginator = None
+
+    def __init__(self, object_list, cursor_proximo=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_proximo is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class PaginadorCursor:
+    def __init__(self, queryset, ordenacao, por_pagina):
+        self.queryset = queryset
+        self.ordenacao = list(ordenacao)
+        self.por_pagina = por_pagina
+
+    def _valores(self, obj):
+        return [getattr(obj, campo) for campo, _ in self.ordenacao]
+
+    def codificar(self, obj, direcao):
+        """Gera o cursor opaco (assinado) apontando para ``obj``"""
+        valores = [
+            valor.isoformat() if hasattr(valor, 'isoformat') else valor
+            for valor in self._valores(obj)
+        ]
+        return signing.dumps({'v': valores, 'd': direcao}, salt=SALT_CURSOR, compress=True)
+
+    def decodificar(self, cursor):
+        """Retorna (valores, direcao) do cursor ou None se for inválido"""
+        try:
+            dados = signing.loads(cursor, salt=SALT_CURSOR)
+            valores, direcao = dados['v'], dados['d']
+        except (signing.BadSignature, KeyError, TypeError):
+            return None
+        if direcao not in ('p', 'a') or len(valores) != len(self.ordenacao):
+            return None
+        try:
+            return [
+                None if valor is None else self._para_python(campo, valor)
+                for (campo, _), valor in zip(self.ordenacao, valores)
+            ], direcao
+        except Exception:
+            return None
+
+    def _para_python(self, campo, valor):
+        try:
+            field = self.queryset.model._meta.get_field(campo)
+        except FieldDoesNotExist:
+            # Anotação (ex.: relevância da busca): valor JSON como veio
+            return valor
+        return field.to_python(valor)
+
+    def _consulta(self, cursor):
+        """Queryset da página do cursor, com os valores e a direção decodificados"""
+        decodificado = self.decodificar(cursor) if cursor else None
+        if decodificado is None:
+            valores, direcao = None, 'p'
+        else:
+            valores, direcao = decodificado
+
+        ordenacao = self.ordenacao if direcao == 'p' else inverter(self.ordenacao)
+        qs = self.queryset.order_by(*expressoes_ordenacao(ordenacao))
+        if valores is not None:
+            qs = qs.filter(filtro_keyset(ordenacao, valores))
+        return qs[:self.por_pagina + 1], valores, direcao
+
+    def _montar(self, itens, valores, direcao):
+        tem_mais = len(itens) > self.por_pagina
+        itens = itens[:self.por_pagina]
+
+        if direcao == 'a':
+            itens.reverse()
+            tem_proxima, tem_anterior = bool(itens), tem_mais
+        else:
+            tem_proxima, tem_anterior = tem_mais, valores is not None
+
+        return PaginaCursor(
+            itens,
+            cursor_proximo=self.codificar(itens[-1], 'p') if itens and tem_proxima else None,
+            cursor_anterior=self.codificar(itens[0], 'a') if itens and tem_anterior else None,
+        )
+
+    def pagina(self, cursor):
+        qs, valores, direcao = self._consulta(cursor)
+        return self._montar(list(qs), valores, direcao)
+
+    async def apagina(self, cursor):
+        qs, valores, direcao = self._consulta(cursor)
+        return self._montar([obj async for obj in qs], valores, direcao)
+
+
+def _numero_pagina(request, limite):
+    try:
+        return min(int(request.GET.get("page", 1)), limite)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _continuar_por_cursor(page_obj, paginador_cursor, limite):
+    """Na última página numerada a navegação continua por cursor"""
+    page_obj.limite_paginas = limite
+    page_obj.cursor_proximo = None
+    if page_obj.number >= limite and page_obj.has_next():
+        page_obj.cursor_proximo = paginador_cursor.codificar(page_obj[-1], 'p')
+    return page_obj
+
+
+def paginar(request, queryset, por_pagina, ordenacao=None):
+    """
+    Pagina a listagem: numerada nas primeiras páginas e por cursor depois.
+
+    Sem ``ordenacao`` (ex.: resultados ordenados por relevância) usa apenas
+    a paginação numerada.
+    """
+    if ordenacao is None:
+        page_obj = PaginatorContagem(queryset, por_pagina).get_page(request.GET.get("page"))
+        page_obj.limite_paginas = page_obj.paginator.num_pages
+        page_obj.cursor_proximo = None
+        return page_obj
+
+    cursor = request.GET.get("cursor")
+    paginador_cursor = PaginadorCursor(queryset, ordenacao, por_pagina)
+    if cursor:
+        return paginador_cursor.pagina(cursor)
+
+    limite = getattr(settings, 'PAGINAS_NUMERADAS', 20)
+    queryset = queryset.order_by(*expressoes_ordenacao(ordenacao))
+    page_obj = PaginatorContagem(queryset, por_pagina).get_page(_numero_pagina(request, limite))
+    return _continuar_por_cursor(page_obj, paginador_cursor, limite)
+
+
+async def _apagina_numerada(queryset, por_pagina, numero):
+    paginator = PaginatorContagem(queryset, por_pagina)
+    # Com o total já contado, get_page() não consulta o banco
+    paginator._contagem = await acontar(queryset)
+    page_obj = paginator.get_page(numero)
+    page_obj.object_list = [obj async for obj in page_obj.object_list]
+    return page_obj
+
+
+async def apaginar(request, queryset, por_pagina, ordenacao=None):
+    """Versão assíncrona de ``paginar``"""
+    if ordenacao is None:
+        page_obj = await _apagina_numerada(queryset, por_pagina, request.GET.get("page"))
+        page_obj.limite_paginas = page_obj.paginator.num_pages
+        page_obj.cursor_proximo = None
+        return page_obj
+
+    cursor = request.GET.get("cursor")
+    paginador_cursor = PaginadorCursor(queryset, ordenacao, por_pagina)
+    if cursor:
+        return await paginador_cursor.apagina(cursor)
+
+    limite = getattr(settings, 'PAGINAS_NUMERADAS', 20)
+    queryset = queryset.order_by(*expressoes_ordenacao(ordenacao))
+    page_obj = await _apagina_numerada(queryset, por_pagina, _numero_pagina(request, limite))
+    return _continuar_por_cursor(page_obj, paginador_cursor, limite)
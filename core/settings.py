@@ -14,6 +14,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from core.banco import configurar_conexoes
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_recaptcha',
     'ementas',
     'usuarios',
@@ -48,11 +51,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentacao.InstrumentacaoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'usuarios.permissoes.PermissoesMiddleware',
+    'usuarios.atividade.AtividadeMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -61,7 +67,8 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mede o tempo de renderização (core.instrumentacao)
+        'BACKEND': 'core.instrumentacao.DjangoTemplatesMedidos',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -70,6 +77,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'usuarios.permissoes.contexto_permissoes',
             ],
         },
     },
@@ -92,6 +100,63 @@ DATABASES = {
     }
 }
 
+# Conexões (core.banco): DB_CONEXOES=pool, persistente ou por_requisicao.
+# core.asgi define DJANGO_ASGI=1, onde o padrão passa a ser o pool.
+SERVIDOR_ASGI = os.getenv('DJANGO_ASGI') == '1'
+DATABASES['default'] = configurar_conexoes(
+    DATABASES['default'],
+    os.getenv('DB_CONEXOES') or None,
+    asgi=SERVIDOR_ASGI,
+    max_age=int(os.getenv('DB_CONN_MAX_AGE', '60')),
+    pool_min=int(os.getenv('DB_POOL_MIN', '2')),
+    pool_max=int(os.getenv('DB_POOL_MAX', '4')),
+    pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+)
+
+# Sob ASGI as listagens, o detalhe e a API usam as views assíncronas
+VIEWS_ASYNC = SERVIDOR_ASGI and os.getenv('VIEWS_ASYNC', '1') == '1'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'normativos-crea'),
+    }
+}
+
+# Contagem dos resultados das listagens (core.contagem)
+CONTAGEM_CACHE_TIMEOUT = int(os.getenv('CONTAGEM_CACHE_TIMEOUT', '300'))
+CONTAGEM_LIMIAR_ESTIMATIVA = int(os.getenv('CONTAGEM_LIMIAR_ESTIMATIVA', '100000'))
+
+# Páginas públicas para visitantes anônimos (core.cache_paginas): tempo no
+# cache do servidor e max-age informado a navegadores e proxies
+CACHE_PAGINAS_TIMEOUT = int(os.getenv('CACHE_PAGINAS_TIMEOUT', '300'))
+CACHE_PAGINAS_MAX_AGE = int(os.getenv('CACHE_PAGINAS_MAX_AGE', '60'))
+
+# Fragmentos HTML das linhas da listagem de ementas (ementas.fragmentos)
+FRAGMENTOS_CACHE_TIMEOUT = int(os.getenv('FRAGMENTOS_CACHE_TIMEOUT', '86400'))
+
+# Sugestões do campo de pesquisa das ementas (ementas.sugestoes): cache
+# compartilhado, tamanho do LRU de cada processo, tempo (s) em que cada
+# processo reaproveita a versão das ementas, statement_timeout da consulta e
+# max-age informado aos navegadores
+SUGESTOES_CACHE_TIMEOUT = int(os.getenv('SUGESTOES_CACHE_TIMEOUT', '300'))
+SUGESTOES_LRU_TAMANHO = int(os.getenv('SUGESTOES_LRU_TAMANHO', '512'))
+SUGESTOES_VERSAO_TTL = int(os.getenv('SUGESTOES_VERSAO_TTL', '5'))
+SUGESTOES_TEMPO_LIMITE_MS = int(os.getenv('SUGESTOES_TEMPO_LIMITE_MS', '200'))
+SUGESTOES_MAX_AGE = int(os.getenv('SUGESTOES_MAX_AGE', '60'))
+
+# Medição das requisições (core.instrumentacao): orçamento acima do qual a
+# requisição vai para o log, intervalo (s) em que os histogramas de cada
+# processo são somados no cache e envio do cabeçalho Server-Timing
+INSTRUMENTACAO_ATIVA = os.getenv('INSTRUMENTACAO_ATIVA', '1') == '1'
+INSTRUMENTACAO_ORCAMENTO_MS = int(os.getenv('INSTRUMENTACAO_ORCAMENTO_MS', '500'))
+INSTRUMENTACAO_INTERVALO = int(os.getenv('INSTRUMENTACAO_INTERVALO', '10'))
+INSTRUMENTACAO_SERVER_TIMING = os.getenv('INSTRUMENTACAO_SERVER_TIMING', '1') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,6 +203,27 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Entrega dos PDFs (core.arquivos): '' (Django), 'x-accel-redirect' (nginx) ou 'x-sendfile'
+ARQUIVOS_ENVIO = os.getenv('ARQUIVOS_ENVIO', '')
+ARQUIVOS_X_ACCEL_PREFIXO = os.getenv('ARQUIVOS_X_ACCEL_PREFIXO', '/protegido/')
+# max-age (s) do PDF pelo link versionado: o conteúdo não muda, mas quem pode
+# vê-lo sim (publicação e sigilo), então o cache é só do navegador e curto
+ARQUIVOS_MAX_AGE = int(os.getenv('ARQUIVOS_MAX_AGE', '300'))
+
+# Protocolos por caixa do arquivo físico a partir do qual a caixa é considerada cheia
+PROTOCOLOS_CAPACIDADE_CAIXA = int(os.getenv('PROTOCOLOS_CAPACIDADE_CAIXA', '100'))
+
+# Integração com o SITAC (protocolos.sitac)
+SITAC_URL = os.getenv('SITAC_URL', '')
+SITAC_TOKEN = os.getenv('SITAC_TOKEN', '')
+SITAC_TIMEOUT = float(os.getenv('SITAC_TIMEOUT', '10'))
+SITAC_CONCORRENCIA = int(os.getenv('SITAC_CONCORRENCIA', '8'))
+SITAC_TENTATIVAS = int(os.getenv('SITAC_TENTATIVAS', '3'))
+SITAC_LIMITE_FALHAS = int(os.getenv('SITAC_LIMITE_FALHAS', '5'))
+SITAC_TEMPO_ABERTO = float(os.getenv('SITAC_TEMPO_ABERTO', '30'))
+# Maior corpo de resposta aceito (bytes)
+SITAC_MAX_BYTES = int(os.getenv('SITAC_MAX_BYTES', str(1024 * 1024)))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -146,6 +232,25 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom User Model
 AUTH_USER_MODEL = 'auth.User'
 
+# Carrega o perfil junto com o usuário da sessão (usuarios.backends). O
+# ModelBackend continua listado para que as sessões abertas antes da troca
+# (que guardam o caminho dele) sigam válidas até expirarem
+AUTHENTICATION_BACKENDS = [
+    'usuarios.backends.PerfilBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Cache das permissões por usuário (usuarios.permissoes)
+PERMISSOES_CACHE_TIMEOUT = int(os.getenv('PERMISSOES_CACHE_TIMEOUT', '300'))
+
+# Último acesso dos usuários (usuarios.atividade): intervalo mínimo (s) entre
+# dois registros do mesmo usuário e entre as gravações no banco
+ATIVIDADE_INTERVALO = int(os.getenv('ATIVIDADE_INTERVALO', '300'))
+ATIVIDADE_GRAVACAO = int(os.getenv('ATIVIDADE_GRAVACAO', '60'))
+
+# Cache das estatísticas do dashboard (usuarios.estatisticas)
+ESTATISTICAS_CACHE_TIMEOUT = int(os.getenv('ESTATISTICAS_CACHE_TIMEOUT', '600'))
+
 # reCAPTCHA Configuration
 RECAPTCHA_PUBLIC_KEY = os.getenv('RECAPTCHA_PUBLIC_KEY', '6LeIxAcTAAAAAJcZVRqyHh71UMIEGNQ_MXjiZKhI')  # Test key
 RECAPTCHA_PRIVATE_KEY = os.getenv('RECAPTCHA_PRIVATE_KEY', '6LeIxAcTAAAAAGG-vFI1TnRWxMZNFuojJ4WifJWe')  # Test key
@@ -19,8 +19,11 @@ from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from . import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path("desempenho/", views.desempenho, name="desempenho"),
     path("",include("ementas.urls")),
     path("usuarios/",include("usuarios.urls")),
     path("protocolos/",include("protocolos.urls")),
@@ -0,0 +1,41 @@
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect, render
+
+from .banco import estatisticas_pool
+from .instrumentacao import FAIXAS_MS, histogramas, zerar_histogramas
+
+# Estatísticas do pool exibidas (psycopg_pool omite contadores zerados)
+ESTATISTICAS_POOL = [
+    ("pool_size", "Conexões abertas"),
+    ("pool_available", "Disponíveis"),
+    ("requests_waiting", "Requisições esperando agora"),
+    ("requests_num", "Pedidos de conexão"),
+    ("requests_queued", "Pedidos que esperaram"),
+    ("espera_media_ms", "Espera média (ms)"),
+    ("requests_errors", "Tempo esgotado"),
+    ("connections_lost", "Conexões perdidas (health check)"),
+]
+
+
+@login_required
+def desempenho(request):
+    """Histogramas de tempo e consultas por view (somente staff)"""
+    if not request.permissoes.staff:
+        raise PermissionDenied
+
+    if request.method == "POST":
+        zerar_histogramas()
+        messages.success(request, "Medições zeradas.")
+        return redirect("desempenho")
+
+    pool = estatisticas_pool()
+    context = {
+        "title": "Desempenho",
+        "pool": [(rotulo, pool.get(chave, 0)) for chave, rotulo in ESTATISTICAS_POOL] if pool else None,
+        "views": histogramas(),
+        "faixas": [f"≤ {limite} ms" for limite in FAIXAS_MS] + [f"> {FAIXAS_MS[-1]} ms"],
+        "limite_maximo": FAIXAS_MS[-1],
+    }
+    return render(request, "core/desempenho.html", context)
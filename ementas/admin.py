@@ -1,4 +1,7 @@
 from django.contrib import admin
+from django.utils import timezone
+from core.cache_paginas import invalidar_tags
+from core.contagem import invalidar
 from .models import Ementa
 
 @admin.register(Ementa)
@@ -62,15 +65,24 @@ class EmentaAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('criado_por')
     
     actions = ['marcar_sigiloso', 'desmarcar_sigiloso']
+
+    def atualizar_ementas(self, queryset, **campos):
+        """Atualiza as ementas em massa e invalida as páginas em cache e os ETags da API"""
+        # atualizado_em renova também a chave dos fragmentos da listagem
+        updated = queryset.update(atualizado_em=timezone.now(), **campos)
+        # update() não dispara post_save: invalida todas as páginas de ementas
+        invalidar(Ementa)
+        invalidar_tags("ementas")
+        return updated
     
     def marcar_sigiloso(self, request, queryset):
         """Marca ementas selecionadas como sigilosas"""
-        updated = queryset.update(sigiloso=True)
+        updated = self.atualizar_ementas(queryset, sigiloso=True)
         self.message_user(request, f'{updated} ementa(s) marcada(s) como sigilosa(s).')
     marcar_sigiloso.short_description = "Marcar ementas como sigilosas"
     
     def desmarcar_sigiloso(self, request, queryset):
         """Desmarca ementas selecionadas como sigilosas"""
-        updated = queryset.update(sigiloso=False)
+        updated = self.atualizar_ementas(queryset, sigiloso=False)
         self.message_user(request, f'{updated} ementa(s) desmarcada(s) como sigilosa(s).')
     desmarcar_sigiloso.short_description = "Desmarcar ementas como sigilosas"
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+API JSON somente leitura das ementas (v1).
+
+- ``GET /api/v1/ementas/``: listagem com os mesmos filtros de ``ementa_list``
+  (``q``, ``tipo_ato``, ``situacao``, ``data_inicio``, ``data_fim``), paginada
+  por cursor (``cursor``, ``limite``);
+- ``GET /api/v1/ementas/<id>/``: detalhe;
+- ``GET /api/v1/ementas/facetas/``: totais por tipo, situação e ano (cada
+  faceta sem o próprio filtro, ver ``ementas.facetas``);
+- ``GET /api/v1/ementas/sugestoes/?q=``: sugestões de número e título para
+  o campo de pesquisa (``ementas.sugestoes``).
+
+``fields=id,titulo,...`` escolhe os campos retornados; a listagem omite por
+padrão os textos longos (``ementa`` e ``resumo``). O ETag depende apenas da
+versão das ementas (``core.contagem``) e da requisição, então um
+``If-None-Match`` válido é respondido com 304 sem consultar o banco.
+Ementas sigilosas aparecem apenas com os metadados; o conteúdo vem nulo.
+
+As views ``*_async`` respondem o mesmo sob ASGI (``settings.VIEWS_ASYNC``),
+com o ORM e o cache assíncronos.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET
+
+from core.contagem import acontar, assinatura, aversao, contar, versao
+from core.paginacao import PaginadorCursor
+
+from . import sugestoes
+from .facetas import acontar_facetas, contar_facetas
+from .filtros import filtrar_ementas, ler_filtros
+from .models import Ementa
+from .views import ORDENACAO_LISTA
+
+VERSAO_API = "v1"
+
+# Ordenação da listagem com termo de busca (anotação de ementas.busca)
+ORDENACAO_BUSCA = [("relevancia", True), ("id", False)]
+
+CAMPOS_MODELO = [
+    "id", "numero", "titulo", "tipo_ato_normativo", "situacao", "sigiloso",
+    "data_publicacao", "criado_em", "atualizado_em", "ementa", "resumo",
+]
+CAMPOS_CALCULADOS = ["arquivo", "url"]
+CAMPOS_API = CAMPOS_MODELO + CAMPOS_CALCULADOS
+
+# Conteúdo nunca exposto para ementas sigilosas
+CAMPOS_CONTEUDO = {"ementa", "resumo", "arquivo"}
+
+CAMPOS_PADRAO_LISTA = [campo for campo in CAMPOS_API if campo not in ("ementa", "resumo")]
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+
+
+class ErroRequisicao(Exception):
+    pass
+
+
+def _resposta(dados, status=200):
+    return JsonResponse(dados, status=status, json_dumps_params={"ensure_ascii": False})
+
+
+def _erro(mensagem, status=400):
+    return _resposta({"erro": mensagem}, status=status)
+
+
+def ler_campos(request, padrao):
+    """Campos pedidos em ``fields=`` (ou o padrão)"""
+    valor = request.GET.get("fields", "").strip()
+    if not valor:
+        return list(padrao)
+    campos = [campo.strip() for campo in valor.split(",") if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in CAMPOS_API]
+    if invalidos:
+        raise ErroRequisicao(f"Campos inválidos: {', '.join(invalidos)}.")
+    return list(dict.fromkeys(campos))
+
+
+def ler_limite(request, padrao=LIMITE_PADRAO, maximo=LIMITE_MAXIMO):
+    try:
+        limite = int(request.GET.get("limite", padrao))
+    except ValueError:
+        raise ErroRequisicao("O parâmetro limite deve ser um número inteiro.")
+    if not 1 <= limite <= maximo:
+        raise ErroRequisicao(f"O parâmetro limite deve estar entre 1 e {maximo}.")
+    return limite
+
+
+def colunas(campos, extras=()):
+    """Colunas do banco necessárias para os campos pedidos"""
+    necessarias = {"id", "sigiloso", *extras}
+    necessarias.update(campo for campo in campos if campo in CAMPOS_MODELO)
+    if "arquivo" in campos:
+        necessarias.add("arquivo")
+    return sorted(necessarias)
+
+
+def serializar(ementa, campos, request):
+    dados = {}
+    for campo in campos:
+        if ementa.sigiloso and campo in CAMPOS_CONTEUDO:
+            dados[campo] = None
+        elif campo == "arquivo":
+            dados[campo] = None
+            if ementa.arquivo:
+                url = reverse("ementas:arquivo", args=[ementa.pk])
+                if ementa.versao_arquivo:
+                    url += f"?v={ementa.versao_arquivo}"
+                dados[campo] = request.build_absolute_uri(url)
+        elif campo == "url":
+            dados[campo] = request.build_absolute_uri(reverse("ementas:detalhe", args=[ementa.pk]))
+        else:
+            dados[campo] = getattr(ementa, campo)
+    return dados
+
+
+def _etag(versao_ementas, partes):
+    conteudo = json.dumps([VERSAO_API, versao_ementas, *partes], default=str)
+    return 'W/"%s"' % hashlib.md5(conteudo.encode(), usedforsecurity=False).hexdigest()
+
+
+def calcular_etag(*partes):
+    """ETag fraco a partir da versão das ementas e dos parâmetros da resposta"""
+    return _etag(versao(Ementa), partes)
+
+
+async def acalcular_etag(*partes):
+    return _etag(await aversao(Ementa), partes)
+
+
+def _com_etag(response, etag):
+    response["ETag"] = etag
+    return response
+
+
+def _url_cursor(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+
+def _consulta_lista(request):
+    """Campos, limite, queryset e ordenação da listagem (``ErroRequisicao`` se inválidos)"""
+    campos = ler_campos(request, CAMPOS_PADRAO_LISTA)
+    limite = ler_limite(request)
+    qs = filtrar_ementas(ler_filtros(request.GET))
+    # Sem PostgreSQL a busca não calcula relevância
+    ordenacao = ORDENACAO_BUSCA if "relevancia" in qs.query.annotations else ORDENACAO_LISTA
+    extras = [campo for campo, _ in ordenacao if campo in CAMPOS_MODELO]
+    return campos, limite, qs.only(*colunas(campos, extras)), ordenacao
+
+
+def _resposta_lista(request, campos, pagina, total, aproximado, etag):
+    return _com_etag(_resposta({
+        "total": total,
+        "total_aproximado": aproximado,
+        "proximo": _url_cursor(request, pagina.cursor_proximo),
+        "anterior": _url_cursor(request, pagina.cursor_anterior),
+        "resultados": [serializar(ementa, campos, request) for ementa in pagina],
+    }), etag)
+
+
+@require_GET
+def ementas_lista(request):
+    """Listagem paginada por cursor"""
+    try:
+        campos, limite, qs, ordenacao = _consulta_lista(request)
+    except ErroRequisicao as exc:
+        return _erro(str(exc))
+    cursor = request.GET.get("cursor")
+
+    etag = calcular_etag(assinatura(qs), campos, limite, cursor)
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    pagina = PaginadorCursor(qs, ordenacao, limite).pagina(cursor)
+    total, aproximado = contar(qs)
+    return _resposta_lista(request, campos, pagina, total, aproximado, etag)
+
+
+@require_GET
+async def ementas_lista_async(request):
+    try:
+        campos, limite, qs, ordenacao = _consulta_lista(request)
+    except ErroRequisicao as exc:
+        return _erro(str(exc))
+    cursor = request.GET.get("cursor")
+
+    etag = await acalcular_etag(assinatura(qs), campos, limite, cursor)
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    pagina = await PaginadorCursor(qs, ordenacao, limite).apagina(cursor)
+    total, aproximado = await acontar(qs)
+    return _resposta_lista(request, campos, pagina, total, aproximado, etag)
+
+
+@require_GET
+def ementas_detalhe(request, pk):
+    """Detalhe de uma ementa publicada"""
+    try:
+        campos = ler_campos(request, CAMPOS_API)
+    except ErroRequisicao as exc:
+        return _erro(str(exc))
+
+    etag = calcular_etag(pk, campos)
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    ementa = Ementa.objects.filter(publicado=True, pk=pk).only(*colunas(campos)).first()
+    if ementa is None:
+        return _erro("Ementa não encontrada.", status=404)
+    return _com_etag(_resposta(serializar(ementa, campos, request)), etag)
+
+
+@require_GET
+async def ementas_detalhe_async(request, pk):
+    try:
+        campos = ler_campos(request, CAMPOS_API)
+    except ErroRequisicao as exc:
+        return _erro(str(exc))
+
+    etag = await acalcular_etag(pk, campos)
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    try:
+        ementa = await Ementa.objects.only(*colunas(campos)).aget(publicado=True, pk=pk)
+    except Ementa.DoesNotExist:
+        return _erro("Ementa não encontrada.", status=404)
+    return _com_etag(_resposta(serializar(ementa, campos, request)), etag)
+
+
+@require_GET
+def ementas_facetas(request):
+    """Totais por faceta, com os mesmos filtros da listagem"""
+    filtros = ler_filtros(request.GET)
+    qs = filtrar_ementas(filtros)
+
+    etag = calcular_etag(assinatura(qs), "facetas")
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    return _com_etag(_resposta(contar_facetas(filtros)), etag)
+
+
+@require_GET
+async def ementas_facetas_async(request):
+    filtros = ler_filtros(request.GET)
+    qs = filtrar_ementas(filtros)
+
+    etag = await acalcular_etag(assinatura(qs), "facetas")
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    return _com_etag(_resposta(await acontar_facetas(filtros)), etag)
+
+
+def _resposta_tempo_esgotado(termo):
+    # Sem cache: a próxima tecla tenta de novo
+    response = _resposta({"q": termo, "sugestoes": [], "tempo_esgotado": True})
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+def _resposta_sugestoes(termo, resultado, etag):
+    response = _resposta({
+        "q": termo,
+        "sugestoes": [
+            dict(sugestao, url=reverse("ementas:detalhe", args=[sugestao["id"]]))
+            for sugestao in resultado
+        ],
+    })
+    patch_cache_control(response, public=True, max_age=getattr(settings, "SUGESTOES_MAX_AGE", 60))
+    return _com_etag(response, etag)
+
+
+@require_GET
+def ementas_sugestoes(request):
+    """Sugestões para o campo de pesquisa enquanto o usuário digita"""
+    try:
+        limite = ler_limite(request, sugestoes.LIMITE_PADRAO, sugestoes.LIMITE_MAXIMO)
+    except ErroRequisicao as exc:
+        return _erro(str(exc))
+    termo = sugestoes.normalizar_termo(request.GET.get("q"))
+
+    etag = calcular_etag(termo, limite, "sugestoes")
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    try:
+        resultado = sugestoes.sugerir(termo, limite)
+    except sugestoes.TempoEsgotado:
+        return _resposta_tempo_esgotado(termo)
+    return _resposta_sugestoes(termo, resultado, etag)
+
+
+@require_GET
+async def ementas_sugestoes_async(request):
+    try:
+        limite = ler_limite(request, sugestoes.LIMITE_PADRAO, sugestoes.LIMITE_MAXIMO)
+    except ErroRequisicao as exc:
+        return _erro(str(exc))
+    termo = sugestoes.normalizar_termo(request.GET.get("q"))
+
+    etag = await acalcular_etag(termo, limite, "sugestoes")
+    nao_modificado = get_conditional_response(request, etag=etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    try:
+        resultado = await sugestoes.asugerir(termo, limite)
+    except sugestoes.TempoEsgotado:
+        return _resposta_tempo_esgotado(termo)
+    return _resposta_sugestoes(termo, resultado, etag)
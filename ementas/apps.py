@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class EmentasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ementas'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from core import cache_paginas
+        from core.contagem import invalidar_ao_alterar
+        from .sugestoes import esquecer_versao
+        from .views import tags_ao_alterar
+        invalidar_ao_alterar(self.get_model('Ementa'))
+        cache_paginas.invalidar_ao_alterar(self.get_model('Ementa'), tags_ao_alterar)
+        for sinal in (post_save, post_delete):
+            sinal.connect(esquecer_versao, sender=self.get_model('Ementa'), dispatch_uid='sugestoes:versao')
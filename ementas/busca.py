@@ -0,0 +1,102 @@
+"""
+Busca textual das ementas.
+
+No PostgreSQL a pesquisa usa o vetor ``Ementa.busca`` (índice GIN) com a
+configuração ``pt_unaccent`` (português sem acentos) e ordena por relevância.
+Número e título também são comparados por similaridade de trigramas
+(``pg_trgm``), o que tolera erros de digitação e localiza atos pelo número.
+O texto extraído dos PDFs (``TextoArquivo``) entra no vetor com o menor peso.
+Em outros bancos mantém o comportamento antigo com ``icontains``.
+"""
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity, TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Greatest
+
+CONFIG_BUSCA = "pt_unaccent"
+
+# Pesos: título > número > ementa > resumo
+PESOS_BUSCA = (
+    ("titulo", "A"),
+    ("numero", "B"),
+    ("ementa", "C"),
+    ("resumo", "D"),
+)
+PESO_TEXTO_ARQUIVO = "D"
+
+# Números de atos: "123", "123/2024", "45-A", "2024.10"
+NUMERO_RE = re.compile(r"\d+(?:[./-]\w+)*")
+
+
+def busca_textual_disponivel():
+    """Indica se o banco suporta a busca textual do PostgreSQL"""
+    return connection.vendor == "postgresql"
+
+
+def vetor_busca():
+    """Expressão que monta o vetor de busca ponderado de uma ementa"""
+    from .models import TextoArquivo
+
+    vetor = None
+    for campo, peso in PESOS_BUSCA:
+        parte = SearchVector(campo, config=CONFIG_BUSCA, weight=peso)
+        vetor = parte if vetor is None else vetor + parte
+
+    # Texto do PDF atual, nunca de ementas sigilosas
+    texto_arquivo = TextoArquivo.objects.filter(
+        ementa=OuterRef("pk"),
+        ementa__sigiloso=False,
+        arquivo=OuterRef("arquivo"),
+    ).values("texto")
+    return vetor + SearchVector(
+        Subquery(texto_arquivo), config=CONFIG_BUSCA, weight=PESO_TEXTO_ARQUIVO,
+    )
+
+
+def atualizar_vetor_busca(queryset):
+    """Recalcula o vetor de busca das ementas do queryset"""
+    if not busca_textual_disponivel():
+        return 0
+    return queryset.update(busca=vetor_busca())
+
+
+def extrair_numero(q):
+    """Extrai o número do ato de um termo como "Portaria 123/2024" """
+    encontrado = NUMERO_RE.search(q)
+    return encontrado.group(0) if encontrado else ""
+
+
+def aplicar_busca(qs, q):
+    """Filtra o queryset pelo termo pesquisado, ordenando por relevância"""
+    if not q:
+        return qs
+
+    if not busca_textual_disponivel():
+        return qs.filter(
+            Q(titulo__icontains=q) |
+            Q(numero__icontains=q) |
+            Q(resumo__icontains=q) |
+            Q(ementa__icontains=q)
+        )
+
+    query = SearchQuery(q, config=CONFIG_BUSCA, search_type="websearch")
+    filtro = Q(busca=query) | Q(titulo__trigram_word_similar=q)
+    similaridade = TrigramWordSimilarity(q, "titulo")
+
+    numero = extrair_numero(q)
+    if numero:
+        # LIKE sem UPPER() para aproveitar o índice de trigramas em "numero"
+        filtro |= Q(numero__contains=numero) | Q(numero__trigram_similar=numero)
+        similaridade = Greatest(similaridade, TrigramSimilarity("numero", numero))
+
+    # ts_rank retorna real; em double precision o valor volta igual do cursor
+    relevancia = Cast(SearchRank(F("busca"), query) + similaridade, FloatField())
+    return (
+        qs.filter(filtro)
+        .annotate(relevancia=relevancia)
+        .order_by("-relevancia", *qs.model._meta.ordering)
+    )
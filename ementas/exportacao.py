@@ -0,0 +1,31 @@
+"""
+Colunas e registros da exportação de ementas (core.exportacao).
+"""
+from core.exportacao import TAMANHO_LOTE
+
+COLUNAS_EXPORTACAO = [
+    ("id", "ID"),
+    ("numero", "Número"),
+    ("titulo", "Título"),
+    ("tipo_ato_normativo", "Tipo de Ato Normativo"),
+    ("situacao", "Situação"),
+    ("sigiloso", "Sigiloso"),
+    ("data_publicacao", "Data de Publicação"),
+    ("ementa", "Ementa"),
+    ("resumo", "Resumo"),
+    ("criado_em", "Criado em"),
+    ("atualizado_em", "Atualizado em"),
+]
+
+# Conteúdo nunca exportado para ementas sigilosas
+CAMPOS_CONTEUDO = ("ementa", "resumo")
+
+
+def registros_ementas(qs, tamanho_lote=TAMANHO_LOTE):
+    """Percorre o queryset com cursor no servidor, sem o conteúdo das sigilosas"""
+    campos = [chave for chave, _ in COLUNAS_EXPORTACAO]
+    for registro in qs.values(*campos).iterator(chunk_size=tamanho_lote):
+        if registro["sigiloso"]:
+            for campo in CAMPOS_CONTEUDO:
+                registro[campo] = None
+        yield registro
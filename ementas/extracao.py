@@ -0,0 +1,119 @@
+"""
+Extração do texto dos PDFs das ementas.
+
+O texto é lido página a página com ``pypdf`` (dependência opcional, pura
+Python) e guardado em ``TextoArquivo``, junto com o hash SHA-256 do arquivo.
+O PDF só é processado de novo quando o arquivo da ementa muda.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Q
+
+from .busca import atualizar_vetor_busca
+from .models import Ementa, TextoArquivo
+from .storage import digest_do_nome
+
+# Limite de caracteres guardados por PDF (o tsvector do PostgreSQL tem limite de 1 MB)
+MAX_CARACTERES = getattr(settings, 'EMENTAS_PDF_MAX_CARACTERES', 200_000)
+
+TAMANHO_BLOCO = 64 * 1024
+
+
+def calcular_hash(arquivo):
+    """Calcula o SHA-256 de um arquivo lendo em blocos"""
+    sha256 = hashlib.sha256()
+    for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b''):
+        sha256.update(bloco)
+    return sha256.hexdigest()
+
+
+def abrir_pdf(arquivo):
+    """Leitor ``pypdf`` do arquivo (as páginas só são lidas quando usadas)"""
+    try:
+        from pypdf import PdfReader
+    except ImportError as exc:
+        raise ImproperlyConfigured(
+            "A extração de texto dos PDFs requer o pacote pypdf (pip install pypdf)."
+        ) from exc
+    return PdfReader(arquivo)
+
+
+def extrair_paginas(leitor):
+    """Gera o texto de cada página do PDF, sem carregar o documento inteiro"""
+    for pagina in leitor.pages:
+        yield pagina.extract_text() or ''
+
+
+def extrair_arquivo(nome, hash_anterior=None):
+    """
+    Lê um PDF do storage das ementas e retorna (hash, texto, páginas).
+
+    Se o conteúdo não mudou (mesmo hash), retorna texto e páginas como None.
+    Não acessa o banco de dados, podendo rodar em processos separados.
+    """
+    storage = Ementa._meta.get_field('arquivo').storage
+    with storage.open(nome, 'rb') as arquivo:
+        # Arquivos endereçados pelo conteúdo já trazem o SHA-256 no nome
+        hash_arquivo = digest_do_nome(nome) or calcular_hash(arquivo)
+        if hash_arquivo == hash_anterior:
+            return hash_arquivo, None, None
+        arquivo.seek(0)
+
+        leitor = abrir_pdf(arquivo)
+        paginas = len(leitor.pages)
+        texto = io.StringIO()
+        restante = MAX_CARACTERES
+        for conteudo in extrair_paginas(leitor):
+            conteudo = conteudo.replace('\x00', '')[:restante]
+            texto.write(conteudo)
+            texto.write('\n')
+            restante -= len(conteudo) + 1
+            # As páginas seguintes não entrariam no texto: não são extraídas
+            if restante <= 0:
+                break
+    return hash_arquivo, texto.getvalue(), paginas
+
+
+def ementas_pendentes():
+    """Ementas com PDF ainda sem texto extraído ou com arquivo alterado"""
+    return (
+        Ementa.objects
+        .filter(sigiloso=False)
+        .exclude(arquivo='')
+        .exclude(arquivo__isnull=True)
+        .exclude(texto_arquivo__arquivo=F('arquivo'))
+    )
+
+
+def salvar_texto(ementa_id, nome, hash_arquivo, texto, paginas):
+    """Grava o texto extraído e atualiza o vetor de busca da ementa"""
+    with transaction.atomic():
+        if texto is None:
+            # Mesmo conteúdo com outro nome: só registra o novo arquivo
+            TextoArquivo.objects.filter(ementa_id=ementa_id).update(arquivo=nome)
+        else:
+            TextoArquivo.objects.update_or_create(
+                ementa_id=ementa_id,
+                defaults={
+                    'arquivo': nome,
+                    'hash_arquivo': hash_arquivo,
+                    'texto': texto,
+                    'paginas': paginas,
+                },
+            )
+        atualizar_vetor_busca(Ementa.objects.filter(pk=ementa_id))
+
+
+def remover_textos_obsoletos():
+    """Remove textos de ementas sigilosas ou que não possuem mais PDF"""
+    obsoletos = TextoArquivo.objects.filter(
+        Q(ementa__sigiloso=True) | Q(ementa__arquivo='') | Q(ementa__arquivo__isnull=True)
+    )
+    ementa_ids = list(obsoletos.values_list('ementa_id', flat=True))
+    removidos, _ = obsoletos.delete()
+    atualizar_vetor_busca(Ementa.objects.filter(pk__in=ementa_ids))
+    return removidos
@@ -0,0 +1,109 @@
+"""
+Contagem das ementas por tipo, situação e ano de publicação (facetas).
+
+Uma única consulta agrupa os resultados da busca por (tipo, situação, ano),
+sem os filtros de tipo e situação; os totais de cada faceta são somados em
+Python a partir dessas linhas. Assim cada faceta considera as demais
+seleções, mas não a própria (escolher outro tipo continua mostrando os
+totais de todos os tipos). As linhas ficam em cache pela assinatura da
+consulta e pela versão das ementas (``core.contagem``); ``acontar_facetas``
+é a versão para as views assíncronas.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+from core.contagem import assinatura, aversao, versao
+
+from .filtros import filtrar_ementas
+from .models import Ementa
+
+
+def _timeout():
+    return getattr(settings, "CONTAGEM_CACHE_TIMEOUT", 300)
+
+
+def _agrupar(qs):
+    return (
+        qs.order_by()
+        .values("tipo_ato_normativo", "situacao", ano=ExtractYear("data_publicacao"))
+        .annotate(total=Count("pk"))
+    )
+
+
+def _linha(linha):
+    return (linha["tipo_ato_normativo"], linha["situacao"], linha["ano"], linha["total"])
+
+
+def linhas_agrupadas(qs):
+    """(tipo, situação, ano, total) do queryset, em cache por assinatura"""
+    try:
+        chave = f"facetas:{versao(Ementa)}:{assinatura(qs)}"
+    except EmptyResultSet:
+        return []
+    linhas = cache.get(chave)
+    if linhas is None:
+        linhas = [_linha(linha) for linha in _agrupar(qs)]
+        cache.set(chave, linhas, _timeout())
+    return linhas
+
+
+async def alinhas_agrupadas(qs):
+    try:
+        chave = f"facetas:{await aversao(Ementa)}:{assinatura(qs)}"
+    except EmptyResultSet:
+        return []
+    linhas = await cache.aget(chave)
+    if linhas is None:
+        linhas = [_linha(linha) async for linha in _agrupar(qs)]
+        await cache.aset(chave, linhas, _timeout())
+    return linhas
+
+
+def _base_facetas(filtros):
+    return filtrar_ementas(dict(filtros, tipo_ato="", situacao=""))
+
+
+def somar_facetas(filtros, linhas):
+    """Totais de cada faceta a partir das linhas agrupadas"""
+    tipo, situacao = filtros["tipo_ato"], filtros["situacao"]
+
+    tipos, situacoes, anos = Counter(), Counter(), Counter()
+    for tipo_linha, situacao_linha, ano, total in linhas:
+        tipo_ok = not tipo or tipo_linha == tipo
+        situacao_ok = not situacao or situacao_linha == situacao
+        if situacao_ok:
+            tipos[tipo_linha] += total
+        if tipo_ok:
+            situacoes[situacao_linha] += total
+        if tipo_ok and situacao_ok:
+            anos[ano] += total
+
+    return {
+        "tipo_ato_normativo": [
+            {"valor": valor, "rotulo": rotulo, "total": tipos[valor]}
+            for valor, rotulo in Ementa.TIPO_ATO_CHOICES
+        ],
+        "situacao": [
+            {"valor": valor, "rotulo": rotulo, "total": situacoes[valor]}
+            for valor, rotulo in Ementa.SITUACAO_CHOICES
+        ],
+        "ano": [
+            {"valor": ano, "total": total}
+            for ano, total in sorted(anos.items(), key=lambda item: (item[0] is None, -(item[0] or 0)))
+            if total
+        ],
+    }
+
+
+def contar_facetas(filtros):
+    """Totais por faceta para os filtros da listagem (``ementas.filtros.ler_filtros``)"""
+    return somar_facetas(filtros, linhas_agrupadas(_base_facetas(filtros)))
+
+
+async def acontar_facetas(filtros):
+    return somar_facetas(filtros, await alinhas_agrupadas(_base_facetas(filtros)))
@@ -0,0 +1,53 @@
+"""
+Filtros da listagem de ementas, compartilhados pela página HTML e pela API.
+"""
+from django.utils.dateparse import parse_date
+
+from .busca import aplicar_busca
+from .models import Ementa
+
+
+def _data(valor):
+    try:
+        return parse_date(valor) if valor else None
+    except (ValueError, TypeError):
+        return None
+
+
+def ler_filtros(params):
+    """Lê os filtros da querystring (valores brutos, como vieram)"""
+    return {
+        "q": params.get("q", "").strip(),
+        "tipo_ato": params.get("tipo_ato", ""),
+        "situacao": params.get("situacao", ""),
+        "data_inicio": params.get("data_inicio", ""),
+        "data_fim": params.get("data_fim", ""),
+    }
+
+
+def filtrar_ementas(filtros, qs=None):
+    """
+    Aplica os filtros às ementas publicadas.
+
+    Com termo de busca o resultado vem ordenado por relevância.
+    """
+    if qs is None:
+        qs = Ementa.objects.filter(publicado=True)
+
+    if filtros["tipo_ato"]:
+        qs = qs.filter(tipo_ato_normativo=filtros["tipo_ato"])
+
+    if filtros["situacao"]:
+        qs = qs.filter(situacao=filtros["situacao"])
+
+    # Filtros de data
+    data_inicio = _data(filtros["data_inicio"])
+    if data_inicio:
+        qs = qs.filter(data_publicacao__gte=data_inicio)
+
+    data_fim = _data(filtros["data_fim"])
+    if data_fim:
+        qs = qs.filter(data_publicacao__lte=data_fim)
+
+    # Busca textual (ordenada por relevância quando há termo pesquisado)
+    return aplicar_busca(qs, filtros["q"])
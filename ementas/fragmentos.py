@@ -0,0 +1,64 @@
+"""
+Cache dos fragmentos HTML das linhas da listagem de ementas.
+
+Cada linha (``ementas/_linha.html``: título, badges, trechos e aviso de
+sigilo) só muda quando a ementa é editada, então fica em cache com chave
+por ``pk``, ``atualizado_em`` e ``sigiloso``: a edição gera uma chave nova e
+a antiga expira sozinha. O sigilo entra na chave para que nem um
+``update()`` que não renove ``atualizado_em`` sirva a linha com conteúdo de
+uma ementa que passou a ser sigilosa. As linhas da página são buscadas com um único
+``get_many`` e as que faltam, renderizadas e gravadas com um ``set_many``.
+
+O fragmento não depende do usuário; o botão de edição fica fora dele, em
+``ementas/lista.html``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+TEMPLATE_LINHA = "ementas/_linha.html"
+
+# Incrementar ao alterar o template da linha
+VERSAO_FRAGMENTO = 1
+
+
+def _timeout():
+    return getattr(settings, "FRAGMENTOS_CACHE_TIMEOUT", 86400)
+
+
+def chave_linha(ementa):
+    return (
+        f"ementas:linha:{VERSAO_FRAGMENTO}:{ementa.pk}:"
+        f"{ementa.atualizado_em.timestamp()}:{int(ementa.sigiloso)}"
+    )
+
+
+def _preencher(chaves, guardadas):
+    """Põe o HTML em cada ementa e retorna as linhas renderizadas agora"""
+    novas = {}
+    for chave, ementa in chaves.items():
+        html = guardadas.get(chave)
+        if html is None:
+            html = novas[chave] = render_to_string(TEMPLATE_LINHA, {"e": ementa})
+        ementa.linha_html = mark_safe(html)
+    return novas
+
+
+def renderizar_linhas(ementas):
+    """Retorna as ementas (lista) com o HTML de cada linha em ``linha_html``"""
+    ementas = list(ementas)
+    chaves = {chave_linha(ementa): ementa for ementa in ementas}
+    novas = _preencher(chaves, cache.get_many(chaves))
+    if novas:
+        cache.set_many(novas, _timeout())
+    return ementas
+
+
+async def arenderizar_linhas(ementas):
+    """Versão assíncrona de ``renderizar_linhas`` (ementas já carregadas)"""
+    chaves = {chave_linha(ementa): ementa for ementa in ementas}
+    novas = _preencher(chaves, await cache.aget_many(chaves))
+    if novas:
+        await cache.aset_many(novas, _timeout())
+    return list(ementas)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ementas.busca import atualizar_vetor_busca, busca_textual_disponivel
+from ementas.models import Ementa
+
+
+class Command(BaseCommand):
+    help = "Recalcula em lotes o vetor de busca textual das ementas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=1000,
+            help="Quantidade de ementas atualizadas por lote (padrão: 1000)",
+        )
+        parser.add_argument(
+            "--apenas-vazios", action="store_true",
+            help="Atualiza somente ementas que ainda não possuem vetor de busca",
+        )
+
+    def handle(self, *args, **options):
+        if not busca_textual_disponivel():
+            raise CommandError("A busca textual requer o banco PostgreSQL.")
+
+        lote = options["lote"]
+        if lote < 1:
+            raise CommandError("O tamanho do lote deve ser maior que zero.")
+
+        qs = Ementa.objects.order_by("pk")
+        if options["apenas_vazios"]:
+            qs = qs.filter(busca__isnull=True)
+
+        total = 0
+        ultimo_pk = 0
+        while True:
+            pks = list(qs.filter(pk__gt=ultimo_pk).values_list("pk", flat=True)[:lote])
+            if not pks:
+                break
+            total += atualizar_vetor_busca(Ementa.objects.filter(pk__in=pks))
+            ultimo_pk = pks[-1]
+            self.stdout.write(f"{total} ementa(s) atualizada(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"Vetor de busca atualizado em {total} ementa(s)."))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.exportacao import FORMATOS, TAMANHO_LOTE, gravar_exportacao
+from ementas.exportacao import COLUNAS_EXPORTACAO, registros_ementas
+from ementas.filtros import filtrar_ementas, ler_filtros
+
+
+class Command(BaseCommand):
+    help = "Exporta as ementas publicadas (com os filtros da listagem) em CSV, NDJSON ou XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+        parser.add_argument(
+            "--saida", default="-",
+            help="Arquivo de saída (padrão: saída padrão)",
+        )
+        parser.add_argument("--lote", type=int, default=TAMANHO_LOTE,
+                            help=f"Registros lidos do banco por vez (padrão: {TAMANHO_LOTE})")
+        parser.add_argument("--q", default="", help="Termo de busca")
+        parser.add_argument("--tipo-ato", default="")
+        parser.add_argument("--situacao", default="")
+        parser.add_argument("--data-inicio", default="", help="AAAA-MM-DD")
+        parser.add_argument("--data-fim", default="", help="AAAA-MM-DD")
+
+    def handle(self, *args, **options):
+        filtros = ler_filtros({
+            "q": options["q"],
+            "tipo_ato": options["tipo_ato"],
+            "situacao": options["situacao"],
+            "data_inicio": options["data_inicio"],
+            "data_fim": options["data_fim"],
+        })
+        registros = registros_ementas(filtrar_ementas(filtros), options["lote"])
+
+        if options["saida"] == "-":
+            gravar_exportacao(sys.stdout.buffer, options["formato"], COLUNAS_EXPORTACAO, registros)
+            return
+        with open(options["saida"], "wb") as saida:
+            total = gravar_exportacao(saida, options["formato"], COLUNAS_EXPORTACAO, registros)
+        self.stderr.write(f"Exportação gravada em {options['saida']} ({total} bytes).")
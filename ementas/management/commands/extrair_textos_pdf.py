@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from ementas.extracao import (
+    ementas_pendentes, extrair_arquivo, remover_textos_obsoletos, salvar_texto,
+)
+from ementas.models import TextoArquivo
+
+
+class Command(BaseCommand):
+    help = "Extrai o texto dos PDFs das ementas pendentes e atualiza a busca"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=2,
+            help="Quantidade de processos de extração (padrão: 2; 0 extrai no próprio processo)",
+        )
+        parser.add_argument(
+            "--lote", type=int, default=100,
+            help="Quantidade de ementas lidas do banco por lote (padrão: 100)",
+        )
+        parser.add_argument(
+            "--limite", type=int, default=None,
+            help="Processa no máximo esta quantidade de ementas",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        lote = options["lote"]
+        if workers < 0 or lote < 1:
+            raise CommandError("Valores inválidos para --workers ou --lote.")
+
+        removidos = remover_textos_obsoletos()
+        if removidos:
+            self.stdout.write(f"{removidos} texto(s) obsoleto(s) removido(s).")
+
+        pendentes = ementas_pendentes().order_by("pk").values_list("pk", "arquivo")
+        if options["limite"] is not None:
+            pendentes = pendentes[:options["limite"]]
+        pendentes = list(pendentes)
+        if not pendentes:
+            self.stdout.write(self.style.SUCCESS("Nenhum PDF pendente."))
+            return
+
+        processados = erros = 0
+        for inicio in range(0, len(pendentes), lote):
+            parte = pendentes[inicio:inicio + lote]
+            hashes = dict(
+                TextoArquivo.objects
+                .filter(ementa_id__in=[pk for pk, _ in parte])
+                .values_list("ementa_id", "hash_arquivo")
+            )
+            for ementa_id, nome, resultado in self.extrair(parte, hashes, workers):
+                if isinstance(resultado, Exception):
+                    erros += 1
+                    self.stderr.write(f"Ementa {ementa_id} ({nome}): {resultado}")
+                    continue
+                salvar_texto(ementa_id, nome, *resultado)
+                processados += 1
+            self.stdout.write(f"{processados} PDF(s) processado(s)...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Extração concluída: {processados} PDF(s) processado(s), {erros} erro(s)."
+        ))
+
+    def extrair(self, parte, hashes, workers):
+        """Extrai os PDFs do lote, em paralelo quando há workers"""
+        if workers == 0:
+            for ementa_id, nome in parte:
+                try:
+                    resultado = extrair_arquivo(nome, hashes.get(ementa_id))
+                except Exception as exc:
+                    resultado = exc
+                yield ementa_id, nome, resultado
+            return
+
+        # Conexões abertas não podem ser compartilhadas com os processos filhos
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = {
+                executor.submit(extrair_arquivo, nome, hashes.get(ementa_id)): (ementa_id, nome)
+                for ementa_id, nome in parte
+            }
+            for futuro in as_completed(futuros):
+                ementa_id, nome = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as exc:
+                    resultado = exc
+                yield ementa_id, nome, resultado
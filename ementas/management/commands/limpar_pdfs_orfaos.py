@@ -0,0 +1,107 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.cache_paginas import invalidar_tags
+from core.contagem import invalidar
+from ementas.models import Ementa, TextoArquivo
+from ementas.storage import digest_do_nome
+
+
+class Command(BaseCommand):
+    help = "Remove os PDFs que não são referenciados por nenhuma ementa"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--carencia", type=float, default=24,
+            help="Só remove arquivos modificados há mais desta quantidade de horas (padrão: 24)",
+        )
+        parser.add_argument(
+            "--converter", action="store_true",
+            help="Antes da limpeza, move os PDFs com nomes antigos para nomes pelo conteúdo",
+        )
+        parser.add_argument(
+            "--simular", action="store_true",
+            help="Apenas lista o que seria removido",
+        )
+
+    def handle(self, *args, **options):
+        if options["carencia"] < 0:
+            raise CommandError("Valor inválido para --carencia.")
+
+        campo = Ementa._meta.get_field("arquivo")
+        self.storage = campo.storage
+        self.simular = options["simular"]
+
+        if options["converter"]:
+            self.converter()
+
+        # Uploads ainda sem ementa gravada ficam protegidos pela carência
+        limite = timezone.now() - timedelta(hours=options["carencia"])
+        referenciados = set(
+            Ementa.objects.exclude(arquivo="").exclude(arquivo__isnull=True)
+            .values_list("arquivo", flat=True).distinct().iterator()
+        )
+
+        removidos = liberados = 0
+        for nome in self.listar(campo.upload_to.rstrip("/")):
+            if nome in referenciados:
+                continue
+            if self.storage.get_modified_time(nome) > limite:
+                continue
+            # A lista de referenciados é anterior à varredura: confere de novo
+            # antes de remover (o arquivo pode ter sido reenviado nesse meio tempo)
+            if Ementa.objects.filter(arquivo=nome).exists():
+                continue
+            tamanho = self.storage.size(nome)
+            if self.simular:
+                self.stdout.write(f"Seria removido: {nome}")
+            else:
+                self.storage.delete(nome)
+            removidos += 1
+            liberados += tamanho
+
+        verbo = "seriam removido(s)" if self.simular else "removido(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{removidos} arquivo(s) órfão(s) {verbo} ({liberados / 1024 / 1024:.1f} MB)."
+        ))
+
+    def listar(self, diretorio):
+        """Lista recursivamente os arquivos (e uploads interrompidos) do diretório"""
+        if not self.storage.exists(diretorio):
+            return
+        subdiretorios, arquivos = self.storage.listdir(diretorio)
+        for arquivo in arquivos:
+            yield posixpath.join(diretorio, arquivo)
+        for subdiretorio in subdiretorios:
+            yield from self.listar(posixpath.join(diretorio, subdiretorio))
+
+    def converter(self):
+        """Regrava os PDFs com nomes antigos pelo conteúdo, deduplicando-os"""
+        antigos = (
+            Ementa.objects.exclude(arquivo="").exclude(arquivo__isnull=True)
+            .values_list("arquivo", flat=True).distinct()
+        )
+        convertidos = 0
+        for nome in list(antigos):
+            if digest_do_nome(nome):
+                continue
+            if self.simular:
+                self.stdout.write(f"Seria convertido: {nome}")
+                continue
+            try:
+                with self.storage.open(nome, "rb") as arquivo:
+                    novo = self.storage.save(nome, File(arquivo))
+            except FileNotFoundError:
+                self.stderr.write(f"Arquivo não encontrado: {nome}")
+                continue
+            Ementa.objects.filter(arquivo=nome).update(arquivo=novo)
+            TextoArquivo.objects.filter(arquivo=nome).update(arquivo=novo)
+            convertidos += 1
+        if convertidos:
+            invalidar(Ementa)
+            invalidar_tags("ementas")
+        self.stdout.write(f"{convertidos} arquivo(s) convertido(s).")
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:41
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.contrib.postgres.operations import UnaccentExtension
+from django.db import migrations, models
+
+
+def criar_configuracao_busca(apps, schema_editor):
+    """Cria a configuração pt_unaccent (português sem acentos)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese)"
+    )
+    schema_editor.execute(
+        "ALTER TEXT SEARCH CONFIGURATION pt_unaccent "
+        "ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem"
+    )
+
+
+def remover_configuracao_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP TEXT SEARCH CONFIGURATION IF EXISTS pt_unaccent")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ementas', '0002_add_only_sigiloso_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        UnaccentExtension(),
+        migrations.RunPython(criar_configuracao_busca, remover_configuracao_busca),
+        migrations.AddField(
+            model_name='ementa',
+            name='busca',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Vetor de busca'),
+        ),
+        migrations.AddField(
+            model_name='ementa',
+            name='ementa',
+            field=models.TextField(blank=True, help_text='Resumo do ato normativo para facilitar a pesquisa', verbose_name='Ementa (Resumo)'),
+        ),
+        migrations.AddField(
+            model_name='ementa',
+            name='situacao',
+            field=models.CharField(choices=[('em_vigor', 'Em Vigor'), ('revogada', 'Revogada'), ('cancelada', 'Cancelada')], default='em_vigor', max_length=20, verbose_name='Situação'),
+        ),
+        migrations.AddField(
+            model_name='ementa',
+            name='tipo_ato_normativo',
+            field=models.CharField(choices=[('portaria', 'Portaria'), ('decisao_plenaria', 'Decisão Plenária'), ('ato_administrativo', 'Ato Administrativo')], default='portaria', max_length=20, verbose_name='Tipo de Ato Normativo'),
+        ),
+        migrations.AlterField(
+            model_name='ementa',
+            name='arquivo',
+            field=models.FileField(blank=True, null=True, upload_to='ementas/pdf/', verbose_name='PDF'),
+        ),
+        migrations.AddIndex(
+            model_name='ementa',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busca'], name='ementa_busca_gin'),
+        ),
+    ]
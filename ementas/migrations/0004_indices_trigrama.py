@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:42
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('ementas', '0003_busca_textual'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='ementa',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['numero'], name='ementa_numero_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='ementa',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['titulo'], name='ementa_titulo_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ementas', '0004_indices_trigrama'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextoArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.CharField(max_length=255, verbose_name='Arquivo')),
+                ('hash_arquivo', models.CharField(db_index=True, max_length=64, verbose_name='Hash SHA-256')),
+                ('texto', models.TextField(blank=True, verbose_name='Texto extraído')),
+                ('paginas', models.PositiveIntegerField(default=0, verbose_name='Páginas')),
+                ('extraido_em', models.DateTimeField(auto_now=True, verbose_name='Extraído em')),
+                ('ementa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='texto_arquivo', to='ementas.ementa', verbose_name='Ementa')),
+            ],
+            options={
+                'verbose_name': 'Texto do PDF',
+                'verbose_name_plural': 'Textos dos PDFs',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:56
+
+import ementas.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ementas', '0006_indice_listagem'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ementa',
+            name='arquivo',
+            field=models.FileField(blank=True, null=True, storage=ementas.storage.ArmazenamentoPorConteudo(), upload_to='ementas/pdf/', verbose_name='PDF'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('ementas', '0007_armazenamento_por_conteudo'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ementa',
+            index=models.Index(fields=['numero'], name='ementa_numero_prefixo_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models import F, Q
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
+from .busca import atualizar_vetor_busca
+from .storage import ArmazenamentoPorConteudo, digest_do_nome
 
 class Ementa(models.Model):
     TIPO_ATO_CHOICES = [
@@ -36,7 +41,13 @@ class Ementa(models.Model):
     # Campos de conteúdo (só preenchidos se não for sigiloso)
     ementa = models.TextField("Ementa (Resumo)", blank=True, help_text="Resumo do ato normativo para facilitar a pesquisa")
     resumo = models.TextField("Resumo", blank=True)
-    arquivo = models.FileField("PDF", upload_to="ementas/pdf/", null=True, blank=True)
+    arquivo = models.FileField(
+        "PDF",
+        upload_to="ementas/pdf/",
+        storage=ArmazenamentoPorConteudo(),
+        null=True,
+        blank=True,
+    )
     
     data_publicacao = models.DateField("Data de Publicação", blank=True, null=True)
     
@@ -55,11 +66,27 @@ class Ementa(models.Model):
     
     criado_em = models.DateTimeField("Criado em", auto_now_add=True)
     atualizado_em = models.DateTimeField("Atualizado em", auto_now=True)
+    
+    # Vetor de busca textual (mantido no save e pelo comando atualizar_indice_busca)
+    busca = SearchVectorField("Vetor de busca", null=True, editable=False)
 
     class Meta:
         ordering = ["-data_publicacao", "-criado_em"]
         verbose_name = "Ementa"
         verbose_name_plural = "Ementas"
+        indexes = [
+            GinIndex(fields=["busca"], name="ementa_busca_gin"),
+            GinIndex(fields=["numero"], opclasses=["gin_trgm_ops"], name="ementa_numero_trgm"),
+            GinIndex(fields=["titulo"], opclasses=["gin_trgm_ops"], name="ementa_titulo_trgm"),
+            # Sugestões da busca por prefixo do número (LIKE 'abc%')
+            models.Index(fields=["numero"], opclasses=["varchar_pattern_ops"], name="ementa_numero_prefixo_idx"),
+            # Paginação por cursor da listagem pública
+            models.Index(
+                F("data_publicacao").desc(), F("criado_em").desc(), F("id"),
+                condition=Q(publicado=True),
+                name="ementa_listagem_idx",
+            ),
+        ]
 
     def __str__(self):
         if self.sigiloso:
@@ -81,6 +108,7 @@ class Ementa(models.Model):
         """Sobrescreve save para aplicar validações"""
         self.clean()
         super().save(*args, **kwargs)
+        atualizar_vetor_busca(Ementa.objects.filter(pk=self.pk))
     
     @property
     def pode_ser_visualizada_por(self, user):
@@ -91,7 +119,34 @@ class Ementa(models.Model):
             return True
         return False
     
+    @property
+    def versao_arquivo(self):
+        """SHA-256 do PDF (nome do arquivo), ou None para arquivos antigos"""
+        return digest_do_nome(self.arquivo.name) if self.arquivo else None
+    
     @property
     def conteudo_disponivel(self):
         """Retorna se a ementa tem conteúdo disponível para visualização"""
         return not self.sigiloso and (self.ementa or self.resumo or self.arquivo)
+
+
+class TextoArquivo(models.Model):
+    """Texto extraído do PDF de uma ementa, usado na busca textual"""
+    ementa = models.OneToOneField(
+        Ementa,
+        on_delete=models.CASCADE,
+        related_name='texto_arquivo',
+        verbose_name="Ementa"
+    )
+    arquivo = models.CharField("Arquivo", max_length=255)
+    hash_arquivo = models.CharField("Hash SHA-256", max_length=64, db_index=True)
+    texto = models.TextField("Texto extraído", blank=True)
+    paginas = models.PositiveIntegerField("Páginas", default=0)
+    extraido_em = models.DateTimeField("Extraído em", auto_now=True)
+
+    class Meta:
+        verbose_name = "Texto do PDF"
+        verbose_name_plural = "Textos dos PDFs"
+
+    def __str__(self):
+        return f"Texto do PDF de {self.ementa_id}"
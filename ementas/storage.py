@@ -0,0 +1,82 @@
+"""
+Armazenamento dos PDFs das ementas endereçado pelo conteúdo.
+
+Cada upload é gravado em disco em blocos enquanto o SHA-256 é calculado (o
+arquivo nunca fica inteiro em memória) e guardado como
+``<upload_to>/<aa>/<sha256>.pdf``. O mesmo PDF enviado para várias ementas
+ocupa um único arquivo: as ementas apontam para o mesmo nome.
+
+As referências de cada arquivo são as próprias linhas de ``Ementa.arquivo``
+(``referencias``); arquivos sem nenhuma referência são removidos pelo comando
+``limpar_pdfs_orfaos``, que protege os arquivos modificados dentro da carência;
+por isso um upload que reaproveita um arquivo existente renova a data dele.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+SUFIXO_TEMPORARIO = '.upload'
+
+NOME_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/(?P<digest>[0-9a-f]{64})(?:\.\w+)?$')
+
+
+def digest_do_nome(nome):
+    """SHA-256 contido no nome do arquivo ou None para nomes antigos"""
+    encontrado = NOME_RE.search(nome or '')
+    return encontrado.group('digest') if encontrado else None
+
+
+def nome_por_conteudo(diretorio, digest, extensao):
+    return f'{diretorio.rstrip("/")}/{digest[:2]}/{digest}{extensao}'.lstrip('/')
+
+
+@deconstructible
+class ArmazenamentoPorConteudo(FileSystemStorage):
+    """FileSystemStorage que nomeia cada arquivo pelo SHA-256 do conteúdo"""
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo é o digest, calculado em _save
+        return name
+
+    def _save(self, name, content):
+        diretorio, original = os.path.split(name)
+        extensao = os.path.splitext(original)[1].lower()
+        pasta_temporaria = self.path(diretorio)
+        os.makedirs(pasta_temporaria, exist_ok=True)
+
+        sha256 = hashlib.sha256()
+        descritor, temporario = tempfile.mkstemp(dir=pasta_temporaria, suffix=SUFIXO_TEMPORARIO)
+        try:
+            with os.fdopen(descritor, 'wb') as destino:
+                for bloco in content.chunks():
+                    sha256.update(bloco)
+                    destino.write(bloco)
+
+            nome = nome_por_conteudo(diretorio, sha256.hexdigest(), extensao)
+            caminho = self.path(nome)
+            if os.path.exists(caminho):
+                # Conteúdo já armazenado: descarta a cópia e renova a data,
+                # para a limpeza não remover um órfão que acabou de ser reenviado
+                os.remove(temporario)
+                os.utime(caminho)
+            else:
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                os.replace(temporario, caminho)
+                if self.file_permissions_mode is not None:
+                    os.chmod(caminho, self.file_permissions_mode)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        return nome.replace('\\', '/')
+
+
+def referencias(nome):
+    """Quantidade de ementas que apontam para o arquivo"""
+    from .models import Ementa
+
+    return Ementa.objects.filter(arquivo=nome).count()
@@ -0,0 +1,273 @@
+"""
+Sugestões de busca (autocompletar) das ementas.
+
+Enquanto o usuário digita no campo de pesquisa, ``sugerir`` retorna as
+primeiras ementas publicadas cujo número começa pelo número digitado (índice
+``varchar_pattern_ops``) ou cujo título contém palavras parecidas com o termo
+(similaridade de trigramas, índice ``ementa_titulo_trgm``).
+
+Os resultados passam por dois níveis de cache, ambos com a versão das ementas
+(``core.contagem``) na chave: um LRU pequeno na memória do processo, para os
+prefixos mais digitados, e o cache compartilhado do Django. A versão também
+fica no processo por ``SUGESTOES_VERSAO_TTL`` segundos (e é esquecida ao
+salvar ou excluir uma ementa no próprio processo), então um acerto no LRU
+não vai ao cache compartilhado; alterações feitas por outros processos
+aparecem em até esse tempo. A consulta roda
+com ``statement_timeout`` (``SUGESTOES_TEMPO_LIMITE_MS``): se estourar, a
+resposta sai vazia em vez de segurar a digitação. ``asugerir`` é a versão
+para as views assíncronas.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from core.contagem import aversao, versao
+
+from .busca import busca_textual_disponivel, extrair_numero
+from .models import Ementa
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_MINIMO = 2
+TAMANHO_MAXIMO = 60
+LIMITE_PADRAO = 8
+LIMITE_MAXIMO = 20
+
+
+def _timeout():
+    return getattr(settings, "SUGESTOES_CACHE_TIMEOUT", 300)
+
+
+def _tamanho_lru():
+    return getattr(settings, "SUGESTOES_LRU_TAMANHO", 512)
+
+
+def _versao_ttl():
+    return getattr(settings, "SUGESTOES_VERSAO_TTL", 5)
+
+
+def _tempo_limite_ms():
+    return getattr(settings, "SUGESTOES_TEMPO_LIMITE_MS", 200)
+
+
+class CacheLRU:
+    """Cache em memória do processo que descarta o item usado há mais tempo"""
+
+    def __init__(self, tamanho=None):
+        self.tamanho = tamanho
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            try:
+                self._itens.move_to_end(chave)
+            except KeyError:
+                return None
+            return self._itens[chave]
+
+    def set(self, chave, valor):
+        tamanho = self.tamanho or _tamanho_lru()
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > tamanho:
+                self._itens.popitem(last=False)
+
+    def clear(self):
+        with self._trava:
+            self._itens.clear()
+
+
+lru = CacheLRU()
+
+
+class VersaoLocal:
+    """Versão das ementas guardada na memória do processo por alguns segundos"""
+
+    def __init__(self):
+        self._atual = (None, 0.0)
+
+    def get(self):
+        valor, validade = self._atual
+        return valor if time.monotonic() < validade else None
+
+    def set(self, valor):
+        self._atual = (valor, time.monotonic() + _versao_ttl())
+
+    def clear(self):
+        self._atual = (None, 0.0)
+
+
+versao_local = VersaoLocal()
+
+
+def esquecer_versao(**kwargs):
+    """Receptor de save/delete: as alterações do próprio processo valem na hora"""
+    versao_local.clear()
+
+
+def _versao_ementas():
+    valor = versao_local.get()
+    if valor is None:
+        valor = versao(Ementa)
+        versao_local.set(valor)
+    return valor
+
+
+async def _aversao_ementas():
+    valor = versao_local.get()
+    if valor is None:
+        valor = await aversao(Ementa)
+        versao_local.set(valor)
+    return valor
+
+
+class TempoEsgotado(Exception):
+    """A consulta das sugestões passou do tempo limite"""
+
+
+@contextmanager
+def tempo_limite(milissegundos, using=DEFAULT_DB_ALIAS):
+    """
+    Limita o tempo das consultas do bloco (``SET LOCAL statement_timeout``).
+
+    Só tem efeito no PostgreSQL. O bloco roda em uma transação (ou savepoint);
+    dentro de uma transação externa o valor anterior é restaurado no fim.
+    """
+    conexao = connections[using]
+    if conexao.vendor != "postgresql" or not milissegundos:
+        yield
+        return
+
+    aninhado = conexao.in_atomic_block
+    with transaction.atomic(using=using):
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                "SELECT current_setting('statement_timeout'), set_config('statement_timeout', %s, true)",
+                [f"{int(milissegundos)}ms"],
+            )
+            anterior = cursor.fetchone()[0]
+        yield
+        if aninhado:
+            with conexao.cursor() as cursor:
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)", [anterior])
+
+
+def normalizar_termo(q):
+    """Termo sem espaços repetidos, limitado a ``TAMANHO_MAXIMO`` caracteres"""
+    return " ".join((q or "").split())[:TAMANHO_MAXIMO]
+
+
+def _chave(termo, limite, versao_ementas):
+    resumo = hashlib.md5(termo.encode(), usedforsecurity=False).hexdigest()
+    return f"sugestoes:{versao_ementas}:{limite}:{resumo}"
+
+
+def chave_sugestoes(termo, limite):
+    return _chave(termo, limite, _versao_ementas())
+
+
+def consultar_sugestoes(termo, limite):
+    """Ementas publicadas que combinam com o termo, as de número primeiro"""
+    qs = Ementa.objects.filter(publicado=True)
+    numero = extrair_numero(termo)
+
+    if busca_textual_disponivel():
+        filtro = Q(titulo__trigram_word_similar=termo)
+        qs = qs.annotate(similaridade=TrigramWordSimilarity(termo, "titulo"))
+        ordenacao = ["prioridade", "-similaridade"]
+    else:
+        filtro = Q(titulo__icontains=termo)
+        ordenacao = ["prioridade"]
+
+    prioridade = Value(1, output_field=IntegerField())
+    if numero:
+        # LIKE 'numero%' sem UPPER() usa o índice ementa_numero_prefixo_idx
+        filtro |= Q(numero__startswith=numero)
+        prioridade = Case(
+            When(numero__startswith=numero, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )
+
+    linhas = (
+        qs.filter(filtro)
+        .annotate(prioridade=prioridade)
+        .order_by(*ordenacao, "-data_publicacao", "-id")
+        .values_list("id", "numero", "titulo", "sigiloso")[:limite]
+    )
+    with tempo_limite(_tempo_limite_ms(), using=qs.db):
+        linhas = list(linhas)
+    return [
+        {"id": pk, "numero": numero_ato, "titulo": titulo, "sigiloso": sigiloso}
+        for pk, numero_ato, titulo, sigiloso in linhas
+    ]
+
+
+def _consultar(termo, limite):
+    """Consulta o banco convertendo o cancelamento por tempo em ``TempoEsgotado``"""
+    try:
+        return consultar_sugestoes(termo, limite)
+    except OperationalError as exc:
+        if not _cancelada(exc):
+            raise
+        logger.warning("Sugestões de %r passaram de %s ms", termo, _tempo_limite_ms())
+        raise TempoEsgotado from exc
+
+
+def sugerir(q, limite=LIMITE_PADRAO):
+    """
+    Sugestões para o termo digitado: LRU do processo, cache compartilhado e
+    por fim o banco. Levanta ``TempoEsgotado`` se a consulta passar do limite.
+    """
+    termo = normalizar_termo(q)
+    if len(termo) < TAMANHO_MINIMO:
+        return []
+
+    chave = chave_sugestoes(termo, limite)
+    sugestoes = lru.get(chave)
+    if sugestoes is not None:
+        return sugestoes
+
+    sugestoes = cache.get(chave)
+    if sugestoes is None:
+        sugestoes = _consultar(termo, limite)
+        cache.set(chave, sugestoes, _timeout())
+    lru.set(chave, sugestoes)
+    return sugestoes
+
+
+async def asugerir(q, limite=LIMITE_PADRAO):
+    termo = normalizar_termo(q)
+    if len(termo) < TAMANHO_MINIMO:
+        return []
+
+    chave = _chave(termo, limite, await _aversao_ementas())
+    sugestoes = lru.get(chave)
+    if sugestoes is not None:
+        return sugestoes
+
+    sugestoes = await cache.aget(chave)
+    if sugestoes is None:
+        # O statement_timeout exige uma transação, que só existe no código síncrono
+        sugestoes = await sync_to_async(_consultar)(termo, limite)
+        await cache.aset(chave, sugestoes, _timeout())
+    lru.set(chave, sugestoes)
+    return sugestoes
+
+
+def _cancelada(exc):
+    """Indica se o erro é o cancelamento pelo statement_timeout"""
+    causa = getattr(exc, "__cause__", None)
+    return getattr(causa, "sqlstate", None) == "57014"
@@ -1,3 +1,978 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.urls import clear_url_caches, reverse
+from .admin import EmentaAdmin
+from .management.commands.limpar_pdfs_orfaos import Command as LimparPdfsOrfaos
+from .models import Ementa, TextoArquivo
+from core.cache_paginas import paginas_invalidadas
+from core.contagem import invalidar, versao
+from core.paginacao import expressoes_ordenacao
+from .busca import busca_textual_disponivel
+from .facetas import contar_facetas
+from .filtros import ler_filtros
+from .fragmentos import renderizar_linhas
+from .storage import referencias
+from .sugestoes import lru, tempo_limite, versao_local
+from .views import ORDENACAO_LISTA
+
+
+@contextmanager
+def views_assincronas():
+    """URLs com as views assíncronas (``VIEWS_ASYNC``), como sob ASGI"""
+    import core.urls
+    import ementas.urls
+    import protocolos.urls
+
+    def recarregar():
+        for modulo in (ementas.urls, protocolos.urls, core.urls):
+            importlib.reload(modulo)
+        clear_url_caches()
+
+    try:
+        with override_settings(VIEWS_ASYNC=True):
+            recarregar()
+            yield
+    finally:
+        recarregar()
+
+
+def gerar_pdf(*paginas):
+    """Gera um PDF mínimo com uma linha de texto por página"""
+    objetos = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for texto in paginas:
+        conteudo = f'BT /F1 12 Tf 72 720 Td ({texto}) Tj ET'
+        objetos.append(f'<< /Length {len(conteudo)} >>\nstream\n{conteudo}\nendstream')
+        objetos.append(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objetos)} 0 R >>'
+        )
+        kids.append(f'{len(objetos)} 0 R')
+    objetos[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for numero, objeto in enumerate(objetos, start=1):
+        offsets.append(len(pdf))
+        pdf += f'{numero} 0 obj\n{objeto}\nendobj\n'.encode('latin-1')
+    xref = len(pdf)
+    pdf += f'xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n'.encode()
+    for offset in offsets:
+        pdf += f'{offset:010d} 00000 n \n'.encode()
+    pdf += f'trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return pdf
+
+
+class BuscaEmentaTest(TestCase):
+    def setUp(self):
+        self.portaria = Ementa.objects.create(
+            numero='123/2024',
+            titulo='Portaria sobre fiscalização de obras',
+            ementa='Dispõe sobre a fiscalização de obras de engenharia civil',
+        )
+        self.decisao = Ementa.objects.create(
+            numero='45',
+            titulo='Decisão Plenária sobre anuidades',
+            tipo_ato_normativo='decisao_plenaria',
+            ementa='Fixa os valores das anuidades e menciona obras',
+        )
+
+    def buscar(self, q):
+        response = self.client.get(reverse('ementas:lista'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['page_obj'].object_list)
+
+    def test_busca_por_titulo(self):
+        """Testa que a busca encontra ementas pelo título"""
+        self.assertEqual(self.buscar('anuidades'), [self.decisao])
+
+    def test_busca_ignora_acentos(self):
+        """Testa que a busca não diferencia termos com e sem acento"""
+        if not busca_textual_disponivel():
+            self.skipTest('Busca textual requer PostgreSQL')
+        self.assertEqual(self.buscar('fiscalizacao'), [self.portaria])
+
+    def test_busca_ordena_por_relevancia(self):
+        """Testa que ocorrências no título pesam mais que na ementa"""
+        if not busca_textual_disponivel():
+            self.skipTest('Busca textual requer PostgreSQL')
+        self.assertEqual(self.buscar('obras'), [self.portaria, self.decisao])
+
+    def test_busca_por_numero_do_ato(self):
+        """Testa a localização de atos pelo número, com ou sem o tipo"""
+        self.assertEqual(self.buscar('123/2024'), [self.portaria])
+        if busca_textual_disponivel():
+            self.assertEqual(self.buscar('Portaria 123/2024')[0], self.portaria)
+            self.assertEqual(self.buscar('DP 45')[0], self.decisao)
+
+    def test_busca_tolera_erro_de_digitacao(self):
+        """Testa que a similaridade de trigramas tolera erros de digitação"""
+        if not busca_textual_disponivel():
+            self.skipTest('Similaridade de trigramas requer PostgreSQL')
+        self.assertEqual(self.buscar('anuidadse'), [self.decisao])
+
+    def test_vetor_atualizado_no_save(self):
+        """Testa que alterar o título atualiza o vetor de busca"""
+        self.portaria.titulo = 'Portaria sobre licitações'
+        self.portaria.save()
+        self.assertEqual(self.buscar('licitações'), [self.portaria])
+
+    def test_comando_atualizar_indice_busca(self):
+        """Testa o preenchimento em lotes dos vetores de busca"""
+        if not busca_textual_disponivel():
+            self.skipTest('Busca textual requer PostgreSQL')
+        Ementa.objects.update(busca=None)
+        call_command('atualizar_indice_busca', lote=1, stdout=StringIO())
+        self.assertFalse(Ementa.objects.filter(busca__isnull=True).exists())
+        self.assertEqual(self.buscar('anuidades'), [self.decisao])
+
+
+@override_settings(PAGINAS_NUMERADAS=1)
+class PaginacaoCursorEmentaTest(TestCase):
+    def test_percorre_ementas_com_data_nula(self):
+        """Testa a paginação por cursor com datas de publicação nulas"""
+        from datetime import date
+        for i in range(25):
+            Ementa.objects.create(
+                titulo=f'Ementa {i}',
+                data_publicacao=None if i % 4 == 0 else date(2024, 1, 1 + i % 3),
+            )
+        esperado = list(Ementa.objects.order_by(*expressoes_ordenacao(ORDENACAO_LISTA)))
+
+        response = self.client.get(reverse('ementas:lista'))
+        pagina = response.context['page_obj']
+        vistos = list(pagina.object_list)
+        cursor = pagina.cursor_proximo
+        while cursor:
+            pagina = self.client.get(reverse('ementas:lista'), {'cursor': cursor}).context['page_obj']
+            vistos.extend(pagina.object_list)
+            cursor = pagina.cursor_proximo
+        self.assertEqual(vistos, esperado)
+
+
+class ListagemEmentaConsultasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.autor = get_user_model().objects.create_user(username='autor', password='senha12345')
+        self.outro = get_user_model().objects.create_user(username='outro', password='senha12345')
+        for i in range(60):
+            Ementa.objects.create(
+                titulo=f'Ementa {i}',
+                ementa='Texto longo da ementa ' * 20,
+                resumo='Resumo' if i % 2 else '',
+                criado_por=self.autor if i % 3 else self.outro,
+            )
+
+    def consultas_da_listagem(self, itens_por_pagina):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ementas:lista'), {'itens_por_pagina': itens_por_pagina})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_consultas_nao_crescem_com_o_tamanho_da_pagina(self):
+        """Testa que a listagem faz o mesmo número de consultas para 10 ou 50 itens"""
+        self.client.force_login(self.autor)
+        cache.clear()
+        consultas_10, _ = self.consultas_da_listagem(10)
+        cache.clear()
+        consultas_50, response = self.consultas_da_listagem(50)
+        self.assertEqual(consultas_10, consultas_50)
+        # sessão, usuário (com o perfil), estimativa, contagem, facetas e a página
+        self.assertLessEqual(consultas_50, 6)
+
+        ementas = response.context['page_obj'].object_list
+        self.assertEqual(
+            [e.pk for e in ementas if e.pode_editar],
+            [e.pk for e in ementas if e.criado_por_id == self.autor.pk],
+        )
+
+    def test_trechos_truncados_no_banco(self):
+        """Testa que a listagem não carrega os textos completos"""
+        _, response = self.consultas_da_listagem(10)
+        ementa = response.context['page_obj'].object_list[0]
+        self.assertEqual(len(ementa.trecho_ementa), 201)
+        self.assertIn('ementa', ementa.get_deferred_fields())
+        self.assertIn('resumo', ementa.get_deferred_fields())
+        self.assertContains(response, 'Texto longo da ementa')
+
+
+class ExtracaoTextoPDFTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def criar_ementa(self, pdf, **kwargs):
+        return Ementa.objects.create(
+            titulo=kwargs.pop('titulo', 'Portaria de teste'),
+            arquivo=SimpleUploadedFile('ato.pdf', pdf, content_type='application/pdf'),
+            **kwargs
+        )
+
+    def extrair(self):
+        call_command('extrair_textos_pdf', workers=0, stdout=StringIO(), stderr=StringIO())
+
+    def test_extrai_texto_de_todas_as_paginas(self):
+        """Testa a extração página a página do PDF da ementa"""
+        ementa = self.criar_ementa(gerar_pdf('Primeira pagina sobre topografia', 'Segunda pagina'))
+        self.extrair()
+
+        texto = TextoArquivo.objects.get(ementa=ementa)
+        self.assertEqual(texto.paginas, 2)
+        self.assertIn('topografia', texto.texto)
+        self.assertIn('Segunda', texto.texto)
+        self.assertEqual(len(texto.hash_arquivo), 64)
+
+    def test_limite_de_caracteres_interrompe_a_extracao(self):
+        """Testa que as páginas além do limite de caracteres não são extraídas"""
+        from pypdf import PageObject
+
+        ementa = self.criar_ementa(gerar_pdf(*(f'Pagina {i} sobre topografia' for i in range(6))))
+        with mock.patch('ementas.extracao.MAX_CARACTERES', 40), \
+                mock.patch.object(PageObject, 'extract_text', autospec=True,
+                                  side_effect=PageObject.extract_text) as extrair_texto:
+            self.extrair()
+        self.assertEqual(extrair_texto.call_count, 2)
+
+        texto = TextoArquivo.objects.get(ementa=ementa)
+        self.assertEqual(texto.paginas, 6)
+        self.assertIn('Pagina 0', texto.texto)
+        self.assertNotIn('Pagina 2', texto.texto)
+
+    def test_texto_do_pdf_entra_na_busca(self):
+        """Testa que o conteúdo do PDF passa a ser encontrado pela busca"""
+        if not busca_textual_disponivel():
+            self.skipTest('Busca textual requer PostgreSQL')
+        ementa = self.criar_ementa(gerar_pdf('Normas de agrimensura'))
+        self.extrair()
+
+        response = self.client.get(reverse('ementas:lista'), {'q': 'agrimensura'})
+        self.assertEqual(list(response.context['page_obj'].object_list), [ementa])
+
+    def test_reextrai_apenas_quando_arquivo_muda(self):
+        """Testa que o PDF só é processado de novo quando o arquivo é trocado"""
+        ementa = self.criar_ementa(gerar_pdf('Versao original'))
+        self.extrair()
+        extraido_em = TextoArquivo.objects.get(ementa=ementa).extraido_em
+
+        self.extrair()
+        self.assertEqual(TextoArquivo.objects.get(ementa=ementa).extraido_em, extraido_em)
+
+        ementa.arquivo = SimpleUploadedFile('ato.pdf', gerar_pdf('Versao corrigida'))
+        ementa.save()
+        self.extrair()
+        self.assertIn('corrigida', TextoArquivo.objects.get(ementa=ementa).texto)
+
+    def test_ignora_ementas_sigilosas(self):
+        """Testa que ementas sigilosas não têm o PDF extraído"""
+        ementa = self.criar_ementa(gerar_pdf('Conteudo reservado'))
+        self.extrair()
+        Ementa.objects.filter(pk=ementa.pk).update(sigiloso=True)
+        self.extrair()
+
+        self.assertFalse(TextoArquivo.objects.filter(ementa=ementa).exists())
+
+
+class ArquivoEmentaTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.pdf = gerar_pdf('Conteudo do ato')
+        self.ementa = Ementa.objects.create(
+            titulo='Portaria com PDF',
+            arquivo=SimpleUploadedFile('ato.pdf', self.pdf, content_type='application/pdf'),
+        )
+        self.url = reverse('ementas:arquivo', args=[self.ementa.pk])
+
+    def test_download_completo(self):
+        """Testa a entrega do PDF inteiro com ETag e Last-Modified"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(b''.join(response.streaming_content), self.pdf)
+
+    def test_range(self):
+        """Testa requisições de intervalo (Range)"""
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(self.pdf)}')
+        self.assertEqual(b''.join(response.streaming_content), self.pdf[:10])
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(b''.join(response.streaming_content), self.pdf[-5:])
+
+        response = self.client.get(self.url, headers={'Range': f'bytes={len(self.pdf)}-'})
+        self.assertEqual(response.status_code, 416)
+
+    def test_if_range_desatualizado(self):
+        """Testa que If-Range com ETag antigo devolve o arquivo inteiro"""
+        response = self.client.get(self.url, headers={'Range': 'bytes=0-9', 'If-Range': '"antigo"'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_condicional(self):
+        """Testa o 304 quando o ETag não mudou"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_controle_de_acesso(self):
+        """Testa que PDFs sigilosos ou não publicados não são entregues ao público"""
+        Ementa.objects.filter(pk=self.ementa.pk).update(sigiloso=True)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        Ementa.objects.filter(pk=self.ementa.pk).update(sigiloso=False, publicado=False)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        staff = get_user_model().objects.create_user(username='staff', password='senha12345', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+    @override_settings(ARQUIVOS_ENVIO='x-accel-redirect', ARQUIVOS_X_ACCEL_PREFIXO='/protegido/')
+    def test_x_accel_redirect(self):
+        """Testa a delegação da transferência ao nginx"""
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protegido/{self.ementa.arquivo.name}')
+        self.assertEqual(response.content, b'')
+
+
+class ArmazenamentoPorConteudoTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.pdf = gerar_pdf('Ato republicado')
+
+    def criar_ementa(self, pdf, nome='ato.pdf'):
+        return Ementa.objects.create(
+            titulo='Portaria', arquivo=SimpleUploadedFile(nome, pdf, content_type='application/pdf'),
+        )
+
+    def arquivos_em_disco(self):
+        return sorted(
+            os.path.relpath(os.path.join(raiz, nome), self.media)
+            for raiz, _, nomes in os.walk(self.media) for nome in nomes
+        )
+
+    def limpar(self, *args):
+        call_command('limpar_pdfs_orfaos', '--carencia', '0', *args, stdout=StringIO())
+
+    def test_mesmo_pdf_armazenado_uma_vez(self):
+        """Testa que o mesmo PDF enviado para duas ementas ocupa um único arquivo"""
+        primeira = self.criar_ementa(self.pdf, 'original.pdf')
+        segunda = self.criar_ementa(self.pdf, 'correcao.pdf')
+        digest = hashlib.sha256(self.pdf).hexdigest()
+        self.assertEqual(primeira.arquivo.name, f'ementas/pdf/{digest[:2]}/{digest}.pdf')
+        self.assertEqual(primeira.arquivo.name, segunda.arquivo.name)
+        self.assertEqual(primeira.versao_arquivo, digest)
+        self.assertEqual(self.arquivos_em_disco(), [primeira.arquivo.name])
+        self.assertEqual(referencias(primeira.arquivo.name), 2)
+
+    def test_limpeza_de_orfaos(self):
+        """Testa que só arquivos sem referências são removidos"""
+        primeira = self.criar_ementa(self.pdf)
+        segunda = self.criar_ementa(self.pdf)
+        outra = self.criar_ementa(gerar_pdf('Outro ato'))
+        nome_outra = outra.arquivo.name
+        outra.delete()
+        primeira.delete()
+        self.limpar()
+        self.assertEqual(self.arquivos_em_disco(), [segunda.arquivo.name])
+        self.assertNotIn(nome_outra, self.arquivos_em_disco())
+
+    def test_reenvio_de_orfao_nao_e_removido(self):
+        """Testa que um órfão antigo reenviado é protegido pela carência e pela nova referência"""
+        orfa = self.criar_ementa(self.pdf)
+        nome = orfa.arquivo.name
+        orfa.delete()
+        antigo = os.path.getmtime(os.path.join(self.media, nome)) - 7 * 24 * 3600
+        os.utime(os.path.join(self.media, nome), (antigo, antigo))
+
+        self.criar_ementa(self.pdf)
+        self.assertGreater(os.path.getmtime(os.path.join(self.media, nome)), antigo)
+        call_command('limpar_pdfs_orfaos', stdout=StringIO())
+        self.assertEqual(self.arquivos_em_disco(), [nome])
+
+    def test_referencia_criada_durante_a_limpeza(self):
+        """Testa que a limpeza confere as referências antes de remover cada arquivo"""
+        orfa = self.criar_ementa(self.pdf)
+        nome = orfa.arquivo.name
+        orfa.delete()
+
+        listar = LimparPdfsOrfaos.listar
+
+        def listar_e_reenviar(comando, diretorio):
+            for arquivo in listar(comando, diretorio):
+                Ementa.objects.create(titulo='Reenvio', arquivo=nome)
+                yield arquivo
+
+        with mock.patch.object(LimparPdfsOrfaos, 'listar', listar_e_reenviar):
+            self.limpar()
+        self.assertEqual(self.arquivos_em_disco(), [nome])
+
+    def test_conversao_de_nomes_antigos(self):
+        """Testa a conversão dos PDFs gravados com o upload_to antigo"""
+        ementa = self.criar_ementa(self.pdf)
+        antigo = default_storage.save('ementas/pdf/ato_antigo.pdf', ContentFile(self.pdf))
+        Ementa.objects.filter(pk=ementa.pk).update(arquivo=antigo)
+        self.limpar('--converter')
+        ementa.refresh_from_db()
+        self.assertEqual(ementa.versao_arquivo, hashlib.sha256(self.pdf).hexdigest())
+        self.assertEqual(self.arquivos_em_disco(), [ementa.arquivo.name])
+
+    @override_settings(ARQUIVOS_MAX_AGE=120)
+    def test_cache_do_link_versionado(self):
+        """Testa que o PDF versionado tem cache curto e privado, nunca imutável"""
+        ementa = self.criar_ementa(self.pdf)
+        url = reverse('ementas:arquivo', args=[ementa.pk])
+        response = self.client.get(url, {'v': ementa.versao_arquivo})
+        self.assertEqual(response['Cache-Control'], 'private, max-age=120')
+        self.assertEqual(response['ETag'], f'"{ementa.versao_arquivo}"')
+        self.assertNotIn('Cache-Control', self.client.get(url))
+
+
+class ApiEmentasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(5):
+            Ementa.objects.create(
+                numero=f'{i}/2024', titulo=f'Portaria de diárias {i}', ementa='Texto longo',
+                data_publicacao=f'2024-01-0{i + 1}',
+            )
+        self.sigilosa = Ementa.objects.create(
+            titulo='Portaria sigilosa', sigiloso=True, tipo_ato_normativo='decisao_plenaria',
+        )
+        Ementa.objects.filter(pk=self.sigilosa.pk).update(ementa='Conteúdo secreto')
+        Ementa.objects.create(titulo='Rascunho', publicado=False)
+
+    def test_listagem_com_cursor(self):
+        """Testa a paginação por cursor percorrendo todas as ementas publicadas"""
+        url = reverse('ementas:api_lista')
+        vistos = []
+        dados = self.client.get(url, {'limite': 2}).json()
+        self.assertEqual(dados['total'], 6)
+        while True:
+            vistos += [item['id'] for item in dados['resultados']]
+            if not dados['proximo']:
+                break
+            dados = self.client.get(dados['proximo']).json()
+        esperado = list(
+            Ementa.objects.filter(publicado=True)
+            .order_by(*expressoes_ordenacao(ORDENACAO_LISTA)).values_list('pk', flat=True)
+        )
+        self.assertEqual(vistos, esperado)
+
+    def test_campos_esparsos(self):
+        """Testa fields= e a omissão dos textos longos por padrão"""
+        url = reverse('ementas:api_lista')
+        item = self.client.get(url).json()['resultados'][0]
+        self.assertNotIn('ementa', item)
+        item = self.client.get(url, {'fields': 'id,titulo'}).json()['resultados'][0]
+        self.assertEqual(set(item), {'id', 'titulo'})
+        self.assertEqual(self.client.get(url, {'fields': 'id,senha'}).status_code, 400)
+
+    def test_filtros_da_listagem(self):
+        """Testa que a API usa os mesmos filtros da página de listagem"""
+        url = reverse('ementas:api_lista')
+        dados = self.client.get(url, {'tipo_ato': 'decisao_plenaria'}).json()
+        self.assertEqual([item['id'] for item in dados['resultados']], [self.sigilosa.pk])
+
+    def test_sigilosa_sem_conteudo(self):
+        """Testa que o conteúdo de ementas sigilosas nunca é exposto"""
+        url = reverse('ementas:api_detalhe', args=[self.sigilosa.pk])
+        dados = self.client.get(url).json()
+        self.assertEqual(dados['titulo'], 'Portaria sigilosa')
+        self.assertIsNone(dados['ementa'])
+        self.assertIsNone(dados['arquivo'])
+
+    def test_nao_publicada(self):
+        """Testa que ementas não publicadas não aparecem na API"""
+        rascunho = Ementa.objects.get(titulo='Rascunho')
+        response = self.client.get(reverse('ementas:api_detalhe', args=[rascunho.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_etag(self):
+        """Testa a revalidação com If-None-Match sem consultar o banco"""
+        url = reverse('ementas:api_lista')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+        Ementa.objects.create(titulo='Nova portaria')
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_facetas(self):
+        """Testa os totais por tipo, situação e ano"""
+        dados = self.client.get(reverse('ementas:api_facetas')).json()
+        tipos = {item['valor']: item['total'] for item in dados['tipo_ato_normativo']}
+        self.assertEqual(tipos, {'portaria': 5, 'decisao_plenaria': 1, 'ato_administrativo': 0})
+        self.assertIn({'valor': 2024, 'total': 5}, dados['ano'])
+
+    def test_cursor_na_busca(self):
+        """Testa a paginação por cursor dos resultados ordenados por relevância"""
+        if not busca_textual_disponivel():
+            self.skipTest('Busca textual requer PostgreSQL')
+        url = reverse('ementas:api_lista')
+        dados = self.client.get(url, {'q': 'diárias', 'limite': 2}).json()
+        vistos = [item['id'] for item in dados['resultados']]
+        while dados['proximo']:
+            dados = self.client.get(dados['proximo']).json()
+            vistos += [item['id'] for item in dados['resultados']]
+        self.assertEqual(len(vistos), 5)
+        self.assertEqual(len(set(vistos)), 5)
+
+
+class ExportacaoEmentaTest(TestCase):
+    def setUp(self):
+        Ementa.objects.create(titulo='Portaria pública', ementa='Conteúdo público')
+        sigilosa = Ementa.objects.create(titulo='Portaria sigilosa', sigiloso=True)
+        Ementa.objects.filter(pk=sigilosa.pk).update(ementa='Conteúdo secreto')
+        Ementa.objects.create(titulo='Rascunho', publicado=False)
+        self.staff = get_user_model().objects.create_user(username='staff', password='senha12345', is_staff=True)
+
+    def test_exportacao_respeita_sigilo_e_publicacao(self):
+        """Testa que a exportação não traz rascunhos nem o conteúdo das sigilosas"""
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('ementas:exportar'), {'formato': 'ndjson'})
+        registros = {
+            registro['titulo']: registro
+            for registro in map(json.loads, b''.join(response.streaming_content).splitlines())
+        }
+        self.assertEqual(set(registros), {'Portaria pública', 'Portaria sigilosa'})
+        self.assertEqual(registros['Portaria pública']['ementa'], 'Conteúdo público')
+        self.assertIsNone(registros['Portaria sigilosa']['ementa'])
+
+    def test_comando(self):
+        """Testa o comando de exportação de ementas"""
+        saida = os.path.join(tempfile.mkdtemp(), 'ementas.csv')
+        self.addCleanup(shutil.rmtree, os.path.dirname(saida), ignore_errors=True)
+        call_command('exportar_ementas', '--saida', saida, stderr=StringIO())
+        with open(saida, encoding='utf-8-sig') as arquivo:
+            conteudo = arquivo.read()
+        self.assertIn('Portaria pública', conteudo)
+        self.assertNotIn('Conteúdo secreto', conteudo)
+
+
+class CachePaginasEmentaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ementa = Ementa.objects.create(titulo='Portaria em cache', ementa='Texto da portaria')
+        self.outra = Ementa.objects.create(titulo='Outra portaria', ementa='Outro texto')
+        self.usuario = get_user_model().objects.create_user(username='leitor', password='senha12345')
+
+    def test_anonimo_servido_do_cache(self):
+        """Testa que a segunda visita anônima não consulta o banco"""
+        primeira = self.client.get(reverse('ementas:lista'), {'q': '', 'utm_source': 'email'})
+        self.assertEqual(primeira['X-Cache'], 'MISS')
+        self.assertIn('public', primeira['Cache-Control'])
+        self.assertIn('Cookie', primeira['Vary'])
+        self.assertEqual(primeira['Surrogate-Key'], 'ementas ementas:lista')
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(reverse('ementas:lista'))
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(segunda.content, primeira.content)
+
+        condicional = self.client.get(reverse('ementas:lista'), HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(condicional.status_code, 304)
+
+    def test_parametros_distintos(self):
+        """Testa que filtros diferentes geram páginas diferentes"""
+        self.client.get(reverse('ementas:lista'))
+        response = self.client.get(reverse('ementas:lista'), {'tipo_ato': 'portaria'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+    def test_invalidacao_por_tags(self):
+        """Testa que salvar uma ementa invalida a listagem e o próprio detalhe"""
+        lista = reverse('ementas:lista')
+        detalhe = reverse('ementas:detalhe', args=[self.ementa.pk])
+        outro_detalhe = reverse('ementas:detalhe', args=[self.outra.pk])
+        for url in (lista, detalhe, outro_detalhe):
+            self.client.get(url)
+
+        self.ementa.titulo = 'Portaria alterada'
+        self.ementa.save()
+
+        response = self.client.get(lista)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Portaria alterada')
+        self.assertEqual(self.client.get(detalhe)['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(outro_detalhe)['X-Cache'], 'HIT')
+
+    def test_acao_do_admin_invalida(self):
+        """Testa que as ações em massa do admin invalidam as páginas e o ETag da API"""
+        detalhe = reverse('ementas:detalhe', args=[self.ementa.pk])
+        api = reverse('ementas:api_lista')
+        self.client.get(reverse('ementas:lista'))
+        self.client.get(detalhe)
+        etag = self.client.get(api)['ETag']
+
+        request = RequestFactory().post('/')
+        request.user = self.usuario
+        model_admin = EmentaAdmin(Ementa, admin.site)
+        model_admin.message_user = lambda *args, **kwargs: None
+        model_admin.marcar_sigiloso(request, Ementa.objects.filter(pk=self.ementa.pk))
+
+        self.assertEqual(self.client.get(reverse('ementas:lista'))['X-Cache'], 'MISS')
+        response = self.client.get(detalhe)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotContains(response, 'Texto da portaria')
+        self.assertEqual(self.client.get(api, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_autenticado_nao_usa_cache(self):
+        """Testa que usuários autenticados não recebem nem gravam páginas em cache"""
+        self.client.get(reverse('ementas:lista'))
+        self.client.force_login(self.usuario)
+        response = self.client.get(reverse('ementas:lista'))
+        self.assertNotIn('X-Cache', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_sinal_para_purgar_proxy(self):
+        """Testa o sinal enviado com as tags invalidadas"""
+        recebidas = []
+
+        def receptor(sender, tags, **kwargs):
+            recebidas.append(tags)
+
+        paginas_invalidadas.connect(receptor)
+        self.addCleanup(paginas_invalidadas.disconnect, receptor)
+        pk = self.ementa.pk
+        self.ementa.delete()
+        self.assertEqual(recebidas, [('ementas:lista', f'ementa:{pk}')])
+
+
+class FragmentosListagemEmentaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.autor = get_user_model().objects.create_user(username='autor', password='senha12345')
+        self.ementas = [
+            Ementa.objects.create(titulo=f'Portaria {i}', ementa=f'Texto {i}', criado_por=self.autor)
+            for i in range(3)
+        ]
+        Ementa.objects.create(titulo='Sigilosa', sigiloso=True)
+
+    def test_linhas_em_um_get_many(self):
+        """Testa que as linhas são buscadas em lote e renderizadas só quando faltam"""
+        ementas = list(Ementa.objects.order_by('pk'))
+        with mock.patch('ementas.fragmentos.render_to_string', wraps=render_to_string) as render:
+            renderizar_linhas(ementas)
+            self.assertEqual(render.call_count, 4)
+            with mock.patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+                linhas = renderizar_linhas(list(Ementa.objects.order_by('pk')))
+            self.assertEqual(get_many.call_count, 1)
+            self.assertEqual(render.call_count, 4)
+        self.assertIn('Portaria 0', linhas[0].linha_html)
+        self.assertIn('sigilosa e não possui conteúdo', linhas[3].linha_html)
+
+    def test_edicao_renova_a_linha(self):
+        """Testa que editar a ementa gera um fragmento novo"""
+        ementa = self.ementas[0]
+        renderizar_linhas([ementa])
+        ementa.titulo = 'Portaria revisada'
+        ementa.save()
+        [linha] = renderizar_linhas([Ementa.objects.get(pk=ementa.pk)])
+        self.assertIn('Portaria revisada', linha.linha_html)
+
+    def test_sigilo_renova_a_linha(self):
+        """Testa que a ação do admin e o update() do sigilo não reaproveitam a linha"""
+        ementa = self.ementas[0]
+        renderizar_linhas([ementa])
+        request = RequestFactory().post('/')
+        request.user = self.autor
+        model_admin = EmentaAdmin(Ementa, admin.site)
+        model_admin.message_user = lambda *args, **kwargs: None
+        model_admin.marcar_sigiloso(request, Ementa.objects.filter(pk=ementa.pk))
+        atual = Ementa.objects.get(pk=ementa.pk)
+        self.assertGreater(atual.atualizado_em, ementa.atualizado_em)
+        [linha] = renderizar_linhas([atual])
+        self.assertIn('sigilosa e não possui conteúdo', linha.linha_html)
+
+        Ementa.objects.filter(pk=ementa.pk).update(sigiloso=False)
+        [linha] = renderizar_linhas([Ementa.objects.get(pk=ementa.pk)])
+        self.assertNotIn('sigilosa e não possui conteúdo', linha.linha_html)
+
+    def test_botao_editar_fora_do_fragmento(self):
+        """Testa que o botão de edição depende do usuário, não do fragmento"""
+        self.client.get(reverse('ementas:lista'))
+        editar = reverse('ementas:editar', args=[self.ementas[0].pk])
+        self.assertNotContains(self.client.get(reverse('ementas:lista'), {'q': 'Portaria'}), editar)
+
+        self.client.force_login(self.autor)
+        response = self.client.get(reverse('ementas:lista'), {'q': 'Portaria'})
+        self.assertContains(response, editar)
+        self.assertContains(response, 'Portaria 0')
+
+
+class FacetasListagemEmentaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        dados = [
+            ('portaria', 'em_vigor', '2023-05-10'),
+            ('portaria', 'em_vigor', '2024-02-01'),
+            ('portaria', 'revogada', '2024-03-01'),
+            ('decisao_plenaria', 'em_vigor', '2024-04-01'),
+            ('decisao_plenaria', 'revogada', None),
+        ]
+        for i, (tipo, situacao, data) in enumerate(dados):
+            ementa = Ementa.objects.create(titulo=f'Ato {i}', tipo_ato_normativo=tipo, situacao=situacao)
+            Ementa.objects.filter(pk=ementa.pk).update(data_publicacao=data)
+
+    def facetas(self, **params):
+        filtros = ler_filtros(params)
+        resultado = contar_facetas(filtros)
+        return {
+            nome: {item['valor']: item['total'] for item in itens}
+            for nome, itens in resultado.items()
+        }
+
+    def test_uma_consulta_agrupada_em_cache(self):
+        """Testa que as facetas saem de uma consulta e depois do cache"""
+        with self.assertNumQueries(1):
+            self.facetas()
+        with self.assertNumQueries(0):
+            self.facetas(tipo_ato='portaria')
+
+    def test_cada_faceta_ignora_o_proprio_filtro(self):
+        """Testa os totais considerando as demais seleções"""
+        facetas = self.facetas(tipo_ato='portaria')
+        self.assertEqual(facetas['tipo_ato_normativo']['portaria'], 3)
+        self.assertEqual(facetas['tipo_ato_normativo']['decisao_plenaria'], 2)
+        self.assertEqual(facetas['situacao'], {'em_vigor': 2, 'revogada': 1, 'cancelada': 0})
+        self.assertEqual(facetas['ano'], {2024: 2, 2023: 1})
+
+        facetas = self.facetas(situacao='revogada')
+        self.assertEqual(facetas['tipo_ato_normativo']['decisao_plenaria'], 1)
+        self.assertEqual(facetas['ano'], {2024: 1, None: 1})
+
+    def test_contexto_e_opcoes_da_listagem(self):
+        """Testa as facetas no contexto e ao lado das opções dos filtros"""
+        response = self.client.get(reverse('ementas:lista'), {'situacao': 'em_vigor'})
+        tipos = {item['valor']: item['total'] for item in response.context['facetas']['tipo_ato_normativo']}
+        self.assertEqual(tipos['portaria'], 2)
+        self.assertContains(response, 'Portaria (2)')
+        self.assertContains(response, 'data_inicio=2024-01-01')
+
+
+class SugestoesEmentaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        lru.clear()
+        self.portaria = Ementa.objects.create(numero='123/2024', titulo='Portaria sobre fiscalização de obras')
+        self.outra = Ementa.objects.create(numero='12', titulo='Decisão sobre anuidades')
+        self.rascunho = Ementa.objects.create(numero='1234', titulo='Portaria em elaboração', publicado=False)
+
+    def sugerir(self, q, **params):
+        response = self.client.get(reverse('ementas:api_sugestoes'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_prefixo_do_numero(self):
+        """Testa que ementas cujo número começa pelo termo são sugeridas, sem as não publicadas"""
+        dados = self.sugerir('12').json()
+        self.assertEqual({s['id'] for s in dados['sugestoes']}, {self.portaria.pk, self.outra.pk})
+        self.assertEqual(dados['sugestoes'][0]['url'], reverse('ementas:detalhe', args=[dados['sugestoes'][0]['id']]))
+
+        dados = self.sugerir('Portaria 123').json()
+        self.assertEqual(dados['sugestoes'][0]['id'], self.portaria.pk)
+
+    def test_titulo(self):
+        """Testa a sugestão pelo título"""
+        dados = self.sugerir('anuidades').json()
+        self.assertEqual([s['id'] for s in dados['sugestoes']], [self.outra.pk])
+
+    def test_termo_curto_e_limite(self):
+        """Testa que termos curtos não consultam o banco e que o limite é validado"""
+        with self.assertNumQueries(0):
+            self.assertEqual(self.sugerir('1').json()['sugestoes'], [])
+        response = self.client.get(reverse('ementas:api_sugestoes'), {'q': '12', 'limite': 500})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.sugerir('12', limite=1).json()['sugestoes']), 1)
+
+    def test_cache_em_dois_niveis(self):
+        """Testa o LRU do processo, o cache compartilhado e a invalidação"""
+        self.sugerir('12')
+        with self.assertNumQueries(0):
+            self.sugerir('12')
+        # Sem o LRU a resposta sai do cache compartilhado
+        lru.clear()
+        with self.assertNumQueries(0):
+            response = self.sugerir('12')
+        self.assertIn('max-age', response['Cache-Control'])
+
+        Ementa.objects.create(numero='125', titulo='Nova ementa')
+        self.assertEqual(len(self.sugerir('12').json()['sugestoes']), 3)
+
+    def test_acerto_no_lru_sem_cache_compartilhado(self):
+        """Testa que o LRU responde sem ler a versão das ementas do cache compartilhado"""
+        self.sugerir('12')
+        with mock.patch('ementas.sugestoes.versao', wraps=versao) as ler_versao, \
+                mock.patch.object(cache, 'get', wraps=cache.get) as ler_cache:
+            self.sugerir('12')
+        ler_versao.assert_not_called()
+        self.assertFalse(any('sugestoes' in str(chamada) for chamada in ler_cache.call_args_list))
+
+        # Alteração em outro processo (sem sinal neste): vale quando a versão local expira
+        Ementa.objects.filter(pk=self.rascunho.pk).update(publicado=True)
+        invalidar(Ementa)
+        self.assertEqual(len(self.sugerir('12').json()['sugestoes']), 2)
+        versao_local.clear()  # SUGESTOES_VERSAO_TTL esgotado
+        self.assertEqual(len(self.sugerir('12').json()['sugestoes']), 3)
+
+    def test_tempo_esgotado(self):
+        """Testa que o estouro do tempo limite responde sem sugestões e sem cache"""
+        erro = OperationalError('canceling statement due to statement timeout')
+        erro.__cause__ = Exception()
+        erro.__cause__.sqlstate = '57014'  # query_canceled
+        with mock.patch('ementas.sugestoes.consultar_sugestoes', side_effect=erro):
+            response = self.sugerir('12')
+        self.assertEqual(response.json(), {'q': '12', 'sugestoes': [], 'tempo_esgotado': True})
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(len(self.sugerir('12').json()['sugestoes']), 2)
+
+    def test_tempo_limite_postgresql(self):
+        """Testa que o statement_timeout cancela a consulta e é restaurado no fim do bloco"""
+        if not busca_textual_disponivel():
+            self.skipTest('statement_timeout requer PostgreSQL')
+
+        def atual():
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW statement_timeout')
+                return cursor.fetchone()[0]
+
+        antes = atual()
+        with self.assertRaises(OperationalError):
+            with tempo_limite(10):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(1)')
+        self.assertEqual(atual(), antes)
+
+        with tempo_limite(500):
+            self.assertEqual(atual(), '500ms')
+        self.assertEqual(atual(), antes)
+
+
+class ViewsAssincronasEmentaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        lru.clear()
+        self.autor = get_user_model().objects.create_user(username='autor', password='senha12345')
+        for i in range(25):
+            Ementa.objects.create(
+                numero=f'{i}/2024', titulo=f'Portaria de diárias {i}', ementa='Texto da ementa',
+                tipo_ato_normativo='portaria' if i % 2 else 'decisao_plenaria',
+                data_publicacao=f'2024-01-{i % 9 + 1:02d}', criado_por=self.autor,
+            )
+        self.rascunho = Ementa.objects.create(titulo='Rascunho', publicado=False)
+
+    def get_async(self, url, params=None, **kwargs):
+        with views_assincronas():
+            response = async_to_sync(self.async_client.get)(url, params or {}, **kwargs)
+            self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        return response
+
+    def test_listagem_igual_a_sincrona(self):
+        """Testa que a listagem assíncrona mostra as mesmas ementas, totais e facetas"""
+        self.client.force_login(self.autor)
+        self.async_client.force_login(self.autor)
+        url = reverse('ementas:lista')
+        for params in ({}, {'tipo_ato': 'portaria'}, {'q': 'diárias'}, {'page': 2}):
+            cache.clear()
+            esperado = self.client.get(url, params).context
+            cache.clear()
+            response = self.get_async(url, params)
+            self.assertEqual(response.status_code, 200)
+            pagina = response.context['page_obj']
+            self.assertEqual([e.pk for e in pagina], [e.pk for e in esperado['page_obj']])
+            self.assertEqual(pagina.paginator.count, esperado['page_obj'].paginator.count)
+            self.assertEqual(response.context['facetas'], esperado['facetas'])
+            self.assertContains(response, 'Portaria de diárias')
+
+    @override_settings(PAGINAS_NUMERADAS=2)
+    def test_cursor_e_cache_anonimo(self):
+        """Testa o percurso por cursor e o cache das páginas na listagem assíncrona"""
+        url = reverse('ementas:lista')
+        primeira = self.get_async(url)
+        self.assertEqual(primeira['X-Cache'], 'MISS')
+        self.assertEqual(self.get_async(url)['X-Cache'], 'HIT')
+
+        pagina = self.get_async(url, {'page': 2}).context['page_obj']
+        vistos = list(Ementa.objects.filter(publicado=True)
+                      .order_by(*expressoes_ordenacao(ORDENACAO_LISTA))[:10])
+        vistos += list(pagina)
+        cursor = pagina.cursor_proximo
+        while cursor:
+            pagina = self.get_async(url, {'cursor': cursor}).context['page_obj']
+            vistos.extend(pagina)
+            cursor = pagina.cursor_proximo
+        esperado = list(Ementa.objects.filter(publicado=True).order_by(*expressoes_ordenacao(ORDENACAO_LISTA)))
+        self.assertEqual(vistos, esperado)
+
+    def test_detalhe(self):
+        """Testa o detalhe assíncrono: publicada, inexistente e não publicada"""
+        ementa = Ementa.objects.filter(publicado=True).first()
+        self.assertContains(self.get_async(reverse('ementas:detalhe', args=[ementa.pk])), ementa.titulo)
+        self.assertEqual(self.get_async(reverse('ementas:detalhe', args=[999999])).status_code, 404)
+        self.assertEqual(self.get_async(reverse('ementas:detalhe', args=[self.rascunho.pk])).status_code, 404)
+
+        self.async_client.force_login(self.autor)
+        response = self.get_async(reverse('ementas:detalhe', args=[ementa.pk]))
+        self.assertContains(response, reverse('ementas:editar', args=[ementa.pk]))
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_api_igual_a_sincrona(self):
+        """Testa que os endpoints assíncronos da API respondem o mesmo que os síncronos"""
+        ementa = Ementa.objects.filter(publicado=True).first()
+        chamadas = [
+            ('ementas:api_lista', [], {'limite': 5, 'q': 'diárias'}),
+            ('ementas:api_detalhe', [ementa.pk], {}),
+            ('ementas:api_facetas', [], {'tipo_ato': 'portaria'}),
+            ('ementas:api_sugestoes', [], {'q': '1/20'}),
+        ]
+        for nome, args, params in chamadas:
+            url = reverse(nome, args=args)
+            esperado = self.client.get(url, params)
+            response = self.get_async(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), esperado.json())
+            self.assertEqual(response['ETag'], esperado['ETag'])
+            revalidada = self.get_async(url, params, headers={'If-None-Match': response['ETag']})
+            self.assertEqual(revalidada.status_code, 304)
+
+        dados = self.get_async(reverse('ementas:api_lista'), {'limite': 5}).json()
+        self.assertIsNotNone(dados['proximo'])
+        self.assertEqual(self.get_async(reverse('ementas:api_detalhe', args=[self.rascunho.pk])).status_code, 404)
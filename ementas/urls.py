@@ -1,11 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = "ementas"
 
+# Views assíncronas sob ASGI (settings.VIEWS_ASYNC)
+if settings.VIEWS_ASYNC:
+    lista, detalhe = views.ementa_list_async, views.ementa_detail_async
+    api_lista, api_detalhe = api.ementas_lista_async, api.ementas_detalhe_async
+    api_facetas, api_sugestoes = api.ementas_facetas_async, api.ementas_sugestoes_async
+else:
+    lista, detalhe = views.ementa_list, views.ementa_detail
+    api_lista, api_detalhe = api.ementas_lista, api.ementas_detalhe
+    api_facetas, api_sugestoes = api.ementas_facetas, api.ementas_sugestoes
+
 urlpatterns = [
-    path("", views.ementa_list, name="lista"),
-    path("ementa/<int:pk>/", views.ementa_detail, name="detalhe"),
+    path("", lista, name="lista"),
+    path("ementa/<int:pk>/", detalhe, name="detalhe"),
+    path("ementa/<int:pk>/arquivo/", views.ementa_arquivo, name="arquivo"),
     path("ementa/criar/", views.ementa_create, name="criar"),
+    path("ementa/exportar/", views.ementa_export, name="exportar"),
     path("ementa/<int:pk>/editar/", views.ementa_edit, name="editar"),
+    # API JSON somente leitura
+    path("api/v1/ementas/", api_lista, name="api_lista"),
+    path("api/v1/ementas/facetas/", api_facetas, name="api_facetas"),
+    path("api/v1/ementas/sugestoes/", api_sugestoes, name="api_sugestoes"),
+    path("api/v1/ementas/<int:pk>/", api_detalhe, name="api_detalhe"),
 ]
\ No newline at end of file
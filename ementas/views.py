@@ -1,18 +1,62 @@
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Left
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
-from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from core.arquivos import servir_arquivo
+from core.cache_paginas import cache_anonimo
+from core.exportacao import FORMATOS, resposta_exportacao
+from core.paginacao import apaginar, paginar
 from .models import Ementa
 from .forms import EmentaForm
+from .filtros import filtrar_ementas, ler_filtros
+from .facetas import acontar_facetas, contar_facetas
+from .fragmentos import arenderizar_linhas, renderizar_linhas
+from .exportacao import COLUNAS_EXPORTACAO, registros_ementas
 
-def ementa_list(request):
-    q = request.GET.get("q", "").strip()
-    tipo_ato = request.GET.get("tipo_ato", "")
-    situacao = request.GET.get("situacao", "")
-    data_inicio = request.GET.get("data_inicio", "")
-    data_fim = request.GET.get("data_fim", "")
+# Ordenação da listagem usada na paginação por cursor (índice ementa_listagem_idx)
+ORDENACAO_LISTA = [("data_publicacao", True), ("criado_em", True), ("id", False)]
+
+# Colunas usadas pelos cartões da listagem
+CAMPOS_LISTA = [
+    "id", "numero", "titulo", "tipo_ato_normativo", "situacao", "sigiloso",
+    "data_publicacao", "criado_em", "atualizado_em",
+]
+
+# Tags do cache das páginas anônimas (core.cache_paginas)
+def tags_lista(request):
+    return ["ementas", "ementas:lista"]
+
+def tags_detalhe(request, pk):
+    return ["ementas", f"ementa:{pk}"]
+
+def tags_ao_alterar(ementa):
+    return ["ementas:lista", f"ementa:{ementa.pk}"]
+
+def projetar_listagem(qs, user, user_can_edit):
+    """
+    Carrega só o necessário para a listagem: trechos já truncados no banco
+    e o flag pode_editar, sem consultar o autor de cada ementa.
+    """
+    if user_can_edit:
+        pode_editar = Value(True)
+    elif user.is_authenticated:
+        pode_editar = ExpressionWrapper(Q(criado_por_id=user.pk), output_field=BooleanField())
+    else:
+        pode_editar = Value(False)
+
+    # Um caractere a mais para o truncatechars do template indicar o corte
+    return qs.only(*CAMPOS_LISTA).annotate(
+        trecho_ementa=Left("ementa", 201),
+        trecho_resumo=Left("resumo", 161),
+        resumo_repetido=ExpressionWrapper(Q(resumo=F("ementa")), output_field=BooleanField()),
+        pode_editar=pode_editar,
+    )
+
+def ler_itens_por_pagina(request):
     itens_por_pagina = request.GET.get("itens_por_pagina", "10")
     
     try:
@@ -21,79 +65,130 @@ def ementa_list(request):
             itens_por_pagina = 10
     except ValueError:
         itens_por_pagina = 10
-    
-    # Base queryset - apenas ementas publicadas
-    qs = Ementa.objects.filter(publicado=True)
-    
-    if q:
-        qs = qs.filter(
-            Q(titulo__icontains=q) |
-            Q(numero__icontains=q) |
-            Q(resumo__icontains=q) |
-            Q(ementa__icontains=q)
-        )
-    
-    if tipo_ato:
-        qs = qs.filter(tipo_ato_normativo=tipo_ato)
-    
-    if situacao:
-        qs = qs.filter(situacao=situacao)
-    
-    # Filtros de data
-    if data_inicio:
-        try:
-            data_inicio_parsed = parse_date(data_inicio)
-            if data_inicio_parsed:
-                qs = qs.filter(data_publicacao__gte=data_inicio_parsed)
-        except (ValueError, TypeError):
-            pass
-    
-    if data_fim:
-        try:
-            data_fim_parsed = parse_date(data_fim)
-            if data_fim_parsed:
-                qs = qs.filter(data_publicacao__lte=data_fim_parsed)
-        except (ValueError, TypeError):
-            pass
-    
-    paginator = Paginator(qs, itens_por_pagina)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
+    return itens_por_pagina
+
+def _consulta_lista(request, filtros):
+    # Apenas ementas publicadas, com os filtros e a busca (ementas.filtros)
+    qs = filtrar_ementas(filtros)
+    qs = projetar_listagem(qs, request.user, request.permissoes.pode_editar)
+    # Sem busca, páginas profundas seguem por cursor na ordenação da listagem
+    return qs, None if filtros["q"] else ORDENACAO_LISTA
+
+def _contexto_lista(request, filtros, itens_por_pagina, page_obj, facetas):
+    return {
         "page_obj": page_obj,
-        "q": q,
-        "tipo_ato": tipo_ato,
-        "situacao": situacao,
-        "data_inicio": data_inicio,
-        "data_fim": data_fim,
+        **filtros,
         "itens_por_pagina": itens_por_pagina,
         "tipos_ato": Ementa.TIPO_ATO_CHOICES,
         "situacoes": Ementa.SITUACAO_CHOICES,
+        "facetas": facetas,
         "opcoes_paginacao": [10, 50, 100],
-        "user_can_edit": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_edit,
-        "user_can_publish": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_publish,
+        "user_can_edit": request.permissoes.pode_editar,
+        "user_can_publish": request.permissoes.pode_publicar,
+        "user_can_export": request.permissoes.pode_exportar,
     }
+
+@cache_anonimo(tags_lista)
+def ementa_list(request):
+    filtros = ler_filtros(request.GET)
+    itens_por_pagina = ler_itens_por_pagina(request)
+    
+    qs, ordenacao = _consulta_lista(request, filtros)
+    page_obj = paginar(request, qs, itens_por_pagina, ordenacao=ordenacao)
+    # HTML das linhas em cache (ementas.fragmentos), buscado de uma vez
+    page_obj.object_list = renderizar_linhas(page_obj.object_list)
+    
+    context = _contexto_lista(request, filtros, itens_por_pagina, page_obj, contar_facetas(filtros))
     return render(request, "ementas/lista.html", context)
 
-def ementa_detail(request, pk):
-    ementa = get_object_or_404(Ementa, pk=pk)
+@cache_anonimo(tags_lista)
+async def ementa_list_async(request):
+    """``ementa_list`` para ASGI: banco e cache acessados de forma assíncrona"""
+    filtros = ler_filtros(request.GET)
+    itens_por_pagina = ler_itens_por_pagina(request)
+    
+    qs, ordenacao = _consulta_lista(request, filtros)
+    page_obj = await apaginar(request, qs, itens_por_pagina, ordenacao=ordenacao)
+    page_obj.object_list = await arenderizar_linhas(page_obj.object_list)
+    
+    context = _contexto_lista(request, filtros, itens_por_pagina, page_obj, await acontar_facetas(filtros))
+    return render(request, "ementas/lista.html", context)
+
+@login_required
+def ementa_export(request):
+    """Exporta a listagem filtrada de ementas (CSV, NDJSON ou XLSX)"""
+    if not request.permissoes.pode_exportar:
+        messages.error(request, 'Você não tem permissão para exportar ementas.')
+        return redirect('ementas:lista')
+    
+    formato = request.GET.get("formato", "csv")
+    if formato not in FORMATOS:
+        messages.error(request, 'Formato de exportação inválido.')
+        return redirect('ementas:lista')
     
+    qs = filtrar_ementas(ler_filtros(request.GET))
+    return resposta_exportacao("ementas", formato, COLUNAS_EXPORTACAO, registros_ementas(qs))
+
+def _resposta_detalhe(request, ementa):
     # Verifica se a ementa está publicada
     if not ementa.publicado and not (request.user.is_authenticated and request.user.is_staff):
-        return render(request, "404.html", status=404)
+        raise Http404("Ementa não encontrada.")
     
     context = {
         "ementa": ementa,
-        "user_can_edit": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_edit,
-        "user_can_publish": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_publish,
+        "user_can_edit": request.permissoes.pode_editar,
+        "user_can_publish": request.permissoes.pode_publicar,
     }
     return render(request, "ementas/detalhe.html", context)
 
+@cache_anonimo(tags_detalhe)
+def ementa_detail(request, pk):
+    return _resposta_detalhe(request, get_object_or_404(Ementa, pk=pk))
+
+@cache_anonimo(tags_detalhe)
+async def ementa_detail_async(request, pk):
+    """``ementa_detail`` para ASGI"""
+    try:
+        ementa = await Ementa.objects.aget(pk=pk)
+    except Ementa.DoesNotExist:
+        raise Http404("Ementa não encontrada.")
+    return _resposta_detalhe(request, ementa)
+
+def ementa_arquivo(request, pk):
+    """Entrega o PDF da ementa, respeitando publicação e sigilo"""
+    ementa = get_object_or_404(
+        Ementa.objects.only("id", "publicado", "sigiloso", "arquivo"), pk=pk
+    )
+    if not ementa.arquivo:
+        raise Http404("Ementa sem PDF anexado.")
+    
+    # Mesmas regras da página de detalhe: não publicadas só para a equipe
+    if not ementa.publicado and not request.permissoes.staff:
+        raise Http404("Ementa não encontrada.")
+    if ementa.sigiloso and not request.permissoes.staff:
+        raise PermissionDenied("Ementa sigilosa.")
+    
+    # Com ?v=<sha256> a URL identifica o conteúdo, mas o acesso pode mudar
+    # (publicação e sigilo): cache curto e só no navegador, nunca imutável
+    versao = ementa.versao_arquivo
+    versionado = versao is not None and request.GET.get("v") == versao
+    try:
+        return servir_arquivo(
+            request,
+            ementa.arquivo.storage,
+            ementa.arquivo.name,
+            content_type="application/pdf",
+            privado=ementa.sigiloso or not ementa.publicado,
+            etag=versao,
+            max_age=getattr(settings, "ARQUIVOS_MAX_AGE", 300) if versionado else None,
+        )
+    except FileNotFoundError:
+        raise Http404("Arquivo não encontrado.")
+
 @login_required
 def ementa_create(request):
     """View para criar nova ementa"""
-    if not hasattr(request.user, 'perfil') or not request.user.perfil.can_publish:
+    if not request.permissoes.pode_publicar:
         messages.error(request, 'Você não tem permissão para criar ementas.')
         return redirect('ementas:lista')
     
@@ -121,14 +216,12 @@ def ementa_edit(request, pk):
     ementa = get_object_or_404(Ementa, pk=pk)
     
     # Verifica permissões
-    if not hasattr(request.user, 'perfil'):
+    if not request.permissoes.tem_perfil:
         messages.error(request, 'Perfil não encontrado.')
         return redirect('ementas:lista')
     
-    perfil = request.user.perfil
-    
     # Apenas criador ou usuários com permissão de edição podem editar
-    if not (perfil.can_edit or ementa.criado_por == request.user):
+    if not (request.permissoes.pode_editar or ementa.criado_por_id == request.user.pk):
         messages.error(request, 'Você não tem permissão para editar esta ementa.')
         return redirect('ementas:detalhe', pk=ementa.pk)
     
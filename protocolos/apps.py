@@ -5,3 +5,7 @@ class ProtocolosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'protocolos'
     verbose_name = 'Protocolos'
+
+    def ready(self):
+        from core.contagem import invalidar_ao_alterar
+        invalidar_ao_alterar(self.get_model('Protocolo'))
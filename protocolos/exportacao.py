@@ -0,0 +1,26 @@
+"""
+Colunas e registros da exportação de protocolos (core.exportacao).
+"""
+from core.exportacao import TAMANHO_LOTE
+
+COLUNAS_EXPORTACAO = [
+    ("id", "ID"),
+    ("numero", "Número de Protocolo"),
+    ("data_emissao", "Data de Emissão"),
+    ("cpf_cnpj", "CPF/CNPJ"),
+    ("tipo", "Tipo"),
+    ("local_armazenamento", "Local de Armazenamento"),
+    ("caixa", "Caixa"),
+    ("fileira", "Fileira"),
+    ("face", "Face"),
+    ("observacoes", "Observações"),
+    ("protocolo_sitac", "Protocolo SITAC"),
+    ("criado_em", "Criado em"),
+    ("atualizado_em", "Atualizado em"),
+]
+
+
+def registros_protocolos(qs, tamanho_lote=TAMANHO_LOTE):
+    """Percorre o queryset com cursor no servidor"""
+    campos = [chave for chave, _ in COLUNAS_EXPORTACAO]
+    return qs.values(*campos).iterator(chunk_size=tamanho_lote)
@@ -0,0 +1,109 @@
+"""
+Filtros da listagem de protocolos, compartilhados pela página HTML e pela exportação.
+"""
+import re
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .models import Protocolo, somente_digitos
+
+# Termos só com dígitos (e a pontuação de CPF/CNPJ) vão para a busca indexada do documento
+DOCUMENTO_RE = re.compile(r"^[\d.\-/\s]+$")
+MINIMO_DIGITOS = 3
+DIGITOS_DOCUMENTO = (11, 14)
+
+
+def _data(valor):
+    try:
+        return parse_date(valor) if valor else None
+    except (ValueError, TypeError):
+        return None
+
+
+def documento_da_busca(q):
+    """Dígitos do termo quando ele parece um CPF/CNPJ (completo ou início), senão None"""
+    if not DOCUMENTO_RE.match(q):
+        return None
+    digitos = somente_digitos(q)
+    if len(digitos) < MINIMO_DIGITOS or len(digitos) > max(DIGITOS_DOCUMENTO):
+        return None
+    return digitos
+
+
+def buscar(qs, q):
+    """
+    Busca textual da listagem.
+
+    Termos numéricos usam o índice de ``cpf_cnpj_digitos`` (igualdade para o
+    documento completo, prefixo para o início) e o índice trigrama do número
+    do protocolo (``contains``: dígitos não têm caixa, dispensando o
+    ``UPPER`` do ``icontains``); os demais, ``icontains`` nos campos de texto.
+    """
+    documento = documento_da_busca(q)
+    if documento is None:
+        return qs.filter(
+            Q(numero__icontains=q) |
+            Q(local_armazenamento__icontains=q) |
+            Q(observacoes__icontains=q)
+        )
+    if len(documento) in DIGITOS_DOCUMENTO:
+        condicao = Q(cpf_cnpj_digitos=documento)
+    else:
+        condicao = Q(cpf_cnpj_digitos__startswith=documento)
+    return qs.filter(condicao | Q(numero__contains=q))
+
+
+def _inteiro(valor):
+    try:
+        return int(valor) if valor else None
+    except (ValueError, TypeError):
+        return None
+
+
+def ler_filtros(params):
+    """Lê os filtros da querystring (valores brutos, como vieram)"""
+    return {
+        "q": params.get("q", "").strip(),
+        "tipo": params.get("tipo", ""),
+        "data_inicio": params.get("data_inicio", ""),
+        "data_fim": params.get("data_fim", ""),
+        "caixa": params.get("caixa", "").strip(),
+        "fileira": params.get("fileira", "").strip(),
+        "face": params.get("face", "").strip(),
+    }
+
+
+def filtrar_protocolos(filtros, qs=None):
+    """Aplica os filtros aos protocolos"""
+    if qs is None:
+        qs = Protocolo.objects.all()
+
+    if filtros["q"]:
+        qs = buscar(qs, filtros["q"])
+
+    if filtros["tipo"]:
+        qs = qs.filter(tipo=filtros["tipo"])
+
+    # Filtros de data
+    data_inicio = _data(filtros["data_inicio"])
+    if data_inicio:
+        qs = qs.filter(data_emissao__gte=data_inicio)
+
+    data_fim = _data(filtros["data_fim"])
+    if data_fim:
+        qs = qs.filter(data_emissao__lte=data_fim)
+
+    # Localização no arquivo físico (igualdade nos campos indexados)
+    caixa = _inteiro(filtros.get("caixa"))
+    if caixa is not None:
+        qs = qs.filter(caixa=caixa)
+
+    fileira = _inteiro(filtros.get("fileira"))
+    if fileira is not None:
+        qs = qs.filter(fileira=fileira)
+
+    if filtros.get("face"):
+        qs = qs.filter(face=filtros["face"].upper())
+
+    return qs
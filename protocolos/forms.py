@@ -1,5 +1,6 @@
 from django import forms
 from .models import Protocolo
+from .importacao import ErroImportacao, formato_do_arquivo
 import re
 
 class ProtocoloForm(forms.ModelForm):
@@ -83,3 +84,28 @@ class ProtocoloForm(forms.ModelForm):
                 cleaned_data['tipo'] = 'empresa'
         
         return cleaned_data
+
+
+class ImportacaoForm(forms.Form):
+    arquivo = forms.FileField(
+        label='Planilha',
+        help_text='Arquivo .csv ou .xlsx com as colunas Número, CPF/CNPJ e Local de Armazenamento',
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xlsx',
+        }),
+    )
+    simular = forms.BooleanField(
+        label='Apenas validar (não grava os protocolos)',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+
+    def clean_arquivo(self):
+        """Aceita apenas CSV e XLSX"""
+        arquivo = self.cleaned_data['arquivo']
+        try:
+            formato_do_arquivo(arquivo.name)
+        except ErroImportacao as exc:
+            raise forms.ValidationError(str(exc))
+        return arquivo
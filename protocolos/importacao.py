@@ -0,0 +1,458 @@
+"""
+Importação de protocolos em lote a partir de planilhas (CSV ou XLSX).
+
+O arquivo é lido em streaming (linha a linha no CSV; ``iterparse`` da
+planilha dentro do ZIP no XLSX) e processado em lotes de ``TAMANHO_LOTE``
+linhas. Em cada lote:
+
+- os CPF/CNPJ ficam só com os dígitos e o tipo sai da quantidade de
+  dígitos, como em ``Protocolo.clean()``;
+- os números repetidos na própria planilha são detectados em memória e os já
+  cadastrados com uma única consulta ``numero__in``;
+- as linhas válidas são gravadas com ``bulk_create`` em uma transação.
+
+As linhas rejeitadas vão para o relatório de erros (CSV com linha, número e
+motivo). O ``bulk_create`` não dispara sinais, então a versão das contagens é
+invalidada ao final.
+"""
+import csv
+import os
+import posixpath
+import re
+import unicodedata
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from xml.etree import ElementTree
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.contagem import invalidar
+from core.exportacao import gerar_csv
+
+from .models import Protocolo, interpretar_local
+
+TAMANHO_LOTE = 1000
+
+FORMATOS_IMPORTACAO = ("csv", "xlsx")
+
+# Cabeçalhos aceitos (normalizados) para cada campo; os títulos da exportação também valem
+CABECALHOS = {
+    "numero": "numero",
+    "numero_de_protocolo": "numero",
+    "protocolo": "numero",
+    "cpf_cnpj": "cpf_cnpj",
+    "cpf": "cpf_cnpj",
+    "cnpj": "cpf_cnpj",
+    "local_armazenamento": "local_armazenamento",
+    "local_de_armazenamento": "local_armazenamento",
+    "local": "local_armazenamento",
+    "observacoes": "observacoes",
+    "protocolo_sitac": "protocolo_sitac",
+}
+OBRIGATORIOS = ("numero", "cpf_cnpj", "local_armazenamento")
+
+TIPO_POR_DIGITOS = {11: "profissional", 14: "empresa"}
+
+NAO_DIGITOS = re.compile(r"[^0-9]")
+
+COLUNAS_RELATORIO = [
+    ("linha", "Linha"),
+    ("numero", "Número de Protocolo"),
+    ("erro", "Erro"),
+]
+
+DIRETORIO_RELATORIOS = "importacoes"
+RELATORIO_RE = re.compile(r"^[0-9a-f]{32}$")
+VALIDADE_RELATORIOS = timedelta(days=7)
+
+NS_PLANILHA = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_RELACOES = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+NS_DOCUMENTO = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+REFERENCIA_RE = re.compile(r"^([A-Z]+)")
+
+
+class ErroImportacao(Exception):
+    """Arquivo que não pode ser importado (formato ou cabeçalho inválido)"""
+
+
+@dataclass
+class ResultadoImportacao:
+    lidas: int = 0
+    importadas: int = 0
+    erros: list = field(default_factory=list)
+    simulacao: bool = False
+
+    @property
+    def rejeitadas(self):
+        return len(self.erros)
+
+    def rejeitar(self, linha, numero, erro):
+        self.erros.append((linha, numero, erro))
+
+
+def formato_do_arquivo(nome):
+    extensao = os.path.splitext(nome or "")[1].lower().lstrip(".")
+    if extensao not in FORMATOS_IMPORTACAO:
+        raise ErroImportacao("Envie um arquivo .csv ou .xlsx.")
+    return extensao
+
+
+def _normalizar_cabecalho(valor):
+    texto = unicodedata.normalize("NFKD", str(valor or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_")
+
+
+# Leitura do CSV
+
+def _decodificar(linhas):
+    """Decodifica as linhas em UTF-8, com Windows-1252 para planilhas antigas do Excel"""
+    primeira = True
+    for linha in linhas:
+        try:
+            texto = linha.decode("utf-8")
+        except UnicodeDecodeError:
+            texto = linha.decode("cp1252", errors="replace")
+        if primeira:
+            texto = texto.removeprefix("\ufeff")
+            primeira = False
+        yield texto
+
+
+def linhas_csv(arquivo):
+    """Linhas (listas de textos) do CSV; aceita ``,`` ou ``;`` como separador"""
+    linhas = _decodificar(iter(arquivo))
+    cabecalho = next(linhas, "")
+    separador = ";" if cabecalho.count(";") > cabecalho.count(",") else ","
+
+    def todas():
+        yield cabecalho
+        yield from linhas
+
+    yield from csv.reader(todas(), delimiter=separador)
+
+
+# Leitura do XLSX
+
+def _textos_compartilhados(pacote):
+    if "xl/sharedStrings.xml" not in pacote.namelist():
+        return []
+    textos = []
+    with pacote.open("xl/sharedStrings.xml") as conteudo:
+        for _, elemento in ElementTree.iterparse(conteudo):
+            if elemento.tag == NS_PLANILHA + "si":
+                textos.append("".join(t.text or "" for t in elemento.iter(NS_PLANILHA + "t")))
+                elemento.clear()
+    return textos
+
+
+def _primeira_planilha(pacote):
+    """Caminho da primeira planilha do livro (pelas relações do workbook)"""
+    try:
+        livro = ElementTree.fromstring(pacote.read("xl/workbook.xml"))
+        relacoes = ElementTree.fromstring(pacote.read("xl/_rels/workbook.xml.rels"))
+        planilha = livro.find(f"{NS_PLANILHA}sheets/{NS_PLANILHA}sheet")
+        id_relacao = planilha.get(NS_DOCUMENTO + "id")
+        for relacao in relacoes.iter(NS_RELACOES + "Relationship"):
+            if relacao.get("Id") == id_relacao:
+                alvo = relacao.get("Target")
+                if alvo.startswith("/"):
+                    return alvo.lstrip("/")
+                return posixpath.normpath(posixpath.join("xl", alvo))
+    except (KeyError, AttributeError, ElementTree.ParseError):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+
+def _indice_coluna(referencia):
+    letras = REFERENCIA_RE.match(referencia or "")
+    if not letras:
+        return None
+    indice = 0
+    for letra in letras.group(1):
+        indice = indice * 26 + ord(letra) - ord("A") + 1
+    return indice - 1
+
+
+def _numero(texto):
+    """Números inteiros sem ``.0`` nem notação científica (ex.: CPF digitado como número)"""
+    try:
+        valor = Decimal(texto)
+    except InvalidOperation:
+        return texto
+    if valor == valor.to_integral_value():
+        return str(int(valor))
+    return texto
+
+
+def _valor_celula(celula, compartilhados):
+    tipo = celula.get("t")
+    if tipo == "inlineStr":
+        return "".join(t.text or "" for t in celula.iter(NS_PLANILHA + "t"))
+    valor = celula.find(NS_PLANILHA + "v")
+    texto = valor.text if valor is not None and valor.text else ""
+    if tipo == "s":
+        try:
+            return compartilhados[int(texto)]
+        except (ValueError, IndexError):
+            return ""
+    if tipo in (None, "n") and texto:
+        return _numero(texto)
+    return texto
+
+
+def linhas_xlsx(arquivo):
+    """Linhas (listas de textos) da primeira planilha do XLSX"""
+    try:
+        pacote = zipfile.ZipFile(arquivo)
+    except zipfile.BadZipFile:
+        raise ErroImportacao("O arquivo não é uma planilha XLSX válida.")
+
+    with pacote:
+        compartilhados = _textos_compartilhados(pacote)
+        try:
+            conteudo = pacote.open(_primeira_planilha(pacote))
+        except KeyError:
+            raise ErroImportacao("A planilha XLSX não tem dados.")
+
+        with conteudo:
+            dados = None
+            for evento, elemento in ElementTree.iterparse(conteudo, events=("start", "end")):
+                if evento == "start":
+                    if elemento.tag == NS_PLANILHA + "sheetData":
+                        dados = elemento
+                    continue
+                if elemento.tag != NS_PLANILHA + "row":
+                    continue
+                celulas = {}
+                for posicao, celula in enumerate(elemento.iter(NS_PLANILHA + "c")):
+                    indice = _indice_coluna(celula.get("r"))
+                    celulas[posicao if indice is None else indice] = _valor_celula(celula, compartilhados)
+                yield [celulas.get(indice, "") for indice in range(max(celulas) + 1)] if celulas else []
+                # Libera as linhas já processadas
+                if dados is not None:
+                    dados.clear()
+
+
+LEITORES = {
+    "csv": linhas_csv,
+    "xlsx": linhas_xlsx,
+}
+
+
+# Processamento
+
+def registros(linhas):
+    """
+    Associa as linhas ao cabeçalho e gera ``(número da linha, dados)``.
+
+    Linhas vazias são ignoradas; colunas desconhecidas (ex.: ``id`` e ``tipo``
+    de uma exportação) também.
+    """
+    cabecalho = next(linhas, None)
+    if cabecalho is None:
+        raise ErroImportacao("O arquivo está vazio.")
+
+    campos = [CABECALHOS.get(_normalizar_cabecalho(titulo)) for titulo in cabecalho]
+    faltando = [campo for campo in OBRIGATORIOS if campo not in campos]
+    if faltando:
+        nomes = {"numero": "Número", "cpf_cnpj": "CPF/CNPJ", "local_armazenamento": "Local de Armazenamento"}
+        raise ErroImportacao(
+            "Colunas obrigatórias ausentes: " + ", ".join(nomes[campo] for campo in faltando) + "."
+        )
+
+    for numero_linha, linha in enumerate(linhas, start=2):
+        if not any(str(valor).strip() for valor in linha):
+            continue
+        dados = dict.fromkeys(CABECALHOS.values(), "")
+        for campo, valor in zip(campos, linha):
+            if campo and not dados[campo]:
+                dados[campo] = str(valor).strip()
+        yield numero_linha, dados
+
+
+def em_lotes(itens, tamanho):
+    lote = []
+    for item in itens:
+        lote.append(item)
+        if len(lote) >= tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def normalizar_documentos(valores):
+    """Somente os dígitos de cada CPF/CNPJ"""
+    return [NAO_DIGITOS.sub("", valor) for valor in valores]
+
+
+def _limites():
+    return {
+        nome: Protocolo._meta.get_field(nome).max_length
+        for nome in ("numero", "local_armazenamento", "protocolo_sitac")
+    }
+
+
+def _validar_lote(lote, resultado, vistos, limites):
+    """Linhas válidas do lote como ``(linha, dados)``, já com ``cpf_cnpj`` e ``tipo`` normalizados"""
+    documentos = normalizar_documentos([dados["cpf_cnpj"] for _, dados in lote])
+    validas = []
+    for (linha, dados), documento in zip(lote, documentos):
+        numero = dados["numero"]
+        if not numero:
+            resultado.rejeitar(linha, numero, "Número de protocolo não informado.")
+            continue
+        tipo = TIPO_POR_DIGITOS.get(len(documento))
+        if tipo is None:
+            resultado.rejeitar(linha, numero, "CPF deve ter 11 dígitos ou CNPJ deve ter 14 dígitos.")
+            continue
+        if not dados["local_armazenamento"]:
+            resultado.rejeitar(linha, numero, "Local de armazenamento não informado.")
+            continue
+        excedido = next((campo for campo, limite in limites.items() if len(dados[campo]) > limite), None)
+        if excedido:
+            resultado.rejeitar(
+                linha, numero,
+                f"{Protocolo._meta.get_field(excedido).verbose_name} com mais de {limites[excedido]} caracteres.",
+            )
+            continue
+        if numero in vistos:
+            resultado.rejeitar(linha, numero, "Número de protocolo repetido na planilha.")
+            continue
+        vistos.add(numero)
+        validas.append((linha, dict(dados, cpf_cnpj=documento, tipo=tipo)))
+    return validas
+
+
+def _separar_existentes(validas, resultado):
+    """Remove (e rejeita) as linhas cujo número já está cadastrado: uma consulta por lote"""
+    existentes = set(
+        Protocolo.objects.filter(numero__in=[dados["numero"] for _, dados in validas])
+        .values_list("numero", flat=True)
+    )
+    novas = []
+    for linha, dados in validas:
+        if dados["numero"] in existentes:
+            resultado.rejeitar(linha, dados["numero"], "Número de protocolo já cadastrado.")
+        else:
+            novas.append((linha, dados))
+    return novas
+
+
+def _protocolo(dados, usuario):
+    """Protocolo pronto para o bulk_create, com os campos que o save calcularia"""
+    caixa, fileira, face = interpretar_local(dados["local_armazenamento"])
+    return Protocolo(
+        numero=dados["numero"],
+        cpf_cnpj=dados["cpf_cnpj"],
+        cpf_cnpj_digitos=dados["cpf_cnpj"],
+        tipo=dados["tipo"],
+        local_armazenamento=dados["local_armazenamento"],
+        observacoes=dados["observacoes"],
+        caixa=caixa,
+        fileira=fileira,
+        face=face,
+        protocolo_sitac=dados["protocolo_sitac"] or None,
+        criado_por=usuario,
+    )
+
+
+def _gravar(novas, usuario):
+    objetos = [_protocolo(dados, usuario) for _, dados in novas]
+    with transaction.atomic():
+        Protocolo.objects.bulk_create(objetos)
+    return len(objetos)
+
+
+def _gravar_linha_a_linha(novas, usuario, resultado):
+    """Grava cada linha em um savepoint, rejeitando as que conflitarem"""
+    importadas = 0
+    for linha, dados in novas:
+        try:
+            with transaction.atomic():
+                Protocolo.objects.bulk_create([_protocolo(dados, usuario)])
+        except IntegrityError:
+            resultado.rejeitar(linha, dados["numero"], "Número de protocolo já cadastrado.")
+        else:
+            importadas += 1
+    return importadas
+
+
+def importar_protocolos(arquivo, formato, usuario=None, simular=False, tamanho_lote=TAMANHO_LOTE):
+    """
+    Importa os protocolos do arquivo (aberto em modo binário).
+
+    Com ``simular`` valida tudo (inclusive os números já cadastrados) sem
+    gravar. Levanta ``ErroImportacao`` se o arquivo todo for inválido.
+    """
+    if formato not in LEITORES:
+        raise ErroImportacao("Formato de importação inválido.")
+
+    resultado = ResultadoImportacao(simulacao=simular)
+    vistos = set()
+    limites = _limites()
+
+    for lote in em_lotes(registros(iter(LEITORES[formato](arquivo))), tamanho_lote):
+        resultado.lidas += len(lote)
+        validas = _validar_lote(lote, resultado, vistos, limites)
+        if not validas:
+            continue
+        novas = _separar_existentes(validas, resultado)
+        if not novas or simular:
+            resultado.importadas += len(novas)
+            continue
+        try:
+            resultado.importadas += _gravar(novas, usuario)
+        except IntegrityError:
+            # Números cadastrados por outra requisição durante a importação;
+            # como podem continuar chegando, o lote é regravado linha a linha
+            novas = _separar_existentes(novas, resultado)
+            resultado.importadas += _gravar_linha_a_linha(novas, usuario, resultado)
+
+    if resultado.importadas and not simular:
+        invalidar(Protocolo)
+    resultado.erros.sort(key=lambda erro: erro[0])
+    return resultado
+
+
+# Relatório de erros
+
+def linhas_relatorio(resultado):
+    for linha, numero, erro in resultado.erros:
+        yield {"linha": linha, "numero": numero, "erro": erro}
+
+
+def gerar_relatorio(resultado):
+    """Relatório de erros em CSV (partes em bytes)"""
+    return gerar_csv(COLUNAS_RELATORIO, linhas_relatorio(resultado))
+
+
+def salvar_relatorio(resultado, storage=default_storage):
+    """Grava o relatório de erros no storage e retorna o identificador para download"""
+    remover_relatorios_antigos(storage)
+    identificador = uuid.uuid4().hex
+    conteudo = b"".join(gerar_relatorio(resultado))
+    storage.save(caminho_relatorio(identificador), ContentFile(conteudo))
+    return identificador
+
+
+def caminho_relatorio(identificador):
+    if not RELATORIO_RE.match(identificador or ""):
+        raise ErroImportacao("Relatório inválido.")
+    return posixpath.join(DIRETORIO_RELATORIOS, f"{identificador}.csv")
+
+
+def remover_relatorios_antigos(storage=default_storage):
+    if not storage.exists(DIRETORIO_RELATORIOS):
+        return
+    limite = timezone.now() - VALIDADE_RELATORIOS
+    for nome in storage.listdir(DIRETORIO_RELATORIOS)[1]:
+        caminho = posixpath.join(DIRETORIO_RELATORIOS, nome)
+        if storage.get_modified_time(caminho) < limite:
+            storage.delete(caminho)
@@ -0,0 +1,52 @@
+"""
+Arquivo físico dos protocolos: totais por caixa e por posição (fileira e face).
+
+Os componentes vêm de ``local_armazenamento`` (``interpretar_local``, no save)
+e são indexados, então cada visão é uma única consulta agrupada.
+"""
+from django.conf import settings
+from django.db.models import Count, F, Max, Min, Q
+
+from .models import Protocolo
+
+
+def capacidade_caixa():
+    return getattr(settings, "PROTOCOLOS_CAPACIDADE_CAIXA", 100)
+
+
+def totais_por_caixa(qs=None, somente_cheias=False):
+    """Uma linha por caixa (``caixa`` None para locais não identificados)"""
+    if qs is None:
+        qs = Protocolo.objects.all()
+    capacidade = capacidade_caixa()
+
+    linhas = qs.order_by().values("caixa").annotate(
+        total=Count("pk"),
+        fileiras=Count("fileira", distinct=True),
+        faces=Count("face", distinct=True, filter=~Q(face="")),
+        primeira_emissao=Min("data_emissao"),
+        ultima_emissao=Max("data_emissao"),
+    )
+    if somente_cheias:
+        linhas = linhas.filter(caixa__isnull=False, total__gte=capacidade)
+    linhas = linhas.order_by(F("caixa").asc(nulls_last=True))
+
+    return [
+        dict(
+            linha,
+            ocupacao=min(100, round(100 * linha["total"] / capacidade)) if capacidade else 0,
+            cheia=linha["caixa"] is not None and linha["total"] >= capacidade,
+        )
+        for linha in linhas
+    ]
+
+
+def totais_por_posicao(caixa, qs=None):
+    """Totais por fileira e face de uma caixa"""
+    if qs is None:
+        qs = Protocolo.objects.all()
+    return list(
+        qs.filter(caixa=caixa).order_by().values("fileira", "face")
+        .annotate(total=Count("pk"))
+        .order_by(F("fileira").asc(nulls_last=True), "face")
+    )
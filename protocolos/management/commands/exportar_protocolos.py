@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from core.exportacao import FORMATOS, TAMANHO_LOTE, gravar_exportacao
+from protocolos.exportacao import COLUNAS_EXPORTACAO, registros_protocolos
+from protocolos.filtros import filtrar_protocolos, ler_filtros
+
+
+class Command(BaseCommand):
+    help = "Exporta os protocolos (com os filtros da listagem) em CSV, NDJSON ou XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--formato", choices=sorted(FORMATOS), default="csv")
+        parser.add_argument(
+            "--saida", default="-",
+            help="Arquivo de saída (padrão: saída padrão)",
+        )
+        parser.add_argument("--lote", type=int, default=TAMANHO_LOTE,
+                            help=f"Registros lidos do banco por vez (padrão: {TAMANHO_LOTE})")
+        parser.add_argument("--q", default="", help="Termo de busca")
+        parser.add_argument("--tipo", default="")
+        parser.add_argument("--data-inicio", default="", help="AAAA-MM-DD")
+        parser.add_argument("--data-fim", default="", help="AAAA-MM-DD")
+        parser.add_argument("--caixa", default="")
+        parser.add_argument("--fileira", default="")
+        parser.add_argument("--face", default="")
+
+    def handle(self, *args, **options):
+        filtros = ler_filtros({
+            "q": options["q"],
+            "tipo": options["tipo"],
+            "data_inicio": options["data_inicio"],
+            "data_fim": options["data_fim"],
+            "caixa": options["caixa"],
+            "fileira": options["fileira"],
+            "face": options["face"],
+        })
+        registros = registros_protocolos(filtrar_protocolos(filtros), options["lote"])
+
+        if options["saida"] == "-":
+            gravar_exportacao(sys.stdout.buffer, options["formato"], COLUNAS_EXPORTACAO, registros)
+            return
+        with open(options["saida"], "wb") as saida:
+            total = gravar_exportacao(saida, options["formato"], COLUNAS_EXPORTACAO, registros)
+        self.stderr.write(f"Exportação gravada em {options['saida']} ({total} bytes).")
@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exportacao import gravar_exportacao
+from protocolos.importacao import (
+    COLUNAS_RELATORIO, FORMATOS_IMPORTACAO, TAMANHO_LOTE, ErroImportacao,
+    formato_do_arquivo, importar_protocolos, linhas_relatorio,
+)
+
+
+class Command(BaseCommand):
+    help = "Importa protocolos em lote a partir de uma planilha CSV ou XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Planilha .csv ou .xlsx")
+        parser.add_argument(
+            "--formato", choices=FORMATOS_IMPORTACAO,
+            help="Formato do arquivo (padrão: pela extensão)",
+        )
+        parser.add_argument(
+            "--relatorio",
+            help="Grava as linhas rejeitadas neste arquivo CSV",
+        )
+        parser.add_argument("--usuario", help="Username registrado como criador dos protocolos")
+        parser.add_argument("--lote", type=int, default=TAMANHO_LOTE,
+                            help=f"Linhas processadas por transação (padrão: {TAMANHO_LOTE})")
+        parser.add_argument(
+            "--simular", action="store_true",
+            help="Apenas valida a planilha, sem gravar",
+        )
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("Valor inválido para --lote.")
+
+        usuario = None
+        if options["usuario"]:
+            try:
+                usuario = get_user_model().objects.get(username=options["usuario"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Usuário não encontrado: {options['usuario']}")
+
+        try:
+            formato = options["formato"] or formato_do_arquivo(options["arquivo"])
+            with open(options["arquivo"], "rb") as arquivo:
+                resultado = importar_protocolos(
+                    arquivo, formato, usuario=usuario,
+                    simular=options["simular"], tamanho_lote=options["lote"],
+                )
+        except (ErroImportacao, OSError) as exc:
+            raise CommandError(str(exc))
+
+        if resultado.erros:
+            if options["relatorio"]:
+                with open(options["relatorio"], "wb") as saida:
+                    gravar_exportacao(saida, "csv", COLUNAS_RELATORIO, linhas_relatorio(resultado))
+                self.stderr.write(f"Relatório de erros gravado em {options['relatorio']}.")
+            else:
+                for linha, numero, erro in resultado.erros:
+                    self.stderr.write(f"Linha {linha} ({numero or '-'}): {erro}")
+
+        verbo = "válida(s)" if resultado.simulacao else "importada(s)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.lidas} linha(s) lida(s), {resultado.importadas} {verbo}, "
+            f"{resultado.rejeitadas} rejeitada(s)."
+        ))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from core.contagem import invalidar
+from protocolos.models import Protocolo, interpretar_local
+
+
+class Command(BaseCommand):
+    help = "Preenche caixa, fileira e face dos protocolos a partir do local de armazenamento"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=2000,
+                            help="Protocolos atualizados por transação (padrão: 2000)")
+        parser.add_argument(
+            "--todos", action="store_true",
+            help="Reprocessa todos os protocolos, não só os sem caixa identificada",
+        )
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("Valor inválido para --lote.")
+
+        qs = Protocolo.objects.all()
+        if not options["todos"]:
+            qs = qs.filter(Q(caixa__isnull=True) | Q(fileira__isnull=True) | Q(face=""))
+
+        ultimo_id = 0
+        lidos = atualizados = 0
+        while True:
+            lote = list(
+                qs.filter(id__gt=ultimo_id).order_by("id")
+                .only("id", "local_armazenamento", "caixa", "fileira", "face")[:options["lote"]]
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+            lidos += len(lote)
+
+            alterados = []
+            for protocolo in lote:
+                componentes = interpretar_local(protocolo.local_armazenamento)
+                if componentes != (protocolo.caixa, protocolo.fileira, protocolo.face):
+                    protocolo.caixa, protocolo.fileira, protocolo.face = componentes
+                    alterados.append(protocolo)
+            if alterados:
+                with transaction.atomic():
+                    Protocolo.objects.bulk_update(alterados, ["caixa", "fileira", "face"])
+                atualizados += len(alterados)
+
+        if atualizados:
+            invalidar(Protocolo)
+        self.stdout.write(self.style.SUCCESS(
+            f"{lidos} protocolo(s) verificado(s), {atualizados} atualizado(s)."
+        ))
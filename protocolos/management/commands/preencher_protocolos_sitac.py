@@ -0,0 +1,32 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+
+from protocolos.sitac import TAMANHO_LOTE, ErroSitac, preencher_protocolos_sitac
+
+
+class Command(BaseCommand):
+    help = "Consulta o SITAC e preenche o Protocolo SITAC dos protocolos pendentes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=TAMANHO_LOTE,
+                            help=f"Protocolos consultados por lote (padrão: {TAMANHO_LOTE})")
+        parser.add_argument("--limite", type=int, help="Máximo de protocolos consultados nesta execução")
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("Valor inválido para --lote.")
+
+        try:
+            # async_to_sync mantém as consultas ao banco na thread (e conexão) do comando
+            resultado = async_to_sync(preencher_protocolos_sitac)(
+                tamanho_lote=options["lote"], limite=options["limite"],
+            )
+        except ErroSitac as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado.consultados} protocolo(s) consultado(s): {resultado.preenchidos} preenchido(s), "
+            f"{resultado.nao_encontrados} não encontrado(s) no SITAC, {resultado.falhas} falha(s)."
+        ))
+        if resultado.interrompido:
+            self.stderr.write("Consultas interrompidas: o SITAC falhou seguidamente (disjuntor aberto).")
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:46
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('protocolos', '0003_remove_protocolo_ativo_protocolo_protocolo_sitac'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='protocolo',
+            index=models.Index(models.OrderBy(models.F('data_emissao'), descending=True), models.OrderBy(models.F('criado_em'), descending=True), models.F('id'), name='protocolo_listagem_idx'),
+        ),
+    ]
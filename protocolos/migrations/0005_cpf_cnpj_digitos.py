@@ -0,0 +1,47 @@
+import re
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models, transaction
+
+TAMANHO_LOTE = 2000
+
+
+def normalizar_documentos(apps, schema_editor):
+    """Preenche cpf_cnpj_digitos em lotes, cada um em sua transação"""
+    Protocolo = apps.get_model('protocolos', 'Protocolo')
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Protocolo.objects.filter(id__gt=ultimo_id).order_by('id')
+            .only('id', 'cpf_cnpj')[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+        for protocolo in lote:
+            protocolo.cpf_cnpj_digitos = re.sub(r'[^\d]', '', protocolo.cpf_cnpj or '')
+        with transaction.atomic():
+            Protocolo.objects.bulk_update(lote, ['cpf_cnpj_digitos'])
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('protocolos', '0004_indice_listagem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protocolo',
+            name='cpf_cnpj_digitos',
+            field=models.CharField(blank=True, editable=False, max_length=14, verbose_name='CPF/CNPJ (somente dígitos)'),
+        ),
+        migrations.RunPython(normalizar_documentos, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='protocolo',
+            index=models.Index(fields=['cpf_cnpj_digitos'], name='protocolo_cpf_cnpj_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
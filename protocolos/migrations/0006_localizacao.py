@@ -0,0 +1,42 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('protocolos', '0005_cpf_cnpj_digitos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protocolo',
+            name='caixa',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Caixa'),
+        ),
+        migrations.AddField(
+            model_name='protocolo',
+            name='fileira',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Fileira'),
+        ),
+        migrations.AddField(
+            model_name='protocolo',
+            name='face',
+            field=models.CharField(blank=True, editable=False, max_length=10, verbose_name='Face'),
+        ),
+        AddIndexConcurrently(
+            model_name='protocolo',
+            index=models.Index(fields=['caixa', 'fileira', 'face'], name='protocolo_local_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='protocolo',
+            index=models.Index(fields=['fileira'], name='protocolo_fileira_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='protocolo',
+            index=models.Index(fields=['face'], name='protocolo_face_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('protocolos', '0006_localizacao'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='protocolo',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['numero'], name='protocolo_numero_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,8 +1,47 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 import re
+import unicodedata
+
+
+def somente_digitos(valor):
+    """Forma canônica do CPF/CNPJ: apenas os dígitos"""
+    return re.sub(r'[^\d]', '', valor or '')
+
+
+# Componentes de "CAIXA 12, FILEIRA 3, FACE B" (também CX/FIL e "Nº")
+CAIXA_RE = re.compile(r'\b(?:CAIXA|CX)\.?\s*(?:N[O0º°]?\.?\s*)?(\d+)\b')
+FILEIRA_RE = re.compile(r'\b(?:FILEIRA|FIL)\.?\s*(?:N[O0º°]?\.?\s*)?(\d+)\b')
+FACE_RE = re.compile(r'\bFACE\.?\s*([A-Z0-9]{1,10})\b')
+
+# Maior valor aceito por PositiveIntegerField em todos os bancos
+MAIOR_INTEIRO = 2147483647
+
+
+def _numero_do_local(encontrado):
+    """Número capturado; None se ausente ou grande demais para a coluna"""
+    if not encontrado:
+        return None
+    numero = int(encontrado.group(1))
+    return numero if numero <= MAIOR_INTEIRO else None
+
+
+def interpretar_local(texto):
+    """Extrai (caixa, fileira, face) do local de armazenamento; ausentes vêm None/''"""
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().upper()
+    caixa = CAIXA_RE.search(texto)
+    fileira = FILEIRA_RE.search(texto)
+    face = FACE_RE.search(texto)
+    return (
+        _numero_do_local(caixa),
+        _numero_do_local(fileira),
+        face.group(1) if face else '',
+    )
+
 
 class Protocolo(models.Model):
     TIPO_CHOICES = [
@@ -35,6 +74,14 @@ class Protocolo(models.Model):
         help_text="CPF (11 dígitos) ou CNPJ (14 dígitos)"
     )
     
+    # Forma canônica do CPF/CNPJ para as buscas (mantida no save)
+    cpf_cnpj_digitos = models.CharField(
+        "CPF/CNPJ (somente dígitos)",
+        max_length=14,
+        blank=True,
+        editable=False,
+    )
+    
     tipo = models.CharField(
         "Tipo", 
         max_length=15, 
@@ -48,6 +95,11 @@ class Protocolo(models.Model):
         help_text="Ex: CAIXA X, FILEIRA X, FACE X"
     )
     
+    # Componentes do local de armazenamento (mantidos no save)
+    caixa = models.PositiveIntegerField("Caixa", null=True, blank=True, editable=False)
+    fileira = models.PositiveIntegerField("Fileira", null=True, blank=True, editable=False)
+    face = models.CharField("Face", max_length=10, blank=True, editable=False)
+    
     observacoes = models.TextField(
         "Observações", 
         blank=True,
@@ -80,6 +132,25 @@ class Protocolo(models.Model):
         ordering = ["-data_emissao", "-criado_em"]
         verbose_name = "Protocolo"
         verbose_name_plural = "Protocolos"
+        indexes = [
+            # Paginação por cursor da listagem
+            models.Index(
+                F("data_emissao").desc(), F("criado_em").desc(), F("id"),
+                name="protocolo_listagem_idx",
+            ),
+            # Busca exata e por prefixo (LIKE 'xxx%') do CPF/CNPJ
+            models.Index(
+                fields=["cpf_cnpj_digitos"],
+                name="protocolo_cpf_cnpj_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            # Arquivo físico: filtros exatos e totais por caixa
+            models.Index(fields=["caixa", "fileira", "face"], name="protocolo_local_idx"),
+            models.Index(fields=["fileira"], name="protocolo_fileira_idx"),
+            models.Index(fields=["face"], name="protocolo_face_idx"),
+            # Parte do número (LIKE '%xxx%') nas buscas numéricas
+            GinIndex(fields=["numero"], opclasses=["gin_trgm_ops"], name="protocolo_numero_trgm"),
+        ]
 
     def __str__(self):
         return f"Protocolo {self.numero} - {self.get_tipo_display()}"
@@ -106,6 +177,16 @@ class Protocolo(models.Model):
     def save(self, *args, **kwargs):
         """Sobrescreve save para aplicar validações"""
         self.clean()
+        self.cpf_cnpj_digitos = somente_digitos(self.cpf_cnpj)
+        self.caixa, self.fileira, self.face = interpretar_local(self.local_armazenamento)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'cpf_cnpj' in update_fields:
+                update_fields.add('cpf_cnpj_digitos')
+            if 'local_armazenamento' in update_fields:
+                update_fields.update(('caixa', 'fileira', 'face'))
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
     
     @property
@@ -0,0 +1,404 @@
+"""
+Integração com a API do SITAC para preencher ``Protocolo.protocolo_sitac``.
+
+Contrato usado: ``GET {SITAC_URL}/protocolos/{numero}/?cpf_cnpj=<dígitos>``
+responde 200 com ``{"protocolo": "<número no SITAC>"}`` ou 404 quando o
+protocolo não existe no SITAC.
+
+O cliente é assíncrono (asyncio, sem dependências externas) e:
+
+- reaproveita as conexões HTTP/1.1 (keep-alive) em um pool limitado;
+- limita as consultas simultâneas (``SITAC_CONCORRENCIA``);
+- repete as falhas transitórias (erros de rede, timeout, 429 e 5xx) com
+  espera exponencial e jitter, respeitando ``Retry-After``;
+- recusa respostas maiores que ``SITAC_MAX_BYTES``;
+- abre o disjuntor após ``SITAC_LIMITE_FALHAS`` falhas seguidas, recusando
+  novas consultas por ``SITAC_TEMPO_ABERTO`` segundos; depois disso uma
+  consulta de teste decide se o circuito fecha de novo.
+
+``preencher_protocolos_sitac`` percorre em lotes (por id) os protocolos sem
+``protocolo_sitac``, consulta o lote concorrentemente e grava as respostas
+com um único ``bulk_update`` por lote.
+"""
+import asyncio
+import json
+import random
+import ssl
+import time
+from dataclasses import dataclass
+from urllib.parse import quote, urlencode, urlsplit
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.contagem import ainvalidar
+
+from .models import Protocolo
+
+TAMANHO_LOTE = 100
+
+# Respostas que valem uma nova tentativa
+STATUS_TRANSITORIOS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class ErroSitac(Exception):
+    """Falha na consulta ao SITAC"""
+
+
+class ErroTransitorio(ErroSitac):
+    def __init__(self, mensagem, espera=None):
+        super().__init__(mensagem)
+        self.espera = espera
+
+
+class CircuitoAberto(ErroSitac):
+    """O SITAC falhou seguidamente e as consultas estão suspensas"""
+
+
+@dataclass(frozen=True)
+class ConfiguracaoSitac:
+    url: str
+    token: str = ""
+    timeout: float = 10.0
+    concorrencia: int = 8
+    tentativas: int = 3
+    espera_base: float = 0.5
+    espera_maxima: float = 10.0
+    limite_falhas: int = 5
+    tempo_aberto: float = 30.0
+    max_bytes: int = 1024 * 1024
+
+    @classmethod
+    def das_configuracoes(cls):
+        return cls(
+            url=getattr(settings, "SITAC_URL", ""),
+            token=getattr(settings, "SITAC_TOKEN", ""),
+            timeout=getattr(settings, "SITAC_TIMEOUT", 10.0),
+            concorrencia=getattr(settings, "SITAC_CONCORRENCIA", 8),
+            tentativas=getattr(settings, "SITAC_TENTATIVAS", 3),
+            limite_falhas=getattr(settings, "SITAC_LIMITE_FALHAS", 5),
+            tempo_aberto=getattr(settings, "SITAC_TEMPO_ABERTO", 30.0),
+            max_bytes=getattr(settings, "SITAC_MAX_BYTES", 1024 * 1024),
+        )
+
+
+class Disjuntor:
+    """Circuit breaker: fechado → aberto (após falhas seguidas) → meio aberto (um teste)"""
+
+    def __init__(self, limite_falhas, tempo_aberto, relogio=time.monotonic):
+        self.limite_falhas = limite_falhas
+        self.tempo_aberto = tempo_aberto
+        self.relogio = relogio
+        self.falhas = 0
+        self.aberto_ate = None
+        self.testando = False
+
+    @property
+    def estado(self):
+        if self.aberto_ate is None:
+            return "fechado"
+        if self.relogio() < self.aberto_ate:
+            return "aberto"
+        return "meio-aberto"
+
+    def permitir(self):
+        estado = self.estado
+        if estado == "aberto" or (estado == "meio-aberto" and self.testando):
+            raise CircuitoAberto("SITAC indisponível: consultas suspensas temporariamente.")
+        if estado == "meio-aberto":
+            self.testando = True
+
+    def sucesso(self):
+        self.falhas = 0
+        self.aberto_ate = None
+        self.testando = False
+
+    def falha(self):
+        self.falhas += 1
+        if self.testando or self.falhas >= self.limite_falhas:
+            self.aberto_ate = self.relogio() + self.tempo_aberto
+        self.testando = False
+
+
+@dataclass
+class RespostaHttp:
+    status: int
+    cabecalhos: dict
+    corpo: bytes
+
+    def json(self):
+        return json.loads(self.corpo or b"null")
+
+
+class PoolConexoes:
+    """Conexões keep-alive reaproveitadas com um único servidor"""
+
+    def __init__(self, url, tamanho, max_bytes=1024 * 1024):
+        partes = urlsplit(url)
+        self.max_bytes = max_bytes
+        self.host = partes.hostname
+        self.seguro = partes.scheme == "https"
+        self.porta = partes.port or (443 if self.seguro else 80)
+        self.prefixo = partes.path.rstrip("/")
+        self.cabecalho_host = partes.netloc
+        self.livres = []
+        self.vagas = asyncio.Semaphore(tamanho)
+        self.abertas = 0
+
+    async def _abrir(self):
+        contexto = ssl.create_default_context() if self.seguro else None
+        conexao = await asyncio.open_connection(self.host, self.porta, ssl=contexto)
+        self.abertas += 1
+        return conexao
+
+    async def requisicao(self, metodo, caminho, cabecalhos, timeout):
+        async with self.vagas:
+            if self.livres:
+                try:
+                    return await self._usar(self.livres.pop(), metodo, caminho, cabecalhos, timeout)
+                except asyncio.TimeoutError:
+                    raise ErroTransitorio("Tempo esgotado na consulta ao SITAC.")
+                except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                    # O servidor fechou a conexão ociosa: segue com uma nova
+                    pass
+            try:
+                conexao = await asyncio.wait_for(self._abrir(), timeout)
+                return await self._usar(conexao, metodo, caminho, cabecalhos, timeout)
+            except asyncio.TimeoutError:
+                raise ErroTransitorio("Tempo esgotado na consulta ao SITAC.")
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as exc:
+                raise ErroTransitorio(f"Falha de comunicação com o SITAC: {exc!r}")
+
+    async def _usar(self, conexao, metodo, caminho, cabecalhos, timeout):
+        try:
+            resposta, manter = await asyncio.wait_for(
+                self._trocar(conexao, metodo, self.prefixo + caminho, cabecalhos), timeout,
+            )
+        except BaseException:
+            conexao[1].close()
+            raise
+        if manter:
+            self.livres.append(conexao)
+        else:
+            conexao[1].close()
+        return resposta
+
+    async def _trocar(self, conexao, metodo, caminho, cabecalhos):
+        leitor, escritor = conexao
+        linhas = [f"{metodo} {caminho} HTTP/1.1", f"Host: {self.cabecalho_host}", "Connection: keep-alive"]
+        linhas += [f"{nome}: {valor}" for nome, valor in cabecalhos.items()]
+        escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode("latin-1"))
+        await escritor.drain()
+
+        status_linha = await leitor.readuntil(b"\r\n")
+        versao, status, *_ = status_linha.decode("latin-1").split(" ", 2)
+        recebidos = {}
+        while True:
+            linha = await leitor.readuntil(b"\r\n")
+            if linha == b"\r\n":
+                break
+            nome, _, valor = linha.decode("latin-1").partition(":")
+            recebidos[nome.strip().lower()] = valor.strip()
+
+        if recebidos.get("transfer-encoding", "").lower() == "chunked":
+            corpo = await self._ler_chunked(leitor)
+        elif "content-length" in recebidos:
+            tamanho = int(recebidos["content-length"])
+            self._conferir_tamanho(tamanho)
+            corpo = await leitor.readexactly(tamanho)
+        else:
+            corpo = await self._ler_ate_fechar(leitor)
+            recebidos["connection"] = "close"
+
+        manter = recebidos.get("connection", "").lower() != "close" and versao == "HTTP/1.1"
+        return RespostaHttp(int(status), recebidos, corpo), manter
+
+    def _conferir_tamanho(self, tamanho):
+        if tamanho > self.max_bytes:
+            raise ErroSitac(f"Resposta do SITAC maior que {self.max_bytes} bytes.")
+
+    async def _ler_ate_fechar(self, leitor):
+        partes, total = [], 0
+        while parte := await leitor.read(64 * 1024):
+            total += len(parte)
+            self._conferir_tamanho(total)
+            partes.append(parte)
+        return b"".join(partes)
+
+    async def _ler_chunked(self, leitor):
+        partes, total = [], 0
+        while True:
+            tamanho = int((await leitor.readuntil(b"\r\n")).split(b";")[0], 16)
+            if tamanho == 0:
+                # Trailers até a linha em branco
+                while await leitor.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return b"".join(partes)
+            total += tamanho
+            self._conferir_tamanho(total)
+            partes.append(await leitor.readexactly(tamanho))
+            await leitor.readexactly(2)
+
+    async def fechar(self):
+        while self.livres:
+            _, escritor = self.livres.pop()
+            escritor.close()
+            try:
+                await escritor.wait_closed()
+            except OSError:
+                pass
+
+
+class ClienteSitac:
+    """
+    Cliente assíncrono do SITAC; use com ``async with``.
+
+    ``consultar`` retorna o número do protocolo no SITAC ou ``None`` se o
+    SITAC não o conhece; levanta ``ErroSitac`` (ou ``CircuitoAberto``).
+    """
+
+    def __init__(self, configuracao=None, disjuntor=None):
+        self.configuracao = configuracao or ConfiguracaoSitac.das_configuracoes()
+        if not self.configuracao.url:
+            raise ErroSitac("SITAC_URL não configurada.")
+        self.disjuntor = disjuntor or Disjuntor(
+            self.configuracao.limite_falhas, self.configuracao.tempo_aberto,
+        )
+        self.pool = None
+        self.vagas = None
+
+    async def __aenter__(self):
+        self.vagas = asyncio.Semaphore(self.configuracao.concorrencia)
+        self.pool = PoolConexoes(
+            self.configuracao.url, self.configuracao.concorrencia, self.configuracao.max_bytes,
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.pool.fechar()
+
+    def _cabecalhos(self):
+        cabecalhos = {"Accept": "application/json", "User-Agent": "normativos-crea-to"}
+        if self.configuracao.token:
+            cabecalhos["Authorization"] = f"Bearer {self.configuracao.token}"
+        return cabecalhos
+
+    def _espera(self, tentativa, sugerida=None):
+        if sugerida is not None:
+            return min(sugerida, self.configuracao.espera_maxima)
+        base = self.configuracao.espera_base * 2 ** tentativa
+        return min(base, self.configuracao.espera_maxima) * random.uniform(0.5, 1)
+
+    async def _consultar_uma_vez(self, numero, cpf_cnpj):
+        caminho = f"/protocolos/{quote(numero, safe='')}/"
+        if cpf_cnpj:
+            caminho += "?" + urlencode({"cpf_cnpj": cpf_cnpj})
+        resposta = await self.pool.requisicao("GET", caminho, self._cabecalhos(), self.configuracao.timeout)
+
+        if resposta.status == 404:
+            return None
+        if resposta.status in STATUS_TRANSITORIOS:
+            espera = resposta.cabecalhos.get("retry-after")
+            raise ErroTransitorio(
+                f"SITAC respondeu {resposta.status}.",
+                espera=float(espera) if espera and espera.isdigit() else None,
+            )
+        if resposta.status != 200:
+            raise ErroSitac(f"SITAC respondeu {resposta.status} para o protocolo {numero}.")
+        try:
+            protocolo = (resposta.json() or {}).get("protocolo")
+        except (ValueError, AttributeError):
+            raise ErroSitac(f"Resposta inválida do SITAC para o protocolo {numero}.")
+        return str(protocolo) if protocolo else None
+
+    async def consultar(self, numero, cpf_cnpj=""):
+        for tentativa in range(self.configuracao.tentativas):
+            try:
+                async with self.vagas:
+                    # Verificado na vez da consulta: as que aguardavam param se o circuito abriu
+                    self.disjuntor.permitir()
+                    resultado = await self._consultar_uma_vez(numero, cpf_cnpj)
+            except CircuitoAberto:
+                raise
+            except ErroTransitorio as exc:
+                self.disjuntor.falha()
+                if tentativa + 1 >= self.configuracao.tentativas:
+                    raise
+                await asyncio.sleep(self._espera(tentativa, exc.espera))
+            except ErroSitac:
+                # O SITAC respondeu: o erro é da consulta, não da disponibilidade
+                self.disjuntor.sucesso()
+                raise
+            else:
+                self.disjuntor.sucesso()
+                return resultado
+
+
+@dataclass
+class ResultadoSitac:
+    consultados: int = 0
+    preenchidos: int = 0
+    nao_encontrados: int = 0
+    falhas: int = 0
+    interrompido: bool = False
+
+
+def protocolos_pendentes():
+    return Protocolo.objects.filter(Q(protocolo_sitac__isnull=True) | Q(protocolo_sitac=""))
+
+
+async def preencher_protocolos_sitac(cliente=None, tamanho_lote=TAMANHO_LOTE, limite=None):
+    """
+    Consulta o SITAC para os protocolos pendentes e grava as respostas.
+
+    Os pendentes são lidos por id (os não encontrados não voltam no lote
+    seguinte). Com o disjuntor aberto a tarefa para e retorna o que já fez.
+    """
+    resultado = ResultadoSitac()
+    if cliente is None:
+        async with ClienteSitac() as cliente:
+            return await preencher_protocolos_sitac(cliente, tamanho_lote, limite)
+
+    ultimo_id = 0
+    while limite is None or resultado.consultados < limite:
+        tamanho = tamanho_lote if limite is None else min(tamanho_lote, limite - resultado.consultados)
+        lote = [
+            protocolo async for protocolo in
+            protocolos_pendentes().filter(id__gt=ultimo_id).order_by("id")
+            .only("id", "numero", "cpf_cnpj_digitos")[:tamanho]
+        ]
+        if not lote:
+            break
+        ultimo_id = lote[-1].id
+
+        respostas = await asyncio.gather(
+            # O contrato pede só os dígitos; cpf_cnpj pode vir formatado do admin
+            *(cliente.consultar(protocolo.numero, protocolo.cpf_cnpj_digitos) for protocolo in lote),
+            return_exceptions=True,
+        )
+        agora = timezone.now()
+        preenchidos = []
+        for protocolo, resposta in zip(lote, respostas):
+            if isinstance(resposta, CircuitoAberto):
+                resultado.interrompido = True
+                continue
+            resultado.consultados += 1
+            if isinstance(resposta, ErroSitac):
+                resultado.falhas += 1
+            elif isinstance(resposta, BaseException):
+                raise resposta
+            elif resposta is None:
+                resultado.nao_encontrados += 1
+            else:
+                protocolo.protocolo_sitac = resposta
+                protocolo.atualizado_em = agora
+                preenchidos.append(protocolo)
+
+        if preenchidos:
+            await Protocolo.objects.abulk_update(preenchidos, ["protocolo_sitac", "atualizado_em"])
+            resultado.preenchidos += len(preenchidos)
+            await ainvalidar(Protocolo)
+        if resultado.interrompido:
+            break
+    return resultado
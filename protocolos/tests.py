@@ -1,7 +1,41 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from importlib import import_module
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import unquote, urlsplit
+
+from asgiref.sync import async_to_sync
+
+from django.apps import apps
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.db import connection
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
-from .models import Protocolo
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+from core.contagem import contar
+from core.paginacao import PaginadorCursor
+from core.exportacao import exportar
+from ementas.tests import views_assincronas
+from .exportacao import COLUNAS_EXPORTACAO
+from .filtros import filtrar_protocolos, ler_filtros
+from .importacao import ErroImportacao, importar_protocolos
+from .localizacao import totais_por_caixa
+from .models import Protocolo, interpretar_local
+from .views import ORDENACAO_LISTA
+from .sitac import (
+    CircuitoAberto, ClienteSitac, ConfiguracaoSitac, Disjuntor, preencher_protocolos_sitac, protocolos_pendentes,
+)
 
 User = get_user_model()
 
@@ -98,3 +132,654 @@ class ProtocoloModelTest(TestCase):
         protocolos = Protocolo.objects.all()
         self.assertEqual(protocolos[0], protocolo2)  # Mais recente primeiro
         self.assertEqual(protocolos[1], protocolo1)
+
+
+@override_settings(PAGINAS_NUMERADAS=2)
+class PaginacaoCursorProtocoloTest(TestCase):
+    def setUp(self):
+        for i in range(35):
+            Protocolo.objects.create(
+                numero=f'PROT{i:03d}',
+                cpf_cnpj='12345678901',
+                local_armazenamento='CAIXA 1, FILEIRA 1, FACE A',
+            )
+        self.esperado = list(Protocolo.objects.order_by('-data_emissao', '-criado_em', 'id'))
+
+    def listar(self, **params):
+        response = self.client.get(reverse('protocolos:lista'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def test_paginas_numeradas_continuam_por_cursor(self):
+        """Testa que após as páginas numeradas a navegação segue por cursor"""
+        pagina = self.listar(page=2)
+        self.assertEqual(list(pagina), self.esperado[10:20])
+        self.assertIsNotNone(pagina.cursor_proximo)
+
+        vistos = list(pagina)
+        cursor = pagina.cursor_proximo
+        while cursor:
+            pagina = self.listar(cursor=cursor)
+            self.assertIsNone(pagina.paginator)
+            vistos.extend(pagina)
+            cursor = pagina.cursor_proximo
+        self.assertEqual(vistos, self.esperado[10:])
+
+    def test_cursor_anterior(self):
+        """Testa que o cursor anterior retorna a página anterior"""
+        pagina = self.listar(page=2)
+        terceira = self.listar(cursor=pagina.cursor_proximo)
+        self.assertEqual(list(terceira), self.esperado[20:30])
+
+        anterior = self.listar(cursor=terceira.cursor_anterior)
+        self.assertEqual(list(anterior), self.esperado[10:20])
+        self.assertTrue(anterior.has_next())
+
+    def test_paginas_profundas_limitadas(self):
+        """Testa que números de página além do limite não usam OFFSET profundo"""
+        pagina = self.listar(page=5000)
+        self.assertEqual(pagina.number, 2)
+
+    def test_cursor_invalido(self):
+        """Testa que um cursor adulterado volta ao início da listagem"""
+        pagina = self.listar(cursor='invalido')
+        self.assertEqual(list(pagina), self.esperado[:10])
+
+
+@override_settings(PAGINAS_NUMERADAS=2)
+class ListagemAssincronaProtocoloTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.autor = get_user_model().objects.create_user(username='autor', password='senha12345')
+        for i in range(25):
+            Protocolo.objects.create(
+                numero=f'PROT{i:03d}', cpf_cnpj='12345678901', criado_por=self.autor,
+                local_armazenamento='CAIXA 1, FILEIRA 1, FACE A',
+            )
+
+    def listar_async(self, **params):
+        with views_assincronas():
+            response = async_to_sync(self.async_client.get)(reverse('protocolos:lista'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_igual_a_sincrona(self):
+        """Testa que a listagem assíncrona mostra as mesmas páginas e cursores da síncrona"""
+        # O cursor assinado leva o horário da assinatura: compara a posição decodificada
+        paginador = PaginadorCursor(Protocolo.objects.all(), ORDENACAO_LISTA, 20)
+
+        def posicao(cursor):
+            return cursor and paginador.decodificar(cursor)
+
+        for params in ({}, {'page': 2}, {'q': 'PROT01'}):
+            esperado = self.client.get(reverse('protocolos:lista'), params).context['page_obj']
+            pagina = self.listar_async(**params).context['page_obj']
+            self.assertEqual(list(pagina), list(esperado))
+            self.assertEqual(posicao(pagina.cursor_proximo), posicao(esperado.cursor_proximo))
+
+        esperado = self.client.get(reverse('protocolos:lista'), {'page': 2}).context['page_obj']
+        self.assertIsNotNone(posicao(esperado.cursor_proximo))
+        pagina = self.listar_async(cursor=esperado.cursor_proximo).context['page_obj']
+        self.assertEqual(list(pagina), list(Protocolo.objects.order_by('-data_emissao', '-criado_em', 'id')[20:]))
+
+    def test_sem_consulta_por_linha(self):
+        """Testa que o autor de cada protocolo não é buscado linha a linha no template"""
+        self.client.force_login(self.autor)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('protocolos:lista'))
+        usuarios = [c['sql'] for c in consultas.captured_queries if 'auth_user' in c['sql']]
+        self.assertLessEqual(len(usuarios), 1)
+
+
+class ContagemProtocoloTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(3):
+            Protocolo.objects.create(
+                numero=f'CONT{i}',
+                cpf_cnpj='12345678901',
+                local_armazenamento='CAIXA 1, FILEIRA 1, FACE A',
+            )
+
+    def contagens_na_listagem(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('protocolos:lista'), params)
+        total = response.context['page_obj'].paginator.count
+        return total, [q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()]
+
+    def test_contagem_em_cache(self):
+        """Testa que a contagem exata é reaproveitada entre requisições"""
+        total, contagens = self.contagens_na_listagem(tipo='profissional')
+        self.assertEqual(total, 3)
+        self.assertEqual(len(contagens), 1)
+
+        total, contagens = self.contagens_na_listagem(tipo='profissional')
+        self.assertEqual(total, 3)
+        self.assertEqual(contagens, [])
+
+    def test_contagem_invalidada_ao_salvar_e_excluir(self):
+        """Testa que criar ou excluir protocolos invalida as contagens"""
+        self.contagens_na_listagem()
+        novo = Protocolo.objects.create(
+            numero='CONT9', cpf_cnpj='12345678901', local_armazenamento='CAIXA 2',
+        )
+        self.assertEqual(self.contagens_na_listagem()[0], 4)
+        novo.delete()
+        self.assertEqual(self.contagens_na_listagem()[0], 3)
+
+    @override_settings(CONTAGEM_LIMIAR_ESTIMATIVA=1)
+    def test_estimativa_para_resultados_grandes(self):
+        """Testa que acima do limiar a contagem vem da estimativa do PostgreSQL"""
+        if connection.vendor != 'postgresql':
+            self.skipTest('Estimativas requerem PostgreSQL')
+        total, aproximado = contar(Protocolo.objects.filter(tipo='profissional'))
+        self.assertTrue(aproximado)
+        self.assertGreaterEqual(total, 1)
+
+
+class ExportacaoProtocoloTest(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Protocolo.objects.create(
+                numero=f'PROT{i:03d}',
+                cpf_cnpj='12345678901' if i % 2 else '12345678000195',
+                local_armazenamento='CAIXA 1, FILEIRA 1, FACE A',
+            )
+        self.staff = User.objects.create_user(username='staff', password='senha12345', is_staff=True)
+
+    def exportar(self, **params):
+        return self.client.get(reverse('protocolos:exportar'), params)
+
+    def test_exige_permissao(self):
+        """Testa que apenas usuários autorizados exportam"""
+        self.assertEqual(self.exportar().status_code, 302)
+        comum = User.objects.create_user(username='comum', password='senha12345')
+        self.client.force_login(comum)
+        self.assertRedirects(self.exportar(), reverse('protocolos:lista'))
+
+    def test_csv_com_filtros(self):
+        """Testa a exportação em CSV respeitando os filtros da listagem"""
+        self.client.force_login(self.staff)
+        response = self.exportar(formato='csv', tipo='empresa')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        linhas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(linhas[0][1], 'Número de Protocolo')
+        self.assertEqual(len(linhas), 4)
+        self.assertTrue(all(linha[4] == 'empresa' for linha in linhas[1:]))
+
+    def test_ndjson(self):
+        """Testa a exportação em JSON Lines"""
+        self.client.force_login(self.staff)
+        response = self.exportar(formato='ndjson')
+        registros = [json.loads(linha) for linha in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(registros), 5)
+        self.assertEqual(registros[0]['local_armazenamento'], 'CAIXA 1, FILEIRA 1, FACE A')
+
+    def test_xlsx(self):
+        """Testa que o XLSX gerado em streaming é um pacote válido"""
+        self.client.force_login(self.staff)
+        response = self.exportar(formato='xlsx')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as arquivo:
+            self.assertIsNone(arquivo.testzip())
+            planilha = arquivo.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(planilha.count('<row>'), 6)
+        self.assertIn('PROT004', planilha)
+
+    @override_settings(SERVIDOR_ASGI=True)
+    def test_asgi_transmite_em_partes(self):
+        """Testa que sob ASGI a exportação sai por um iterador assíncrono, parte a parte"""
+        self.async_client.force_login(self.staff)
+
+        async def ler(response):
+            return [parte async for parte in response.streaming_content]
+
+        with mock.patch('core.exportacao.TAMANHO_PARTE', 50):
+            response = async_to_sync(self.async_client.get)(reverse('protocolos:exportar'), {'formato': 'ndjson'})
+            self.assertTrue(response.is_async)
+            partes = async_to_sync(ler)(response)
+        self.assertGreater(len(partes), 1)
+        self.assertEqual(len(b''.join(partes).splitlines()), 5)
+
+    def test_comando(self):
+        """Testa o comando de exportação gravando em arquivo"""
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'protocolos.ndjson')
+            call_command('exportar_protocolos', '--formato', 'ndjson', '--saida', caminho,
+                         '--lote', '2', stderr=io.StringIO())
+            with open(caminho, encoding='utf-8') as arquivo:
+                self.assertEqual(len(arquivo.readlines()), 5)
+
+
+class ImportacaoProtocoloTest(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        Protocolo.objects.create(numero='EXISTENTE', cpf_cnpj='12345678901', local_armazenamento='CAIXA 9')
+        self.staff = User.objects.create_user(username='staff', password='senha12345', is_staff=True)
+
+    def planilha_csv(self, *linhas, separador=','):
+        texto = io.StringIO()
+        escritor = csv.writer(texto, delimiter=separador)
+        escritor.writerow(['Número', 'CPF/CNPJ', 'Local de Armazenamento', 'Observações'])
+        escritor.writerows(linhas)
+        return io.BytesIO(texto.getvalue().encode('utf-8-sig'))
+
+    def test_importa_em_lotes(self):
+        """Testa a importação com validação, duplicados e uma consulta por lote"""
+        arquivo = self.planilha_csv(
+            ['P1', '123.456.789-01', 'CAIXA 1, FILEIRA 1, FACE A', ''],
+            ['P2', '12.345.678/0001-95', 'CAIXA 1, FILEIRA 2, FACE B', 'Multa'],
+            ['P3', '123', 'CAIXA 1', ''],
+            ['EXISTENTE', '12345678901', 'CAIXA 1', ''],
+            ['P1', '12345678901', 'CAIXA 2', ''],
+            ['', '12345678901', 'CAIXA 2', ''],
+            ['P4', '98765432100', 'CAIXA 2, FILEIRA 1, FACE A', ''],
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = importar_protocolos(arquivo, 'csv', usuario=self.staff, tamanho_lote=4)
+        # Por lote: uma consulta dos números existentes e uma inserção
+        sqls = [q['sql'] for q in consultas.captured_queries]
+        self.assertEqual(len([sql for sql in sqls if sql.startswith('SELECT')]), 2)
+        self.assertEqual(len([sql for sql in sqls if sql.startswith('INSERT')]), 2)
+
+        self.assertEqual(resultado.lidas, 7)
+        self.assertEqual(resultado.importadas, 3)
+        self.assertEqual([erro[0] for erro in resultado.erros], [4, 5, 6, 7])
+        self.assertIn('já cadastrado', resultado.erros[1][2])
+        self.assertIn('repetido', resultado.erros[2][2])
+
+        p1 = Protocolo.objects.get(numero='P1')
+        self.assertEqual(p1.cpf_cnpj, '12345678901')
+        self.assertEqual(p1.tipo, 'profissional')
+        self.assertEqual(p1.criado_por, self.staff)
+        self.assertEqual(Protocolo.objects.get(numero='P2').tipo, 'empresa')
+
+    def test_numero_cadastrado_durante_a_importacao(self):
+        """Testa que conflitos com números gravados por outra requisição viram erros do relatório"""
+        arquivo = self.planilha_csv(
+            ['P1', '12345678901', 'CAIXA 1', ''],
+            ['EXISTENTE', '12345678901', 'CAIXA 1', ''],
+            ['P2', '12345678901', 'CAIXA 1', ''],
+        )
+        # Os números existentes são consultados antes de a outra requisição gravar
+        with mock.patch('protocolos.importacao._separar_existentes', side_effect=lambda novas, _: novas):
+            resultado = importar_protocolos(arquivo, 'csv', usuario=self.staff)
+        self.assertEqual(resultado.importadas, 2)
+        self.assertEqual(resultado.erros, [(3, 'EXISTENTE', 'Número de protocolo já cadastrado.')])
+        self.assertEqual(Protocolo.objects.filter(numero__in=['P1', 'P2']).count(), 2)
+
+    def test_contagem_invalidada(self):
+        """Testa que a contagem em cache considera os protocolos importados"""
+        cache.clear()
+        self.assertEqual(contar(Protocolo.objects.all())[0], 1)
+        importar_protocolos(self.planilha_csv(['P1', '12345678901', 'CAIXA 1', '']), 'csv')
+        self.assertEqual(contar(Protocolo.objects.all())[0], 2)
+
+    def test_simulacao(self):
+        """Testa que a simulação valida sem gravar"""
+        resultado = importar_protocolos(
+            self.planilha_csv(['P1', '12345678901', 'CAIXA 1', ''], separador=';'), 'csv', simular=True,
+        )
+        self.assertEqual(resultado.importadas, 1)
+        self.assertFalse(Protocolo.objects.filter(numero='P1').exists())
+
+    def test_cabecalho_invalido(self):
+        """Testa a rejeição de planilhas sem as colunas obrigatórias"""
+        with self.assertRaises(ErroImportacao):
+            importar_protocolos(io.BytesIO(b'numero,local\nP1,CAIXA 1\n'), 'csv')
+
+    def test_reimporta_exportacao_xlsx(self):
+        """Testa a importação de um XLSX gerado pela exportação"""
+        registros = [
+            {'numero': 'X1', 'cpf_cnpj': 12345678901, 'local_armazenamento': 'CAIXA 3'},
+            {'numero': 'X2', 'cpf_cnpj': '12345678000195', 'local_armazenamento': 'CAIXA & 4'},
+        ]
+        conteudo = b''.join(exportar('xlsx', COLUNAS_EXPORTACAO, registros))
+        resultado = importar_protocolos(io.BytesIO(conteudo), 'xlsx')
+        self.assertEqual(resultado.importadas, 2, resultado.erros)
+        self.assertEqual(Protocolo.objects.get(numero='X1').cpf_cnpj, '12345678901')
+        self.assertEqual(Protocolo.objects.get(numero='X2').local_armazenamento, 'CAIXA & 4')
+
+    def test_view_com_relatorio(self):
+        """Testa o envio pela view e o download do relatório de erros"""
+        self.client.force_login(self.staff)
+        arquivo = SimpleUploadedFile(
+            'protocolos.csv',
+            self.planilha_csv(['P1', '12345678901', 'CAIXA 1', ''], ['EXISTENTE', '12345678901', 'CAIXA 1', '']).read(),
+        )
+        response = self.client.post(reverse('protocolos:importar'), {'arquivo': arquivo})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['resultado'].importadas, 1)
+
+        relatorio = self.client.get(
+            reverse('protocolos:relatorio_importacao', args=[response.context['relatorio']])
+        )
+        linhas = list(csv.reader(io.StringIO(b''.join(relatorio.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(linhas[1][:2], ['3', 'EXISTENTE'])
+
+    def test_view_exige_staff(self):
+        """Testa que apenas a equipe pode importar"""
+        comum = User.objects.create_user(username='comum', password='senha12345')
+        self.client.force_login(comum)
+        self.assertRedirects(self.client.get(reverse('protocolos:importar')), reverse('protocolos:lista'))
+        self.assertEqual(
+            self.client.get(reverse('protocolos:relatorio_importacao', args=['0' * 32])).status_code, 404,
+        )
+
+    def test_comando(self):
+        """Testa o comando de importação com relatório de erros"""
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        caminho = os.path.join(pasta, 'protocolos.csv')
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(self.planilha_csv(['P1', '12345678901', 'CAIXA 1', ''], ['P2', '1', 'CAIXA 1', '']).read())
+        relatorio = os.path.join(pasta, 'erros.csv')
+        saida = io.StringIO()
+        call_command('importar_protocolos', caminho, '--relatorio', relatorio, stdout=saida, stderr=io.StringIO())
+        self.assertIn('1 importada(s), 1 rejeitada(s)', saida.getvalue())
+        with open(relatorio, encoding='utf-8-sig') as arquivo:
+            self.assertIn('P2', arquivo.read())
+
+
+class StubSitac:
+    """Servidor HTTP local que simula a API do SITAC"""
+
+    def __init__(self, protocolos, falhas=0, transferencia='tamanho', enchimento=0):
+        self.protocolos = protocolos
+        self.falhas = falhas
+        # 'tamanho' (Content-Length), 'chunked' ou 'fechar' (corpo até fechar a conexão)
+        self.transferencia = transferencia
+        self.enchimento = enchimento
+        self.requisicoes = 0
+        self.conexoes = set()
+        self.consultas = {}
+        self.trava = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub.trava:
+                    stub.requisicoes += 1
+                    stub.conexoes.add(self.client_address)
+                    falhar = stub.falhas > 0
+                    stub.falhas -= falhar
+                partes = urlsplit(self.path)
+                numero = unquote(partes.path.rstrip('/').split('/')[-1])
+                with stub.trava:
+                    stub.consultas[numero] = partes.query
+                if falhar:
+                    status, corpo = 503, {'erro': 'indisponível'}
+                elif numero in stub.protocolos:
+                    status, corpo = 200, {'protocolo': stub.protocolos[numero]}
+                else:
+                    status, corpo = 404, {'erro': 'não encontrado'}
+                if stub.enchimento:
+                    corpo['enchimento'] = 'x' * stub.enchimento
+                dados = json.dumps(corpo).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if stub.transferencia == 'chunked':
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    self.wfile.write(f'{len(dados):x}\r\n'.encode() + dados + b'\r\n0\r\n\r\n')
+                elif stub.transferencia == 'fechar':
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    self.wfile.write(dados)
+                    self.close_connection = True
+                else:
+                    self.send_header('Content-Length', str(len(dados)))
+                    self.end_headers()
+                    self.wfile.write(dados)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.servidor.server_port}/api'
+
+    def __enter__(self):
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class SitacTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(10):
+            Protocolo.objects.create(numero=f'P{i}', cpf_cnpj='12345678901', local_armazenamento='CAIXA 1')
+        Protocolo.objects.create(
+            numero='JA', cpf_cnpj='12345678901', local_armazenamento='CAIXA 1', protocolo_sitac='S-JA',
+        )
+
+    def executar(self, url, **kwargs):
+        configuracao = ConfiguracaoSitac(
+            url=url, concorrencia=kwargs.pop('concorrencia', 3), tentativas=kwargs.pop('tentativas', 3),
+            espera_base=0.01, limite_falhas=kwargs.pop('limite_falhas', 5),
+            max_bytes=kwargs.pop('max_bytes', 1024 * 1024),
+        )
+
+        async def tarefa():
+            async with ClienteSitac(configuracao) as cliente:
+                return await preencher_protocolos_sitac(cliente, **kwargs)
+
+        return async_to_sync(tarefa)()
+
+    def test_preenche_em_lotes_reaproveitando_conexoes(self):
+        """Testa o preenchimento em lotes com concorrência limitada e conexões reaproveitadas"""
+        with StubSitac({f'P{i}': f'S-{i}' for i in range(8)}) as stub:
+            resultado = self.executar(stub.url, tamanho_lote=4)
+        self.assertEqual((resultado.consultados, resultado.preenchidos, resultado.nao_encontrados), (10, 8, 2))
+        self.assertEqual(stub.requisicoes, 10)
+        self.assertLessEqual(len(stub.conexoes), 3)
+        self.assertEqual(Protocolo.objects.get(numero='P3').protocolo_sitac, 'S-3')
+        self.assertEqual(Protocolo.objects.get(numero='JA').protocolo_sitac, 'S-JA')
+        self.assertEqual(protocolos_pendentes().count(), 2)
+
+    def test_documento_enviado_so_com_digitos(self):
+        """Testa que o CPF/CNPJ formatado vai ao SITAC só com os dígitos"""
+        Protocolo.objects.create(numero='FMT', cpf_cnpj='123.456.789-01', local_armazenamento='CAIXA 1')
+        with StubSitac({'FMT': 'S-FMT'}) as stub:
+            self.executar(stub.url)
+        self.assertEqual(stub.consultas['FMT'], 'cpf_cnpj=12345678901')
+        self.assertEqual(Protocolo.objects.get(numero='FMT').protocolo_sitac, 'S-FMT')
+
+    def test_limite_do_corpo_da_resposta(self):
+        """Testa que respostas maiores que o limite viram falha, qualquer que seja a transferência"""
+        for transferencia in ('tamanho', 'chunked', 'fechar'):
+            with self.subTest(transferencia=transferencia):
+                Protocolo.objects.filter(numero='P0').update(protocolo_sitac='')
+                with StubSitac({'P0': 'S-0'}, transferencia=transferencia, enchimento=1000) as stub:
+                    resultado = self.executar(stub.url, limite=1, max_bytes=500)
+                self.assertEqual((resultado.consultados, resultado.falhas), (1, 1))
+
+                with StubSitac({'P0': 'S-0'}, transferencia=transferencia) as stub:
+                    resultado = self.executar(stub.url, limite=1, max_bytes=500)
+                self.assertEqual(resultado.preenchidos, 1)
+
+    def test_repete_falhas_transitorias(self):
+        """Testa as novas tentativas após respostas 503"""
+        with StubSitac({'P0': 'S-0'}, falhas=2) as stub:
+            resultado = self.executar(stub.url, limite=1, concorrencia=1)
+        self.assertEqual(resultado.preenchidos, 1)
+        self.assertEqual(stub.requisicoes, 3)
+
+    def test_disjuntor_interrompe(self):
+        """Testa que o disjuntor aberto interrompe as consultas"""
+        with StubSitac({}, falhas=1000) as stub:
+            resultado = self.executar(stub.url, concorrencia=1, tentativas=2, limite_falhas=2)
+        self.assertTrue(resultado.interrompido)
+        self.assertLessEqual(stub.requisicoes, 3)
+        self.assertEqual(protocolos_pendentes().count(), 10)
+
+    def test_estados_do_disjuntor(self):
+        """Testa a transição fechado → aberto → meio aberto → fechado"""
+        agora = [0]
+        disjuntor = Disjuntor(limite_falhas=2, tempo_aberto=30, relogio=lambda: agora[0])
+        disjuntor.falha()
+        disjuntor.permitir()
+        disjuntor.falha()
+        self.assertEqual(disjuntor.estado, 'aberto')
+        with self.assertRaises(CircuitoAberto):
+            disjuntor.permitir()
+        agora[0] = 31
+        disjuntor.permitir()
+        with self.assertRaises(CircuitoAberto):
+            disjuntor.permitir()
+        disjuntor.sucesso()
+        self.assertEqual(disjuntor.estado, 'fechado')
+
+    def test_comando(self):
+        """Testa o comando que preenche os protocolos pendentes"""
+        with StubSitac({'P1': 'S-1'}) as stub, override_settings(SITAC_URL=stub.url):
+            saida = io.StringIO()
+            call_command('preencher_protocolos_sitac', '--lote', '5', stdout=saida)
+        self.assertIn('10 protocolo(s) consultado(s): 1 preenchido(s)', saida.getvalue())
+
+
+class BuscaDocumentoProtocoloTest(TestCase):
+    def setUp(self):
+        self.cpf = Protocolo.objects.create(
+            numero='DOC1', cpf_cnpj='123.456.789-01', local_armazenamento='CAIXA 1, FILEIRA 1, FACE A',
+        )
+        self.cnpj = Protocolo.objects.create(
+            numero='DOC2', cpf_cnpj='12345678000195', local_armazenamento='CAIXA 2, FILEIRA 1, FACE A',
+        )
+        self.numerico = Protocolo.objects.create(
+            numero='98765', cpf_cnpj='98765432100', local_armazenamento='CAIXA 3',
+        )
+
+    def buscar(self, q):
+        return set(filtrar_protocolos(ler_filtros({'q': q})).values_list('numero', flat=True))
+
+    def test_digitos_mantidos_no_save(self):
+        """Testa a forma canônica do CPF/CNPJ gravada no save"""
+        self.assertEqual(self.cpf.cpf_cnpj_digitos, '12345678901')
+        self.cpf.cpf_cnpj = '111.222.333-44'
+        self.cpf.save(update_fields=['cpf_cnpj'])
+        self.cpf.refresh_from_db()
+        self.assertEqual(self.cpf.cpf_cnpj_digitos, '11122233344')
+
+    def test_busca_exata_formatada_ou_nao(self):
+        """Testa que o documento é encontrado com ou sem pontuação"""
+        self.assertEqual(self.buscar('12345678901'), {'DOC1'})
+        self.assertEqual(self.buscar('123.456.789-01'), {'DOC1'})
+        self.assertEqual(self.buscar('12.345.678/0001-95'), {'DOC2'})
+
+    def test_busca_por_prefixo(self):
+        """Testa a busca pelo início do documento"""
+        self.assertEqual(self.buscar('12345'), {'DOC1', 'DOC2'})
+        self.assertEqual(self.buscar('123.456.789'), {'DOC1'})
+
+    def test_numero_do_protocolo_numerico(self):
+        """Testa que termos numéricos também encontram o número exato do protocolo"""
+        self.assertEqual(self.buscar('98765'), {'98765'})
+
+    def test_parte_do_numero_do_protocolo(self):
+        """Testa que termos numéricos encontram parte do número do protocolo"""
+        Protocolo.objects.filter(numero='98765').update(numero='000123/2024')
+        self.assertEqual(self.buscar('000123'), {'000123/2024'})
+        self.assertEqual(self.buscar('2024'), {'000123/2024'})
+        self.assertEqual(self.buscar('123/2024'), {'000123/2024'})
+
+    def test_rota_indexada(self):
+        """Testa que termos numéricos não usam icontains"""
+        sql = str(filtrar_protocolos(ler_filtros({'q': '123.456'})).query)
+        self.assertIn('cpf_cnpj_digitos', sql)
+        self.assertNotIn('UPPER', sql)
+        self.assertEqual(self.buscar('FILEIRA 1'), {'DOC1', 'DOC2'})
+
+    def test_migracao_normaliza_em_lotes(self):
+        """Testa a normalização dos registros existentes feita pela migração"""
+        Protocolo.objects.update(cpf_cnpj_digitos='')
+        migracao = import_module('protocolos.migrations.0005_cpf_cnpj_digitos')
+        migracao.normalizar_documentos(apps, None)
+        self.assertEqual(
+            dict(Protocolo.objects.values_list('numero', 'cpf_cnpj_digitos')),
+            {'DOC1': '12345678901', 'DOC2': '12345678000195', '98765': '98765432100'},
+        )
+
+
+@override_settings(PROTOCOLOS_CAPACIDADE_CAIXA=3)
+class LocalizacaoProtocoloTest(TestCase):
+    def setUp(self):
+        locais = [
+            'CAIXA 12, FILEIRA 3, FACE B',
+            'CAIXA 12, FILEIRA 3, FACE B',
+            'Caixa 12, fileira 4, face a',
+            'CX. 2, FIL 1, FACE A',
+            'Armário da recepção',
+        ]
+        for i, local in enumerate(locais):
+            Protocolo.objects.create(numero=f'L{i}', cpf_cnpj='12345678901', local_armazenamento=local)
+
+    def test_componentes_no_save(self):
+        """Testa a interpretação do local de armazenamento no save"""
+        protocolo = Protocolo.objects.get(numero='L2')
+        self.assertEqual((protocolo.caixa, protocolo.fileira, protocolo.face), (12, 4, 'A'))
+        self.assertEqual(interpretar_local('Caixa nº 7'), (7, None, ''))
+        protocolo.local_armazenamento = 'CAIXA 5, FILEIRA 1, FACE C'
+        protocolo.save(update_fields=['local_armazenamento'])
+        protocolo.refresh_from_db()
+        self.assertEqual((protocolo.caixa, protocolo.fileira, protocolo.face), (5, 1, 'C'))
+
+    def test_numero_grande_demais_e_ignorado(self):
+        """Testa que caixa/fileira fora do limite da coluna ficam vazias em vez de falhar"""
+        protocolo = Protocolo.objects.create(
+            numero='L9', cpf_cnpj='12345678901',
+            local_armazenamento='CAIXA 20240001234, FILEIRA 99999999999999999999, FACE A',
+        )
+        protocolo.refresh_from_db()
+        self.assertEqual((protocolo.caixa, protocolo.fileira, protocolo.face), (None, None, 'A'))
+        self.assertEqual(interpretar_local('CAIXA 2147483647'), (2147483647, None, ''))
+        self.assertEqual(interpretar_local('CAIXA 2147483648'), (None, None, ''))
+
+    def test_filtros_exatos(self):
+        """Testa os filtros por caixa, fileira e face"""
+        def buscar(**params):
+            return set(filtrar_protocolos(ler_filtros(params)).values_list('numero', flat=True))
+
+        self.assertEqual(buscar(caixa='12'), {'L0', 'L1', 'L2'})
+        self.assertEqual(buscar(caixa='12', face='b'), {'L0', 'L1'})
+        self.assertEqual(buscar(fileira='1'), {'L3'})
+        self.assertEqual(buscar(caixa='abc'), {f'L{i}' for i in range(5)})
+
+    def test_totais_por_caixa_em_uma_consulta(self):
+        """Testa os totais por caixa calculados em uma consulta agrupada"""
+        with self.assertNumQueries(1):
+            caixas = totais_por_caixa()
+        por_caixa = {item['caixa']: item for item in caixas}
+        self.assertEqual([item['caixa'] for item in caixas], [2, 12, None])
+        self.assertEqual(por_caixa[12]['total'], 3)
+        self.assertEqual(por_caixa[12]['fileiras'], 2)
+        self.assertTrue(por_caixa[12]['cheia'])
+        self.assertFalse(por_caixa[2]['cheia'])
+        self.assertEqual([item['caixa'] for item in totais_por_caixa(somente_cheias=True)], [12])
+
+    def test_view(self):
+        """Testa a página do arquivo físico com as posições da caixa"""
+        response = self.client.get(reverse('protocolos:localizacao'), {'caixa': '12'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(p['fileira'], p['face'], p['total']) for p in response.context['posicoes']],
+            [(3, 'B', 2), (4, 'A', 1)],
+        )
+        self.assertContains(response, 'Não identificada')
+
+    def test_comando_preenche(self):
+        """Testa o comando que preenche os componentes dos registros antigos"""
+        Protocolo.objects.update(caixa=None, fileira=None, face='')
+        saida = io.StringIO()
+        call_command('preencher_localizacao', '--lote', '2', stdout=saida)
+        self.assertIn('4 atualizado(s)', saida.getvalue())
+        self.assertEqual(Protocolo.objects.filter(caixa=12).count(), 3)
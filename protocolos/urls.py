@@ -1,11 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = "protocolos"
 
 urlpatterns = [
-    path("", views.protocolo_list, name="lista"),
+    # View assíncrona sob ASGI (settings.VIEWS_ASYNC)
+    path("", views.protocolo_list_async if settings.VIEWS_ASYNC else views.protocolo_list, name="lista"),
+    path("localizacao/", views.protocolo_localizacao, name="localizacao"),
     path("protocolo/<int:pk>/", views.protocolo_detail, name="detalhe"),
     path("protocolo/criar/", views.protocolo_create, name="criar"),
+    path("protocolo/exportar/", views.protocolo_export, name="exportar"),
+    path("protocolo/importar/", views.protocolo_import, name="importar"),
+    path("protocolo/importar/relatorio/<str:relatorio>/", views.protocolo_import_relatorio, name="relatorio_importacao"),
     path("protocolo/<int:pk>/editar/", views.protocolo_edit, name="editar"),
 ]
@@ -1,18 +1,21 @@
-from django.core.paginator import Paginator
-from django.db.models import Q
 from django.shortcuts import render, get_object_or_404, redirect
-from django.utils.dateparse import parse_date
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from core.exportacao import FORMATOS, resposta_exportacao
+from core.paginacao import apaginar, paginar
 from .models import Protocolo
-from .forms import ProtocoloForm
+from .forms import ImportacaoForm, ProtocoloForm
+from .filtros import filtrar_protocolos, ler_filtros
+from .exportacao import COLUNAS_EXPORTACAO, registros_protocolos
+from .localizacao import capacidade_caixa, totais_por_caixa, totais_por_posicao
+from .importacao import ErroImportacao, caminho_relatorio, formato_do_arquivo, importar_protocolos, salvar_relatorio
 
-def protocolo_list(request):
-    """Lista todos os protocolos com filtros e paginação"""
-    q = request.GET.get("q", "").strip()
-    tipo = request.GET.get("tipo", "")
-    data_inicio = request.GET.get("data_inicio", "")
-    data_fim = request.GET.get("data_fim", "")
+# Ordenação da listagem usada na paginação por cursor (índice protocolo_listagem_idx)
+ORDENACAO_LISTA = [("data_emissao", True), ("criado_em", True), ("id", False)]
+
+def ler_itens_por_pagina(request):
     itens_por_pagina = request.GET.get("itens_por_pagina", "10")
     
     try:
@@ -21,55 +24,129 @@ def protocolo_list(request):
             itens_por_pagina = 10
     except ValueError:
         itens_por_pagina = 10
-    
-    # Base queryset - todos os protocolos
-    qs = Protocolo.objects.all()
-    
-    if q:
-        qs = qs.filter(
-            Q(numero__icontains=q) |
-            Q(cpf_cnpj__icontains=q) |
-            Q(local_armazenamento__icontains=q) |
-            Q(observacoes__icontains=q)
-        )
-    
-    if tipo:
-        qs = qs.filter(tipo=tipo)
-    
-    # Filtros de data
-    if data_inicio:
-        try:
-            data_inicio_parsed = parse_date(data_inicio)
-            if data_inicio_parsed:
-                qs = qs.filter(data_emissao__gte=data_inicio_parsed)
-        except (ValueError, TypeError):
-            pass
-    
-    if data_fim:
-        try:
-            data_fim_parsed = parse_date(data_fim)
-            if data_fim_parsed:
-                qs = qs.filter(data_emissao__lte=data_fim_parsed)
-        except (ValueError, TypeError):
-            pass
-    
-    paginator = Paginator(qs, itens_por_pagina)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
+    return itens_por_pagina
+
+def _contexto_lista(request, filtros, itens_por_pagina, page_obj):
+    return {
         "page_obj": page_obj,
-        "q": q,
-        "tipo": tipo,
-        "data_inicio": data_inicio,
-        "data_fim": data_fim,
+        **filtros,
         "itens_por_pagina": itens_por_pagina,
         "tipos": Protocolo.TIPO_CHOICES,
         "opcoes_paginacao": [10, 50, 100],
-        "user_can_edit": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_edit,
-        "user_can_publish": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_publish,
+        "user_can_edit": request.permissoes.pode_editar,
+        "user_can_publish": request.permissoes.pode_publicar,
+        "user_can_export": request.permissoes.pode_exportar,
+        "user_can_import": request.permissoes.staff,
+    }
+
+def protocolo_list(request):
+    """Lista todos os protocolos com filtros e paginação"""
+    filtros = ler_filtros(request.GET)
+    itens_por_pagina = ler_itens_por_pagina(request)
+    
+    # Todos os protocolos, com os filtros (protocolos.filtros)
+    qs = filtrar_protocolos(filtros)
+    
+    page_obj = paginar(request, qs, itens_por_pagina, ordenacao=ORDENACAO_LISTA)
+    return render(request, "protocolos/lista.html", _contexto_lista(request, filtros, itens_por_pagina, page_obj))
+
+async def protocolo_list_async(request):
+    """``protocolo_list`` para ASGI: banco e cache acessados de forma assíncrona"""
+    filtros = ler_filtros(request.GET)
+    itens_por_pagina = ler_itens_por_pagina(request)
+    
+    qs = filtrar_protocolos(filtros)
+    page_obj = await apaginar(request, qs, itens_por_pagina, ordenacao=ORDENACAO_LISTA)
+    return render(request, "protocolos/lista.html", _contexto_lista(request, filtros, itens_por_pagina, page_obj))
+
+def protocolo_localizacao(request):
+    """Arquivo físico: protocolos por caixa e, na caixa escolhida, por fileira e face"""
+    somente_cheias = request.GET.get("cheias") == "1"
+    caixa = request.GET.get("caixa", "")
+    try:
+        caixa = int(caixa) if caixa else None
+    except ValueError:
+        caixa = None
+    
+    context = {
+        "caixas": totais_por_caixa(somente_cheias=somente_cheias),
+        "caixa": caixa,
+        "posicoes": totais_por_posicao(caixa) if caixa is not None else None,
+        "somente_cheias": somente_cheias,
+        "capacidade": capacidade_caixa(),
+    }
+    return render(request, "protocolos/localizacao.html", context)
+
+@login_required
+def protocolo_export(request):
+    """Exporta a listagem filtrada de protocolos (CSV, NDJSON ou XLSX)"""
+    if not request.permissoes.pode_exportar:
+        messages.error(request, 'Você não tem permissão para exportar protocolos.')
+        return redirect('protocolos:lista')
+    
+    formato = request.GET.get("formato", "csv")
+    if formato not in FORMATOS:
+        messages.error(request, 'Formato de exportação inválido.')
+        return redirect('protocolos:lista')
+    
+    qs = filtrar_protocolos(ler_filtros(request.GET))
+    return resposta_exportacao("protocolos", formato, COLUNAS_EXPORTACAO, registros_protocolos(qs))
+
+@login_required
+def protocolo_import(request):
+    """Importa protocolos em lote a partir de uma planilha (CSV ou XLSX)"""
+    if not request.permissoes.staff:
+        messages.error(request, 'Você não tem permissão para importar protocolos.')
+        return redirect('protocolos:lista')
+    
+    resultado = None
+    relatorio = None
+    if request.method == 'POST':
+        form = ImportacaoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resultado = importar_protocolos(
+                    arquivo,
+                    formato_do_arquivo(arquivo.name),
+                    usuario=request.user,
+                    simular=form.cleaned_data['simular'],
+                )
+            except ErroImportacao as exc:
+                form.add_error('arquivo', str(exc))
+            else:
+                if resultado.erros:
+                    relatorio = salvar_relatorio(resultado)
+                if resultado.importadas and not resultado.simulacao:
+                    messages.success(request, f'{resultado.importadas} protocolo(s) importado(s).')
+    else:
+        form = ImportacaoForm()
+    
+    context = {
+        'form': form,
+        'resultado': resultado,
+        'relatorio': relatorio,
+        'title': 'Importar Protocolos'
     }
-    return render(request, "protocolos/lista.html", context)
+    return render(request, 'protocolos/importar.html', context)
+
+@login_required
+def protocolo_import_relatorio(request, relatorio):
+    """Download do relatório de erros de uma importação"""
+    if not request.permissoes.staff:
+        raise Http404
+    try:
+        caminho = caminho_relatorio(relatorio)
+    except ErroImportacao:
+        raise Http404
+    if not default_storage.exists(caminho):
+        raise Http404
+    return FileResponse(
+        default_storage.open(caminho, 'rb'),
+        as_attachment=True,
+        filename='erros_importacao.csv',
+        content_type='text/csv; charset=utf-8',
+    )
 
 def protocolo_detail(request, pk):
     """Visualiza detalhes de um protocolo específico"""
@@ -79,15 +156,15 @@ def protocolo_detail(request, pk):
     
     context = {
         "protocolo": protocolo,
-        "user_can_edit": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_edit,
-        "user_can_publish": request.user.is_authenticated and hasattr(request.user, 'perfil') and request.user.perfil.can_publish,
+        "user_can_edit": request.permissoes.pode_editar,
+        "user_can_publish": request.permissoes.pode_publicar,
     }
     return render(request, "protocolos/detalhe.html", context)
 
 @login_required
 def protocolo_create(request):
     """View para criar novo protocolo"""
-    if not hasattr(request.user, 'perfil') or not request.user.perfil.can_publish:
+    if not request.permissoes.pode_publicar:
         messages.error(request, 'Você não tem permissão para criar protocolos.')
         return redirect('protocolos:lista')
     
@@ -115,14 +192,12 @@ def protocolo_edit(request, pk):
     protocolo = get_object_or_404(Protocolo, pk=pk)
     
     # Verifica permissões
-    if not hasattr(request.user, 'perfil'):
+    if not request.permissoes.tem_perfil:
         messages.error(request, 'Perfil não encontrado.')
         return redirect('protocolos:lista')
     
-    perfil = request.user.perfil
-    
     # Apenas criador ou usuários com permissão de edição podem editar
-    if not (perfil.can_edit or protocolo.criado_por == request.user):
+    if not (request.permissoes.pode_editar or protocolo.criado_por_id == request.user.pk):
         messages.error(request, 'Você não tem permissão para editar este protocolo.')
         return redirect('protocolos:detalhe', pk=protocolo.pk)
     
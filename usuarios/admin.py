@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
 from .models import PerfilUsuario
+from .permissoes import invalidar_permissoes
 
 @admin.register(PerfilUsuario)
 class PerfilUsuarioAdmin(admin.ModelAdmin):
@@ -50,9 +51,17 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
         'promover_para_admin', 'promover_para_publicador', 'promover_para_editor'
     ]
 
+    def atualizar_perfis(self, queryset, **campos):
+        """Atualiza os perfis em massa e invalida as permissões em cache"""
+        usuario_ids = list(queryset.values_list('user_id', flat=True))
+        updated = queryset.update(**campos)
+        invalidar_permissoes(usuario_ids)
+        return updated
+
     def aprovar_usuarios(self, request, queryset):
         from django.utils import timezone
-        updated = queryset.update(
+        updated = self.atualizar_perfis(
+            queryset,
             conta_aprovada=True,
             data_aprovacao=timezone.now(),
             aprovado_por=request.user
@@ -61,31 +70,31 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
     aprovar_usuarios.short_description = "✅ Aprovar contas selecionadas"
 
     def rejeitar_usuarios(self, request, queryset):
-        updated = queryset.update(conta_aprovada=False, data_aprovacao=None, aprovado_por=None)
+        updated = self.atualizar_perfis(queryset, conta_aprovada=False, data_aprovacao=None, aprovado_por=None)
         self.message_user(request, f'{updated} perfil(is) de usuário(s) rejeitado(s).')
     rejeitar_usuarios.short_description = "❌ Rejeitar contas selecionadas"
 
     def permitir_publicar_atas(self, request, queryset):
-        updated = queryset.update(pode_publicar=True)
+        updated = self.atualizar_perfis(queryset, pode_publicar=True)
         self.message_user(request, f'{updated} usuário(s) agora podem publicar atas.')
     permitir_publicar_atas.short_description = "📝 Permitir publicar atas"
 
     def revogar_publicar_atas(self, request, queryset):
-        updated = queryset.update(pode_publicar=False)
+        updated = self.atualizar_perfis(queryset, pode_publicar=False)
         self.message_user(request, f'{updated} usuário(s) não podem mais publicar atas.')
     revogar_publicar_atas.short_description = "🚫 Revogar permissão de publicar atas"
 
     def promover_para_admin(self, request, queryset):
-        updated = queryset.update(permissao='admin', pode_publicar=True)
+        updated = self.atualizar_perfis(queryset, permissao='admin', pode_publicar=True)
         self.message_user(request, f'{updated} usuário(s) promovido(s) para Administrador.')
     promover_para_admin.short_description = "👑 Promover para Administrador"
 
     def promover_para_publicador(self, request, queryset):
-        updated = queryset.update(permissao='publicador', pode_publicar=True)
+        updated = self.atualizar_perfis(queryset, permissao='publicador', pode_publicar=True)
         self.message_user(request, f'{updated} usuário(s) promovido(s) para Publicador.')
     promover_para_publicador.short_description = "📝 Promover para Publicador"
 
     def promover_para_editor(self, request, queryset):
-        updated = queryset.update(permissao='editor')
+        updated = self.atualizar_perfis(queryset, permissao='editor')
         self.message_user(request, f'{updated} usuário(s) promovido(s) para Editor.')
     promover_para_editor.short_description = "✏️ Promover para Editor"
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UsuariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'usuarios'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from . import checks  # noqa: F401 (registra as verificações)
+        from .permissoes import invalidar_ao_alterar
+        invalidar_ao_alterar(self.get_model('PerfilUsuario'), get_user_model())
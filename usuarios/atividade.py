@@ -0,0 +1,171 @@
+"""
+Último acesso dos usuários sem uma escrita no banco por requisição.
+
+``AtividadeMiddleware`` registra no cache o acesso de cada usuário autenticado,
+no máximo uma vez a cada ``ATIVIDADE_INTERVALO`` segundos por usuário; acessos
+seguidos do mesmo usuário se resumem ao horário mais recente. Quando o acesso
+pendente mais antigo passa de ``ATIVIDADE_GRAVACAO`` segundos (ou pelo comando
+``gravar_acessos``) os pendentes vão para o banco em um único
+``UPDATE ... FROM (VALUES ...)``, que só altera ``PerfilUsuario.ultimo_acesso``
+(sem ``save()``, ``atualizado_em`` e sinais) e nunca volta o horário para trás.
+
+O índice dos pendentes é lido e regravado no cache, como os histogramas de
+``core.instrumentacao``: um acesso registrado durante a gravação, ou por dois
+processos ao mesmo tempo, pode ficar para o próximo registro do mesmo
+usuário. Por isso o horário de cada acesso expira (``_validade``) em vez de
+ficar no cache para sempre quando sai do índice.
+
+O comando ``gravar_acessos`` roda em outro processo e só enxerga os
+pendentes com um cache compartilhado (Redis/Memcached).
+"""
+import operator
+import time
+from functools import reduce
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import PerfilUsuario
+
+CHAVE_PENDENTES = "atividade:pendentes"
+CHAVE_DESDE = "atividade:desde"
+CHAVE_GRAVACAO = "atividade:gravacao"
+
+
+def _intervalo():
+    return getattr(settings, "ATIVIDADE_INTERVALO", 300)
+
+
+def _gravacao():
+    return getattr(settings, "ATIVIDADE_GRAVACAO", 60)
+
+
+def _validade():
+    """Tempo no cache de um acesso ainda não gravado"""
+    return max(10 * _gravacao(), 600)
+
+
+def _chave_recente(usuario_id):
+    return f"atividade:recente:{usuario_id}"
+
+
+def _chave_acesso(usuario_id):
+    return f"atividade:acesso:{usuario_id}"
+
+
+def _hora_de_gravar(desde):
+    return desde is not None and time.time() - desde >= _gravacao()
+
+
+def registrar_acesso(usuario_id, forcar=False):
+    """
+    Guarda no cache o acesso do usuário e grava os pendentes se for a hora.
+
+    Com ``forcar`` (login) o acesso é guardado mesmo dentro do intervalo.
+    """
+    recente = _chave_recente(usuario_id)
+    if forcar:
+        cache.set(recente, True, _intervalo())
+    elif not cache.add(recente, True, _intervalo()):
+        return
+    cache.set(_chave_acesso(usuario_id), timezone.now(), _validade())
+    pendentes = cache.get(CHAVE_PENDENTES) or set()
+    if usuario_id not in pendentes:
+        cache.set(CHAVE_PENDENTES, pendentes | {usuario_id}, None)
+    cache.add(CHAVE_DESDE, time.time(), None)
+    if _hora_de_gravar(cache.get(CHAVE_DESDE)) and cache.add(CHAVE_GRAVACAO, True, _gravacao()):
+        gravar_acessos()
+
+
+async def aregistrar_acesso(usuario_id, forcar=False):
+    recente = _chave_recente(usuario_id)
+    if forcar:
+        await cache.aset(recente, True, _intervalo())
+    elif not await cache.aadd(recente, True, _intervalo()):
+        return
+    await cache.aset(_chave_acesso(usuario_id), timezone.now(), _validade())
+    pendentes = await cache.aget(CHAVE_PENDENTES) or set()
+    if usuario_id not in pendentes:
+        await cache.aset(CHAVE_PENDENTES, pendentes | {usuario_id}, None)
+    await cache.aadd(CHAVE_DESDE, time.time(), None)
+    if _hora_de_gravar(await cache.aget(CHAVE_DESDE)) and await cache.aadd(CHAVE_GRAVACAO, True, _gravacao()):
+        await sync_to_async(gravar_acessos)()
+
+
+def _atualizar(acessos):
+    """Um UPDATE para ``{usuario_id: horário}``; retorna os perfis alterados"""
+    if connection.vendor == "postgresql":
+        tabela = connection.ops.quote_name(PerfilUsuario._meta.db_table)
+        valores = ", ".join(["(%s::integer, %s::timestamptz)"] * len(acessos))
+        sql = (
+            f"UPDATE {tabela} AS perfil SET ultimo_acesso = acesso.quando "
+            f"FROM (VALUES {valores}) AS acesso (user_id, quando) "
+            "WHERE perfil.user_id = acesso.user_id "
+            "AND (perfil.ultimo_acesso IS NULL OR perfil.ultimo_acesso < acesso.quando)"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [valor for acesso in acessos.items() for valor in acesso])
+            return cursor.rowcount
+
+    # Demais bancos: o mesmo UPDATE único com CASE
+    condicoes = [
+        (Q(user_id=usuario_id) & (Q(ultimo_acesso__isnull=True) | Q(ultimo_acesso__lt=quando)), quando)
+        for usuario_id, quando in acessos.items()
+    ]
+    return PerfilUsuario.objects.filter(reduce(operator.or_, (condicao for condicao, _ in condicoes))).update(
+        ultimo_acesso=Case(
+            *(When(condicao, then=Value(quando)) for condicao, quando in condicoes),
+            default=F("ultimo_acesso"),
+        )
+    )
+
+
+def gravar_acessos(lote=1000):
+    """Grava no banco os acessos guardados no cache; retorna os perfis alterados"""
+    # Acessos registrados a partir daqui contam o intervalo de novo
+    cache.delete(CHAVE_DESDE)
+    pendentes = cache.get(CHAVE_PENDENTES) or set()
+    if not pendentes:
+        return 0
+    chaves = {_chave_acesso(usuario_id): usuario_id for usuario_id in pendentes}
+    acessos = {chaves[chave]: quando for chave, quando in cache.get_many(list(chaves)).items()}
+
+    ordenados = sorted(acessos.items())
+    alterados = 0
+    for inicio in range(0, len(ordenados), lote):
+        alterados += _atualizar(dict(ordenados[inicio:inicio + lote]))
+
+    cache.delete_many(list(chaves))
+    restantes = (cache.get(CHAVE_PENDENTES) or set()) - pendentes
+    cache.set(CHAVE_PENDENTES, restantes, None)
+    return alterados
+
+
+class AtividadeMiddleware:
+    """Registra o último acesso do usuário autenticado (depois da view, após o login)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if request.user.is_authenticated:
+            registrar_acesso(request.user.pk)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # request.user já resolvido pelo PermissoesMiddleware (ou pelo login)
+        if request.user.is_authenticated:
+            await aregistrar_acesso(request.user.pk)
+        return response
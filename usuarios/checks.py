@@ -0,0 +1,25 @@
+"""
+Verificações do ``manage.py check --deploy``.
+
+As permissões (``usuarios.permissoes``) e as versões usadas nas chaves de
+contagem, páginas, facetas e sugestões ficam no cache e são invalidadas pelo
+processo que fez a alteração. Com um cache local ao processo (LocMem), os
+demais workers continuam com os valores antigos até expirarem.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def cache_compartilhado(app_configs, **kwargs):
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend != "django.core.cache.backends.locmem.LocMemCache":
+        return []
+    return [Warning(
+        "O cache padrão é local a cada processo (LocMemCache): com mais de um worker, "
+        "permissões revogadas continuam valendo nos demais por até PERMISSOES_CACHE_TIMEOUT "
+        "e as páginas e contagens em cache não são invalidadas entre os processos.",
+        hint="Em produção com vários workers defina CACHE_BACKEND como Redis ou Memcached "
+             "(ex.: django.core.cache.backends.redis.RedisCache) e CACHE_LOCATION.",
+        id="usuarios.W001",
+    )]
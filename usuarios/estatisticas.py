@@ -0,0 +1,106 @@
+"""
+Estatísticas do dashboard.
+
+Todos os contadores de ementas saem de uma única consulta com agregações
+condicionais (``COUNT(*) FILTER (WHERE ...)``) e os de protocolos de outra.
+O resultado, junto com as ementas recentes, fica em cache com a versão das
+contagens de ``Ementa`` e ``Protocolo`` (``core.contagem``) na chave: os
+sinais de save/delete desses modelos trocam a versão e o próximo acesso
+recalcula. Com o cache quente o dashboard não faz nenhuma agregação.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from core.contagem import versao
+from ementas.models import Ementa
+from protocolos.models import Protocolo
+
+QUANTIDADE_RECENTES = 5
+
+
+def _timeout():
+    return getattr(settings, 'ESTATISTICAS_CACHE_TIMEOUT', 600)
+
+
+def _contar(*condicoes, **filtros):
+    return Count('pk', filter=Q(*condicoes, **filtros))
+
+
+def estatisticas_ementas():
+    """Contadores de ementas em uma única consulta"""
+    publicadas = Q(publicado=True)
+    agregados = {
+        'total': _contar(publicadas),
+        'publicas': _contar(publicado=True, sigiloso=False),
+        'sigilosas': _contar(publicado=True, sigiloso=True),
+        'nao_publicadas': _contar(publicado=False),
+    }
+    for valor, _ in Ementa.TIPO_ATO_CHOICES:
+        agregados[f'tipo_{valor}'] = _contar(publicadas, tipo_ato_normativo=valor)
+    for valor, _ in Ementa.SITUACAO_CHOICES:
+        agregados[f'situacao_{valor}'] = _contar(publicadas, situacao=valor)
+
+    resultado = Ementa.objects.aggregate(**agregados)
+    return {
+        'total': resultado['total'],
+        'publicas': resultado['publicas'],
+        'sigilosas': resultado['sigilosas'],
+        'nao_publicadas': resultado['nao_publicadas'],
+        'por_tipo': [
+            (valor, rotulo, resultado[f'tipo_{valor}'])
+            for valor, rotulo in Ementa.TIPO_ATO_CHOICES
+        ],
+        'por_situacao': [
+            (valor, rotulo, resultado[f'situacao_{valor}'])
+            for valor, rotulo in Ementa.SITUACAO_CHOICES
+        ],
+    }
+
+
+def estatisticas_protocolos():
+    """Contadores de protocolos em uma única consulta"""
+    agregados = {
+        'total': Count('pk'),
+        'com_sitac': _contar(protocolo_sitac__gt=''),
+    }
+    for valor, _ in Protocolo.TIPO_CHOICES:
+        agregados[f'tipo_{valor}'] = _contar(tipo=valor)
+
+    resultado = Protocolo.objects.aggregate(**agregados)
+    return {
+        'total': resultado['total'],
+        'com_sitac': resultado['com_sitac'],
+        'por_tipo': [
+            (valor, rotulo, resultado[f'tipo_{valor}'])
+            for valor, rotulo in Protocolo.TIPO_CHOICES
+        ],
+    }
+
+
+def ementas_recentes():
+    """Últimas ementas públicas, só com os campos exibidos no dashboard"""
+    return list(
+        Ementa.objects.filter(publicado=True, sigiloso=False)
+        .only('id', 'numero', 'titulo', 'tipo_ato_normativo', 'situacao',
+              'sigiloso', 'ementa', 'criado_em')
+        .order_by('-criado_em')[:QUANTIDADE_RECENTES]
+    )
+
+
+def _chave():
+    return f'dashboard:estatisticas:{versao(Ementa)}:{versao(Protocolo)}'
+
+
+def obter_estatisticas():
+    """Estatísticas do dashboard, do cache quando possível"""
+    chave = _chave()
+    estatisticas = cache.get(chave)
+    if estatisticas is None:
+        estatisticas = {
+            'ementas': estatisticas_ementas(),
+            'protocolos': estatisticas_protocolos(),
+            'recentes': ementas_recentes(),
+        }
+        cache.set(chave, estatisticas, _timeout())
+    return estatisticas
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from usuarios.atividade import gravar_acessos
+
+
+class Command(BaseCommand):
+    help = "Grava no banco o último acesso dos usuários guardado no cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=1000,
+            help="Quantidade de perfis por UPDATE (padrão: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        lote = options["lote"]
+        if lote < 1:
+            raise CommandError("O tamanho do lote deve ser maior que zero.")
+
+        total = gravar_acessos(lote=lote)
+        self.stdout.write(self.style.SUCCESS(f"Último acesso gravado em {total} perfil(is)."))
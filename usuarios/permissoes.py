@@ -0,0 +1,148 @@
+"""
+Permissões do usuário resolvidas uma vez por requisição.
+
+``PermissoesMiddleware`` coloca em ``request.permissoes`` um objeto imutável
+com as permissões do usuário, calculado a partir do ``PerfilUsuario`` (já
+carregado junto com o usuário por ``usuarios.backends.PerfilBackend``) e
+guardado em cache. O cache é invalidado quando o perfil ou o usuário são
+alterados, inclusive pelas ações em massa do admin.
+
+Sob ASGI o middleware resolve o usuário e as permissões de forma assíncrona
+antes da view, para que nada consulte o banco de forma síncrona depois.
+"""
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import SimpleLazyObject
+
+from .models import PerfilUsuario
+
+
+@dataclass(frozen=True)
+class Permissoes:
+    """Permissões efetivas de um usuário"""
+    usuario_id: int | None = None
+    tem_perfil: bool = False
+    aprovado: bool = False
+    pode_editar: bool = False
+    pode_publicar: bool = False
+    staff: bool = False
+
+    @property
+    def autenticado(self):
+        return self.usuario_id is not None
+
+    @property
+    def pode_exportar(self):
+        return self.staff or self.pode_editar
+
+
+ANONIMO = Permissoes()
+
+
+def _timeout():
+    return getattr(settings, 'PERMISSOES_CACHE_TIMEOUT', 300)
+
+
+def _chave(usuario_id):
+    return f'permissoes:{usuario_id}'
+
+
+def calcular_permissoes(user):
+    """Calcula as permissões a partir do usuário e do seu perfil"""
+    if not user.is_authenticated:
+        return ANONIMO
+    try:
+        perfil = user.perfil
+    except PerfilUsuario.DoesNotExist:
+        perfil = None
+    return Permissoes(
+        usuario_id=user.pk,
+        tem_perfil=perfil is not None,
+        aprovado=perfil is not None and perfil.is_approved,
+        pode_editar=perfil is not None and perfil.can_edit,
+        pode_publicar=perfil is not None and perfil.can_publish,
+        staff=user.is_staff,
+    )
+
+
+def obter_permissoes(user):
+    """Permissões do usuário, usando o cache quando possível"""
+    if not user.is_authenticated:
+        return ANONIMO
+    chave = _chave(user.pk)
+    permissoes = cache.get(chave)
+    if permissoes is None:
+        permissoes = calcular_permissoes(user)
+        cache.set(chave, permissoes, _timeout())
+    return permissoes
+
+
+async def aobter_permissoes(user):
+    if not user.is_authenticated:
+        return ANONIMO
+    chave = _chave(user.pk)
+    permissoes = await cache.aget(chave)
+    if permissoes is None:
+        permissoes = await sync_to_async(calcular_permissoes)(user)
+        await cache.aset(chave, permissoes, _timeout())
+    return permissoes
+
+
+def invalidar_permissoes(usuario_ids):
+    """Remove do cache as permissões dos usuários informados"""
+    cache.delete_many([_chave(usuario_id) for usuario_id in usuario_ids])
+
+
+def permissoes_da_requisicao(request):
+    """Permissões da requisição, mesmo fora do middleware"""
+    permissoes = getattr(request, 'permissoes', None)
+    if permissoes is None:
+        permissoes = obter_permissoes(request.user)
+    return permissoes
+
+
+def invalidar_ao_alterar(perfil_model, user_model):
+    """Conecta a invalidação do cache aos sinais do perfil e do usuário"""
+    def receptor_perfil(sender, instance, **kwargs):
+        invalidar_permissoes([instance.user_id])
+
+    def receptor_usuario(sender, instance, **kwargs):
+        invalidar_permissoes([instance.pk])
+
+    for sinal in (post_save, post_delete):
+        sinal.connect(receptor_perfil, sender=perfil_model, weak=False,
+                      dispatch_uid=f'permissoes:perfil:{sinal}')
+        sinal.connect(receptor_usuario, sender=user_model, weak=False,
+                      dispatch_uid=f'permissoes:usuario:{sinal}')
+
+
+class PermissoesMiddleware:
+    """Disponibiliza ``request.permissoes`` (calculado apenas se usado)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.permissoes = SimpleLazyObject(lambda: obter_permissoes(request.user))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Usuário com o perfil (PerfilBackend.aget_user) no lugar do objeto preguiçoso
+        request.user = await request.auser()
+        request.permissoes = await aobter_permissoes(request.user)
+        return await self.get_response(request)
+
+
+def contexto_permissoes(request):
+    """Context processor com as permissões da requisição"""
+    return {'permissoes': permissoes_da_requisicao(request)}
@@ -1,3 +1,358 @@
-from django.test import TestCase
+import datetime
+from io import StringIO
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.banco import configurar_conexoes, estatisticas_pool
+from core.instrumentacao import agregador, histogramas, impressao_digital
+from ementas.models import Ementa
+from ementas.tests import views_assincronas
+from protocolos.models import Protocolo
+
+from .admin import PerfilUsuarioAdmin
+from .atividade import CHAVE_PENDENTES, gravar_acessos, registrar_acesso
+from .backends import PerfilBackend
+from .checks import cache_compartilhado
+from .estatisticas import obter_estatisticas
+from .models import PerfilUsuario
+from .permissoes import ANONIMO, aobter_permissoes, obter_permissoes
+
+
+class PermissoesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='editor', password='senha12345')
+        self.perfil = PerfilUsuario.objects.create(
+            user=self.user, cpf='000.000.000-00', permissao='editor', conta_aprovada=True,
+        )
+
+    def test_permissoes_do_perfil(self):
+        """Testa o cálculo das permissões a partir do perfil"""
+        permissoes = obter_permissoes(self.user)
+        self.assertTrue(permissoes.autenticado)
+        self.assertTrue(permissoes.pode_editar)
+        self.assertFalse(permissoes.pode_publicar)
+
+    def test_usuario_sem_perfil(self):
+        """Testa que usuários sem perfil não recebem permissões"""
+        outro = get_user_model().objects.create_user(username='outro', password='senha12345')
+        permissoes = obter_permissoes(outro)
+        self.assertTrue(permissoes.autenticado)
+        self.assertFalse(permissoes.tem_perfil)
+        self.assertFalse(permissoes.pode_editar)
+
+    def test_requisicao_nao_consulta_o_perfil(self):
+        """Testa que o perfil vem junto com o usuário e as permissões do cache"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('ementas:lista'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('ementas:lista'))
+        self.assertTrue(response.context['user_can_edit'])
+        self.assertTrue(response.context['permissoes'].pode_editar)
+        self.assertFalse(any(
+            'FROM "usuarios_perfilusuario"' in q['sql'] for q in queries.captured_queries
+        ))
+
+    def test_sessao_anterior_ao_perfil_backend(self):
+        """Testa que sessões abertas com o ModelBackend continuam válidas"""
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('ementas:lista'))
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertTrue(response.context['user_can_edit'])
+
+    def test_requisicao_assincrona(self):
+        """Testa o usuário com o perfil e as permissões nas views assíncronas"""
+        user = async_to_sync(PerfilBackend().aget_user)(self.user.pk)
+        self.assertIn('perfil', user._state.fields_cache)
+        self.assertTrue(async_to_sync(aobter_permissoes)(user).pode_editar)
+
+        self.async_client.force_login(self.user)
+        with views_assincronas():
+            response = async_to_sync(self.async_client.get)(reverse('ementas:lista'))
+        self.assertTrue(response.context['user_can_edit'])
+        self.assertEqual(response.context['permissoes'], obter_permissoes(self.user))
+
+    def test_anonimo(self):
+        """Testa as permissões de visitantes"""
+        response = self.client.get(reverse('ementas:lista'))
+        self.assertEqual(response.context['permissoes'], ANONIMO)
+        self.assertFalse(response.context['user_can_edit'])
+
+    def test_acao_do_admin_invalida_cache(self):
+        """Testa que as ações em massa do admin invalidam as permissões em cache"""
+        self.assertFalse(obter_permissoes(self.user).pode_publicar)
+        request = RequestFactory().post('/')
+        request.user = self.user
+        model_admin = PerfilUsuarioAdmin(PerfilUsuario, admin.site)
+        model_admin.message_user = lambda *args, **kwargs: None
+        model_admin.promover_para_publicador(request, PerfilUsuario.objects.filter(pk=self.perfil.pk))
+        self.user.refresh_from_db()
+        self.assertTrue(obter_permissoes(self.user).pode_publicar)
+
+    def test_check_cache_compartilhado(self):
+        """Testa o aviso do check --deploy para o cache local ao processo"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                             'LOCATION': 'redis://127.0.0.1:6379/1'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([aviso.id for aviso in cache_compartilhado(None)], ['usuarios.W001'])
+        with override_settings(CACHES=redis):
+            self.assertEqual(cache_compartilhado(None), [])
+
+    def test_salvar_perfil_invalida_cache(self):
+        """Testa que alterar o perfil invalida as permissões em cache"""
+        self.assertTrue(obter_permissoes(self.user).pode_editar)
+        self.perfil.conta_aprovada = False
+        self.perfil.save()
+        self.assertFalse(obter_permissoes(self.user).pode_editar)
+
+
+class EstatisticasDashboardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='usuario', password='senha12345')
+        Ementa.objects.create(titulo='Portaria pública', publicado=True)
+        Ementa.objects.create(titulo='Decisão sigilosa', publicado=True, sigiloso=True,
+                              tipo_ato_normativo='decisao_plenaria', situacao='revogada')
+        Ementa.objects.create(titulo='Rascunho', publicado=False)
+        Protocolo.objects.create(numero='P-1', cpf_cnpj='12345678901', tipo='profissional',
+                                 local_armazenamento='CAIXA 1')
+
+    def test_contadores(self):
+        """Testa os contadores calculados pela agregação condicional"""
+        estatisticas = obter_estatisticas()
+        ementas = estatisticas['ementas']
+        self.assertEqual((ementas['total'], ementas['publicas'], ementas['sigilosas']), (2, 1, 1))
+        self.assertEqual(ementas['nao_publicadas'], 1)
+        self.assertIn(('decisao_plenaria', 'Decisão Plenária', 1), ementas['por_tipo'])
+        self.assertIn(('revogada', 'Revogada', 1), ementas['por_situacao'])
+        self.assertEqual(estatisticas['protocolos']['total'], 1)
+        self.assertIn(('profissional', 'Profissional', 1), estatisticas['protocolos']['por_tipo'])
+
+    def test_dashboard_sem_agregacoes_com_cache_quente(self):
+        """Testa que o dashboard não agrega nada quando as estatísticas estão em cache"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('usuarios:dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('usuarios:dashboard'))
+        self.assertEqual(response.context['total_ementas'], 2)
+        self.assertFalse(any('ementas_ementa' in q['sql'] or 'protocolos_protocolo' in q['sql']
+                             for q in queries.captured_queries))
+
+    def test_invalidacao_ao_salvar(self):
+        """Testa que salvar uma ementa invalida as estatísticas"""
+        self.assertEqual(obter_estatisticas()['ementas']['total'], 2)
+        Ementa.objects.create(titulo='Nova portaria', publicado=True)
+        self.assertEqual(obter_estatisticas()['ementas']['total'], 3)
+        self.assertEqual(obter_estatisticas()['recentes'][0].titulo, 'Nova portaria')
+
+
+class InstrumentacaoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        agregador.descartar()
+        self.user = get_user_model().objects.create_user(username='usuario', password='senha12345')
+        self.staff = get_user_model().objects.create_user(username='admin', password='senha12345', is_staff=True)
+        for i in range(3):
+            Ementa.objects.create(titulo=f'Portaria {i}', publicado=True)
+
+    def test_server_timing(self):
+        """Testa o cabeçalho Server-Timing com banco, templates e total"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('usuarios:dashboard'))
+        metricas = dict(parte.strip().split(';', 1) for parte in response['Server-Timing'].split(','))
+        self.assertEqual(set(metricas), {'bd', 'templates', 'total'})
+        self.assertRegex(metricas['bd'], r'^dur=[\d.]+;desc="\d+ consultas"$')
+        self.assertNotEqual(metricas['templates'], 'dur=0.0')
+
+    def test_server_timing_assincrono(self):
+        """Testa a medição das consultas feitas pelas views assíncronas"""
+        with views_assincronas():
+            response = async_to_sync(self.async_client.get)(reverse('ementas:lista'))
+        self.assertRegex(response['Server-Timing'], r'bd;dur=[\d.]+;desc="[1-9]\d* consultas"')
+        self.assertEqual(
+            {item['view']: item['requisicoes'] for item in histogramas()}.get('ementas:lista'), 1,
+        )
+
+    def test_impressao_digital(self):
+        """Testa que consultas iguais com valores diferentes têm a mesma impressão digital"""
+        self.assertEqual(
+            impressao_digital('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            impressao_digital("SELECT *  FROM t WHERE id IN (%s, %s) LIMIT 5"),
+        )
+        self.assertEqual(impressao_digital("SELECT 'a''b', 10"), 'SELECT ?, ?')
+
+    @override_settings(INSTRUMENTACAO_ORCAMENTO_MS=-1)
+    def test_log_de_requisicao_lenta(self):
+        """Testa o log com as consultas mais lentas e as repetidas, sem os parâmetros"""
+        self.client.force_login(self.user)
+        with self.assertLogs('core.instrumentacao', 'WARNING') as logs:
+            self.client.get(reverse('ementas:lista'))
+        mensagem = logs.output[0]
+        self.assertIn('Requisição lenta: GET / (ementas:lista)', mensagem)
+        self.assertRegex(mensagem, r'lenta [\d.]+ ms: SELECT')
+        self.assertNotIn('senha12345', mensagem)
+
+    def test_histogramas_por_view(self):
+        """Testa os histogramas agregados por view e a página restrita a staff"""
+        self.client.force_login(self.user)
+        for _ in range(2):
+            self.client.get(reverse('ementas:lista'))
+        self.assertEqual(self.client.get(reverse('desempenho')).status_code, 403)
+
+        views = {item['view']: item for item in histogramas()}
+        self.assertEqual(views['ementas:lista']['requisicoes'], 2)
+        self.assertEqual(sum(views['ementas:lista']['faixas']), 2)
+        self.assertGreater(views['ementas:lista']['media_consultas'], 0)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('desempenho'))
+        self.assertContains(response, 'ementas:lista')
+
+        self.client.post(reverse('desempenho'))
+        self.assertNotIn('ementas:lista', {item['view'] for item in histogramas()})
+
+
+class ConexoesBancoTest(TestCase):
+    BANCO = {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'creato_db', 'OPTIONS': {}}
+
+    def test_modos(self):
+        """Testa a configuração de cada modo de conexão"""
+        persistente = configurar_conexoes(self.BANCO, 'persistente', max_age=30)
+        self.assertEqual((persistente['CONN_MAX_AGE'], persistente['CONN_HEALTH_CHECKS']), (30, True))
+
+        pool = configurar_conexoes(self.BANCO, 'pool', pool_min=1, pool_max=8, pool_timeout=5)
+        self.assertEqual(pool['CONN_MAX_AGE'], 0)
+        self.assertTrue(pool['CONN_HEALTH_CHECKS'])
+        self.assertEqual(pool['OPTIONS']['pool']['max_size'], 8)
+        self.assertEqual(pool['OPTIONS']['pool']['timeout'], 5)
+        self.assertEqual(self.BANCO['OPTIONS'], {})
+
+        self.assertEqual(configurar_conexoes(self.BANCO, 'por_requisicao')['CONN_MAX_AGE'], 0)
+
+    def test_asgi(self):
+        """Testa que sob ASGI o padrão não usa conexões persistentes"""
+        with mock.patch('core.banco.pool_disponivel', return_value=False):
+            self.assertEqual(configurar_conexoes(self.BANCO, asgi=True)['CONN_MAX_AGE'], 0)
+        with mock.patch('core.banco.pool_disponivel', return_value=True):
+            self.assertIn('pool', configurar_conexoes(self.BANCO, asgi=True)['OPTIONS'])
+        with self.assertRaises(ImproperlyConfigured):
+            configurar_conexoes(self.BANCO, 'persistente', asgi=True)
+        self.assertEqual(configurar_conexoes(self.BANCO)['CONN_MAX_AGE'], 60)
+
+    def test_valores_invalidos(self):
+        """Testa a recusa de modo desconhecido e de pool mínimo maior que o máximo"""
+        with self.assertRaises(ImproperlyConfigured):
+            configurar_conexoes(self.BANCO, 'sempre')
+        with self.assertRaises(ImproperlyConfigured):
+            configurar_conexoes(self.BANCO, 'pool', pool_min=5, pool_max=2)
+
+    def test_estatisticas_na_pagina_de_desempenho(self):
+        """Testa a espera média do pool calculada e exibida para o staff"""
+        self.assertIsNone(estatisticas_pool())
+
+        staff = get_user_model().objects.create_user(username='admin', password='senha12345', is_staff=True)
+        self.client.force_login(staff)
+        estatisticas = {'pool_size': 4, 'pool_available': 3, 'requests_num': 10, 'requests_wait_ms': 25}
+        with mock.patch('core.banco.connections') as conexoes:
+            conexoes.__getitem__.return_value.vendor = 'postgresql'
+            conexoes.__getitem__.return_value.settings_dict = {'OPTIONS': {'pool': {'max_size': 4}}}
+            conexoes.__getitem__.return_value.pool.get_stats.return_value = dict(estatisticas)
+            self.assertEqual(estatisticas_pool()['espera_media_ms'], 2.5)
+            response = self.client.get(reverse('desempenho'))
+        self.assertContains(response, 'Espera média (ms)')
+        self.assertContains(response, '2,50')
+
+
+class AtividadeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='editor', password='senha12345')
+        self.perfil = PerfilUsuario.objects.create(user=self.user, cpf='000.000.000-00', conta_aprovada=True)
+
+    def test_login_nao_salva_o_perfil(self):
+        """Testa que o login guarda o acesso no cache sem regravar o perfil"""
+        dados = {'username': 'editor', 'password': 'senha12345', 'captcha': 'token'}
+        with mock.patch('django_recaptcha.fields.ReCaptchaField.validate'), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('usuarios:login'), dados)
+        self.assertRedirects(response, reverse('usuarios:dashboard'), fetch_redirect_response=False)
+        self.assertFalse(any('UPDATE "usuarios_perfilusuario"' in q['sql'] for q in queries.captured_queries))
+        self.assertEqual(cache.get(CHAVE_PENDENTES), {self.user.pk})
+
+    def test_acessos_coalescidos_em_um_update(self):
+        """Testa que vários acessos viram uma única atualização de ultimo_acesso"""
+        outro = get_user_model().objects.create_user(username='outro', password='senha12345')
+        PerfilUsuario.objects.create(user=outro, cpf='111.111.111-11')
+        atualizado_em = self.perfil.atualizado_em
+
+        self.client.force_login(self.user)
+        for _ in range(3):
+            self.client.get(reverse('usuarios:dashboard'))
+        registrar_acesso(outro.pk)
+        self.perfil.refresh_from_db()
+        self.assertIsNone(self.perfil.ultimo_acesso)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(gravar_acessos(), 2)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('atualizado_em', queries[0]['sql'])
+        self.perfil.refresh_from_db()
+        self.assertIsNotNone(self.perfil.ultimo_acesso)
+        self.assertEqual(self.perfil.atualizado_em, atualizado_em)
+        self.assertIsNotNone(PerfilUsuario.objects.get(user=outro).ultimo_acesso)
+        self.assertEqual(gravar_acessos(), 0)
+
+    def test_acesso_pendente_expira(self):
+        """Testa que o horário do acesso não fica no cache para sempre"""
+        with mock.patch.object(cache, 'set', wraps=cache.set) as gravar:
+            registrar_acesso(self.user.pk)
+        [timeout] = [
+            chamada.args[2] for chamada in gravar.call_args_list
+            if chamada.args[0] == f'atividade:acesso:{self.user.pk}'
+        ]
+        self.assertEqual(timeout, 600)
+
+    def test_horario_nao_volta(self):
+        """Testa que um acesso pendente mais antigo não sobrescreve o gravado"""
+        futuro = datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc)
+        PerfilUsuario.objects.filter(pk=self.perfil.pk).update(ultimo_acesso=futuro)
+        registrar_acesso(self.user.pk)
+        self.assertEqual(gravar_acessos(), 0)
+        self.perfil.refresh_from_db()
+        self.assertEqual(self.perfil.ultimo_acesso, futuro)
+
+    @override_settings(ATIVIDADE_GRAVACAO=0)
+    def test_gravacao_periodica_e_comando(self):
+        """Testa a gravação feita pela requisição e pelo comando gravar_acessos"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('usuarios:dashboard'))
+        self.perfil.refresh_from_db()
+        self.assertIsNotNone(self.perfil.ultimo_acesso)
+
+        cache.clear()
+        registrar_acesso(self.user.pk, forcar=True)
+        with override_settings(ATIVIDADE_GRAVACAO=60):
+            registrar_acesso(self.user.pk, forcar=True)
+        saida = StringIO()
+        call_command('gravar_acessos', stdout=saida)
+        self.assertIn('1 perfil(is)', saida.getvalue())
+
+    def test_requisicao_assincrona(self):
+        """Testa o registro do acesso nas views assíncronas"""
+        self.async_client.force_login(self.user)
+        with views_assincronas():
+            async_to_sync(self.async_client.get)(reverse('ementas:lista'))
+        self.assertEqual(cache.get(CHAVE_PENDENTES), {self.user.pk})
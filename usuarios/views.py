@@ -3,10 +3,10 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.utils import timezone
+from .atividade import registrar_acesso
 from .models import PerfilUsuario
 from .forms import UsuarioRegistrationForm, PerfilUsuarioUpdateForm, CustomAuthenticationForm
-from ementas.models import Ementa
+from .estatisticas import obter_estatisticas
 
 def cadastro(request):
     if request.method == 'POST':
@@ -40,10 +40,8 @@ def login_view(request):
             user = authenticate(username=username, password=password)
             if user is not None:
                 login(request, user)
-                # Atualiza último acesso
-                if hasattr(user, 'perfil'):
-                    user.perfil.ultimo_acesso = timezone.now()
-                    user.perfil.save()
+                # Último acesso guardado no cache e gravado em lote (usuarios.atividade)
+                registrar_acesso(user.pk, forcar=True)
                 messages.success(request, f'Bem-vindo, {user.get_full_name()}!')
                 return redirect('usuarios:dashboard')
             else:
@@ -98,22 +96,15 @@ def editar_perfil(request):
 
 @login_required
 def dashboard(request):
-    # Estatísticas básicas
-    total_ementas = Ementa.objects.filter(publicado=True).count()
-    ementas_publicas = Ementa.objects.filter(publicado=True, sigiloso=False).count()
-    ementas_sigilosas = Ementa.objects.filter(publicado=True, sigiloso=True).count()
-    
-    # Ementas recentes (apenas públicas)
-    ementas_recentes = Ementa.objects.filter(
-        publicado=True, 
-        sigiloso=False
-    ).order_by('-criado_em')[:5]
+    # Estatísticas em cache (usuarios.estatisticas)
+    estatisticas = obter_estatisticas()
     
     context = {
-        'total_ementas': total_ementas,
-        'ementas_publicas': ementas_publicas,
-        'ementas_sigilosas': ementas_sigilosas,
-        'ementas_recentes': ementas_recentes,
+        'total_ementas': estatisticas['ementas']['total'],
+        'ementas_publicas': estatisticas['ementas']['publicas'],
+        'ementas_sigilosas': estatisticas['ementas']['sigilosas'],
+        'estatisticas': estatisticas,
+        'ementas_recentes': estatisticas['recentes'],
         'perfil': getattr(request.user, 'perfil', None)
     }
     return render(request, 'usuarios/dashboard.html', context)